@@ -1,18 +1,22 @@
 import requests
 from bs4 import BeautifulSoup
 import json
+import os
 import re
 from datetime import datetime, timedelta
 import pytz
 from tzlocal import get_localzone
 
+# Upstream site; point it at a local stand-in (see train_delay_backend/benchmarks/etrain_server.py) for testing
+ETRAIN_BASE_URL = os.environ.get('ETRAIN_BASE_URL', 'https://etrain.info').rstrip('/')
+
 def slugify(name, code):
     return f"{name.strip().replace(' ', '-')}-{code.strip().upper()}"
 
 def build_url(src_name, src_code, dst_name, dst_code, date=None):
     src_slug = slugify(src_name, src_code)
     dst_slug = slugify(dst_name, dst_code)
-    url = f"https://etrain.info/trains/{src_slug}-to-{dst_slug}"
+    url = f"{ETRAIN_BASE_URL}/trains/{src_slug}-to-{dst_slug}"
     if date:
         url += f"?date={date}"
     return url
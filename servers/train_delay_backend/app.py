@@ -1,5 +1,11 @@
-from flask import Flask, request, jsonify, g
-from train_pipeline import TrainPipeline
+from flask import Flask, request, jsonify, g, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from train_pipeline import TrainPipeline, NumpyEncoder
+from artifact_cache import artifact_cache
+from metrics import (default_registry, timed, in_flight, queue_depth, request_seconds, artifact_cache_events,
+                     artifact_cache_bytes, CONTENT_TYPE)
+from tracing import start_trace, RequestIdFilter
+from config import CALENDAR_DEFAULT_DAYS, CALENDAR_MAX_DAYS, BATCH_MAX_ITEMS
 import logging
 from datetime import datetime
 import os
@@ -8,6 +14,7 @@ from functools import wraps
 import time
 import uuid
 import threading
+import json
 from werkzeug.exceptions import RequestTimeout
 
 # Set up logging
@@ -17,12 +24,62 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Tag every log line with its request id, including lines logged by pipeline worker threads
+for handler in logging.getLogger().handlers:
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s'))
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, recording the time spent serializing responses."""
+
+    def dumps(self, obj, **kwargs):
+        with timed('serialization') as current:
+            text = super().dumps(obj, **kwargs)
+            current.set_attribute('bytes', len(text))
+            return text
+
 app = Flask(__name__)
-pipeline = TrainPipeline()
+app.json = TimedJSONProvider(app)
+
+# Read when /metrics is scraped
+artifact_cache_events.set_function(lambda: {
+    event: artifact_cache.stats()[key]
+    for event, key in (('hit', 'hits'), ('miss', 'misses'), ('invalidation', 'invalidations'), ('eviction', 'evictions'))
+})
+artifact_cache_bytes.set_function(lambda: artifact_cache.stats()['bytes'])
+
+# The spawned training processes re-import this module as __mp_main__ just to run
+# model.train_model, so they skip building a pipeline of their own
+if __name__ != '__mp_main__':
+    pipeline = TrainPipeline()
+    queue_depth.set_function(pipeline.queue_depths)
 
 # Global timeout value in seconds
 REQUEST_TIMEOUT = 300  # 5 minutes
 
+# Supported streaming formats for /api/trains-between and their content types
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
+
+def format_stream(events, stream_format, request_id):
+    """Serialize pipeline events as NDJSON lines or server-sent events."""
+    try:
+        for event in events:
+            event['request_id'] = request_id
+            with timed('serialization'):
+                payload = json.dumps(event, ensure_ascii=False, cls=NumpyEncoder)
+            if stream_format == 'sse':
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        logger.error(f"Error streaming response - ID: {request_id}: {str(e)}")
+        error = json.dumps({'event': 'error', 'data': {'message': str(e)}, 'request_id': request_id})
+        yield f"event: error\ndata: {error}\n\n" if stream_format == 'sse' else error + "\n"
+
 class TimeoutError(Exception):
     pass
 
@@ -33,6 +90,9 @@ def timeout(seconds):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
+            # SIGALRM can only be set from the main thread; threaded servers run without it
+            if threading.current_thread() is not threading.main_thread():
+                return func(*args, **kwargs)
             # Set the signal handler and a timeout
             signal.signal(signal.SIGALRM, timeout_handler)
             signal.alarm(seconds)
@@ -49,16 +109,30 @@ def timeout(seconds):
 def before_request():
     # Generate a unique request ID
     g.request_id = str(uuid.uuid4())
+    g.trace = start_trace(f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                          g.request_id, {'http.method': request.method, 'http.target': request.full_path})
     g.start_time = time.time()
+    in_flight.inc(kind='request')
     logger.info(f"Request started - ID: {g.request_id}")
 
 @app.after_request
 def after_request(response):
     # Calculate request duration
     duration = time.time() - g.start_time
+    request_seconds.observe(duration, endpoint=request.endpoint or 'unknown', status=response.status_code)
+    g.trace.span.set_attribute('http.status_code', response.status_code)
     logger.info(f"Request completed - ID: {g.request_id} - Duration: {duration:.2f}s")
     return response
 
+@app.teardown_request
+def teardown_request(error=None):
+    # A streamed response is torn down twice: when the view returns and after its body is sent
+    if g.pop('streaming', False):
+        return
+    if 'start_time' in g:
+        in_flight.dec(kind='request')
+        g.trace.close(error)
+
 @app.errorhandler(RequestTimeout)
 def handle_timeout(e):
     logger.error(f"Request timed out - ID: {g.request_id}")
@@ -108,6 +182,40 @@ def get_trains_between():
                     'request_id': g.request_id
                 }), 400
         
+        # Streaming mode: send the listing right away, then delays as they are predicted
+        stream_format = request.args.get('stream')
+        if stream_format:
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({
+                    'status': 'error',
+                    'code': 400,
+                    'message': f'Invalid stream format: {stream_format} (expected one of: {", ".join(STREAM_FORMATS)})',
+                    'request_id': g.request_id
+                }), 400
+            
+            trains = pipeline.list_trains_between_stations(
+                source_name,
+                source_code,
+                destination_name,
+                destination_code,
+                date
+            )
+            if not trains:
+                return jsonify({
+                    'status': 'error',
+                    'code': 404,
+                    'message': 'No trains found between stations',
+                    'request_id': g.request_id
+                }), 404
+            
+            events = pipeline.stream_trains_between_stations(trains, source_code, destination_code, date)
+            g.streaming = True
+            return Response(
+                stream_with_context(format_stream(events, stream_format, g.request_id)),
+                mimetype=STREAM_FORMATS[stream_format],
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
         # Get trains between stations
         trains = pipeline.get_trains_between_stations(
             source_name,
@@ -211,13 +319,194 @@ def get_train_schedule():
             'request_id': g.request_id
         }), 500
 
+@app.route('/api/train-delay-calendar', methods=['GET'])
+@timeout(REQUEST_TIMEOUT)
+def get_train_delay_calendar():
+    try:
+        # Get parameters from query string
+        train_name = request.args.get('train_name')
+        train_number = request.args.get('train_number')
+        date = request.args.get('date')
+        
+        # Validate required fields
+        required_fields = {
+            'train_name': train_name,
+            'train_number': train_number,
+            'date': date
+        }
+        
+        for field, value in required_fields.items():
+            if not value:
+                return jsonify({
+                    'status': 'error',
+                    'code': 400,
+                    'message': f'Missing required field: {field}',
+                    'request_id': g.request_id
+                }), 400
+        
+        try:
+            days = int(request.args.get('days', CALENDAR_DEFAULT_DAYS))
+            datetime.strptime(date, '%Y%m%d')
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'code': 400,
+                'message': 'Invalid date or days (expected date as YYYYMMDD and days as an integer)',
+                'request_id': g.request_id
+            }), 400
+        if not 1 <= days <= CALENDAR_MAX_DAYS:
+            return jsonify({
+                'status': 'error',
+                'code': 400,
+                'message': f'days must be between 1 and {CALENDAR_MAX_DAYS}',
+                'request_id': g.request_id
+            }), 400
+        
+        # Predict every date in the range from one load of the model and history
+        calendar = pipeline.get_delay_calendar(
+            train_name,
+            train_number,
+            date,
+            days
+        )
+        
+        if not calendar:
+            return jsonify({
+                'status': 'error',
+                'code': 404,
+                'message': 'Failed to predict delays for train',
+                'request_id': g.request_id
+            }), 404
+            
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'train_number': train_number,
+                'train_name': train_name,
+                'calendar': calendar
+            },
+            'request_id': g.request_id
+        })
+        
+    except TimeoutError:
+        logger.error(f"Request timed out - ID: {g.request_id}")
+        return jsonify({
+            'status': 'error',
+            'code': 504,
+            'message': 'Request timed out. Please try again.',
+            'request_id': g.request_id
+        }), 504
+    except Exception as e:
+        logger.error(f"Error processing request - ID: {g.request_id}: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'code': 500,
+            'message': str(e),
+            'request_id': g.request_id
+        }), 500
+
+def validate_batch_item(item):
+    """Get the validation error for a batch item, or None if it is valid."""
+    if not isinstance(item, dict):
+        return 'Item must be an object'
+    for field in ('train_number', 'date'):
+        if not item.get(field):
+            return f'Missing required field: {field}'
+    try:
+        datetime.strptime(str(item['date']), '%Y%m%d')
+    except ValueError:
+        return f"Invalid date: {item['date']} (expected YYYYMMDD)"
+    return None
+
+@app.route('/api/predict-batch', methods=['POST'])
+@timeout(REQUEST_TIMEOUT)
+def predict_batch():
+    try:
+        body = request.get_json(silent=True)
+        items = body.get('items') if isinstance(body, dict) else None
+        
+        # Validate the request as a whole; individual items are validated below
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                'status': 'error',
+                'code': 400,
+                'message': 'Request body must be a JSON object with a non-empty "items" list',
+                'request_id': g.request_id
+            }), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({
+                'status': 'error',
+                'code': 400,
+                'message': f'Too many items: {len(items)} (at most {BATCH_MAX_ITEMS})',
+                'request_id': g.request_id
+            }), 400
+        
+        # Invalid items get an error result; the rest are predicted together
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            error = validate_batch_item(item)
+            if error:
+                results[index] = {
+                    'train_number': item.get('train_number') if isinstance(item, dict) else None,
+                    'date': item.get('date') if isinstance(item, dict) else None,
+                    'status': 'error',
+                    'message': error
+                }
+            else:
+                valid.append((index, {
+                    'train_number': str(item['train_number']),
+                    'date': str(item['date']),
+                    'train_name': item.get('train_name')
+                }))
+        
+        if valid:
+            predictions = pipeline.predict_batch([item for _, item in valid])
+            for (index, _), result in zip(valid, predictions):
+                results[index] = result
+        
+        succeeded = sum(1 for result in results if result['status'] == 'success')
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'results': results,
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded
+            },
+            'request_id': g.request_id
+        })
+        
+    except TimeoutError:
+        logger.error(f"Request timed out - ID: {g.request_id}")
+        return jsonify({
+            'status': 'error',
+            'code': 504,
+            'message': 'Request timed out. Please try again.',
+            'request_id': g.request_id
+        }), 504
+    except Exception as e:
+        logger.error(f"Error processing request - ID: {g.request_id}: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'code': 500,
+            'message': str(e),
+            'request_id': g.request_id
+        }), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
+        'model_cache': artifact_cache.stats(),
+        'training_jobs': pipeline.training_jobs.stats() if pipeline.training_jobs is not None else None,
         'request_id': g.request_id
     })
 
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    """Stage latencies, counters and gauges of this process in the Prometheus text format."""
+    return Response(default_registry.render(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     # Set timeout for the server
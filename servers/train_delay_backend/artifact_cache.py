@@ -0,0 +1,124 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from config import ARTIFACT_CACHE_MAX_BYTES
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def frame_size(df):
+    """Estimate the in-memory size of a DataFrame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
+
+class ArtifactCache:
+    """Process-wide LRU cache of deserialized files, bounded by size in bytes.
+
+    Entries are keyed by path and invalidated when the file's mtime or size changes,
+    so a model republished at the same path is picked up on the next lookup.
+    """
+
+    def __init__(self, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # path -> (mtime_ns, file_size, obj, nbytes)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, path, loader, sizer=None):
+        """Get the deserialized contents of a file, loading it with `loader` on a miss.
+
+        `sizer` estimates the loaded object's size; defaults to the file size on disk.
+        Raises FileNotFoundError if the file does not exist.
+        """
+        key = str(path)
+        stat = os.stat(key)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                mtime_ns, file_size, obj, nbytes = entry
+                if mtime_ns == stat.st_mtime_ns and file_size == stat.st_size:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return obj
+                # File changed on disk since it was cached
+                self._remove(key)
+                self.invalidations += 1
+            self.misses += 1
+
+        # Load outside the lock so slow loads don't block other lookups
+        obj = loader(Path(key))
+        nbytes = sizer(obj) if sizer else stat.st_size
+
+        if nbytes > self.max_bytes:
+            logger.warning(f"Artifact {key} ({nbytes} bytes) exceeds cache budget, not caching")
+            return obj
+
+        with self.lock:
+            self._insert(key, stat, obj, nbytes)
+        return obj
+
+    def put(self, path, obj, sizer=None):
+        """Cache an object that was just written to `path`, so the next get() is a hit."""
+        key = str(path)
+        stat = os.stat(key)
+        nbytes = sizer(obj) if sizer else stat.st_size
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            self._insert(key, stat, obj, nbytes)
+
+    def _insert(self, key, stat, obj, nbytes):
+        """Insert an entry and evict least recently used ones; caller must hold the lock."""
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (stat.st_mtime_ns, stat.st_size, obj, nbytes)
+        self.total_bytes += nbytes
+        while self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        """Remove an entry; caller must hold the lock."""
+        _, _, _, nbytes = self.entries.pop(key)
+        self.total_bytes -= nbytes
+
+    def invalidate(self, path):
+        """Drop a cached file, if present."""
+        with self.lock:
+            if str(path) in self.entries:
+                self._remove(str(path))
+
+    def clear(self):
+        """Drop all cached entries and reset counters."""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            self.hits = self.misses = self.invalidations = self.evictions = 0
+
+    def stats(self):
+        """Get cache counters."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+# Shared by every pipeline in the process
+artifact_cache = ArtifactCache()
@@ -0,0 +1,40 @@
+import numpy as np
+from features import to_days
+from config import BASELINE_METHOD, BASELINE_EWMA_ALPHA
+
+BASELINE_METHODS = ('median', 'ewma')
+
+def baseline_delays(station_history, target_dates, method=BASELINE_METHOD, alpha=BASELINE_EWMA_ALPHA):
+    """Heuristic delays of every station on each of `target_dates`, from history alone.
+
+    - median: the station's median delay over the whole history
+    - ewma:   exponentially weighted mean of the station's delays before the date, each
+              day weighted by (1 - alpha) ** its age in days (counted from the last day
+              before the date, so far-off dates still weight recent days most); stations
+              with no earlier days fall back to their median
+
+    Needs no trained model, so it can answer as soon as the history is downloaded.
+    Returns an array of shape (len(target_dates), stations), date-major like
+    build_batch_inference_frame.
+    """
+    if method not in BASELINE_METHODS:
+        raise ValueError(f"Unknown baseline method: {method}")
+    target_days = to_days(target_dates)
+    n_stations = len(station_history.stations)
+    medians = station_history.medians
+    if method == 'median' or len(station_history) == 0:
+        return np.tile(medians, (len(target_days), 1))
+
+    delays = np.empty((len(target_days), n_stations))
+    for i, day in enumerate(target_days):
+        before = station_history.days < day
+        if not before.any():
+            delays[i] = medians
+            continue
+        codes = station_history.codes[before]
+        days = station_history.days[before]
+        weights = (1 - alpha) ** (days.max() - days)
+        total = np.bincount(codes, weights, minlength=n_stations)
+        weighted = np.bincount(codes, weights * station_history.delays[before], minlength=n_stations)
+        delays[i] = np.where(total > 0, weighted / np.where(total > 0, total, 1), medians)
+    return delays
@@ -0,0 +1,81 @@
+"""Benchmark suite: feature building time as delay history grows.
+
+For each history length, times the shared feature module (features.py) on the paths
+used by training and prediction:
+- pack:      StationHistory.from_frame (CSV frame -> sorted arrays)
+- training:  build_training_frame over every history row
+- legacy:    the original pandas groupby/shift/rolling training features, for reference
+- inference: features for the day after the history ends, from the full arrays
+- state:     the same, from the cached last-STATE_DAYS-per-station state
+
+Usage: python benchmarks/bench_features.py [--days 30 90 180 365 730] [--stations 40] [--repeat 10] [--json out.json]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from features import StationHistory, build_training_frame, HISTORY_FEATURES
+from bench_prediction_features import synthetic_history, time_call
+
+def legacy_training_features(history):
+    """The original training feature code from model.train_model, kept as a reference."""
+    df = history.sort_values(["station", "date"])
+    for lag in range(1, 4):
+        df[f"prev_delay_{lag}"] = df.groupby("station")["delay_minutes"].shift(lag).fillna(0)
+    df["rolling_mean_3"] = df.groupby("station")["delay_minutes"].transform(lambda x: x.shift(1).rolling(3).mean()).fillna(0)
+    df["rolling_median_7"] = df.groupby("station")["delay_minutes"].transform(lambda x: x.shift(1).rolling(7).median()).fillna(0)
+    return df
+
+def run(days, stations, repeat):
+    """Time every stage for one history length. Returns a result dict (times in ms)."""
+    history = synthetic_history(days, stations)
+    station_history = StationHistory.from_frame(history)
+    target_date = history["date"].max() + pd.Timedelta(days=1)
+
+    # The cached state must agree with the full history for dates after it ends
+    full = station_history.features_for_date(target_date)
+    recent = station_history.recent()
+    from_state = recent.features_at(range(len(recent.stations)), [recent.last_day + 1] * len(recent.stations))
+    for name in HISTORY_FEATURES:
+        if not (full[name] == from_state[name]).all():
+            raise AssertionError(f"Cached state disagrees with full history on {name} ({days} days)")
+
+    return {
+        "days": days,
+        "stations": stations,
+        "rows": len(history),
+        "state_rows": len(recent),
+        "pack_ms": round(time_call(lambda: StationHistory.from_frame(history), repeat), 3),
+        "training_ms": round(time_call(lambda: build_training_frame(history), repeat), 3),
+        "legacy_training_ms": round(time_call(lambda: legacy_training_features(history), max(1, repeat // 5)), 3),
+        "inference_ms": round(time_call(lambda: station_history.features_at(
+            range(len(station_history.stations)), [station_history.last_day + 1] * len(station_history.stations)), repeat), 3),
+        "state_inference_ms": round(time_call(lambda: station_history.features_for_date(target_date), repeat), 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 90, 180, 365, 730])
+    parser.add_argument("--stations", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'days':>5} {'rows':>7} {'pack':>8} {'training':>9} {'legacy':>9} {'inference':>10} {'state':>8}  (ms)")
+    for days in args.days:
+        result = run(days, args.stations, args.repeat)
+        results.append(result)
+        print(f"{days:>5} {result['rows']:>7} {result['pack_ms']:>8.2f} {result['training_ms']:>9.2f} "
+              f"{result['legacy_training_ms']:>9.2f} {result['inference_ms']:>10.2f} {result['state_inference_ms']:>8.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "features", "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
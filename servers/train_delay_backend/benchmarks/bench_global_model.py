@@ -0,0 +1,209 @@
+"""Benchmark: one global cross-train model vs per-train models.
+
+Trains both on a synthetic multi-train history (or a combined CSV from
+mutiple_train_delay.py), holding out each train's last days, and reports:
+- memory:  artifact bytes on disk and Python heap used to load every model
+- latency: model load time and warm single-train, single-date prediction time
+- MAE:     one-day-ahead error on the held-out days, plus cold-start MAE of the
+           global model on trains it was not trained on
+
+Usage: python benchmarks/bench_global_model.py [--trains 8] [--days 365] [--eval-days 14] [--cold-trains 2]
+                                              [--data combined_train_delay_data.csv] [--json out.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from features import FEATURES, StationHistory, build_training_frame, build_batch_inference_frame
+from global_model import GLOBAL_FEATURES, GlobalModel, train_global_model, MODEL_FILE, META_FILE, CURRENT_LINK
+from model import train_model
+from model_io import load_model, load_encoder, model_fallback, MODEL_SUFFIX, ENCODER_SUFFIX
+from bench_prediction_features import time_call
+
+def synthetic_combined(trains, days, seed=42):
+    """Daily delays for `trains` trains sharing a pool of stations.
+
+    Delays combine a station effect, a train effect, a weekday effect and an AR(1)
+    day-to-day component, so both identity and lag features carry signal.
+    """
+    rng = np.random.default_rng(seed)
+    pool = [f"ST{i:03d}" for i in range(trains * 8)]
+    station_effect = dict(zip(pool, rng.normal(10, 8, len(pool))))
+    dates = pd.date_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=1), periods=days)
+    weekday_effect = np.array([0, 1, 2, 1, 4, 8, 6])[dates.dayofweek]
+
+    frames = []
+    for t in range(trains):
+        stations = rng.choice(pool, size=int(rng.integers(10, 25)), replace=False)
+        train_effect = rng.normal(0, 6)
+        ar = np.zeros(days)
+        for d in range(1, days):
+            ar[d] = 0.7 * ar[d - 1] + rng.normal(0, 6)
+        for position, station in enumerate(stations):
+            delays = (station_effect[station] + train_effect + 0.5 * position + weekday_effect
+                      + ar + rng.normal(0, 4, days))
+            frames.append(pd.DataFrame({
+                "date": dates,
+                "station": station,
+                "delay_minutes": np.round(delays),
+                "train_number": str(10000 + t)
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+def split(history, eval_days):
+    """Split a history into training days and the last `eval_days` days."""
+    cutoff = history["date"].max() - pd.Timedelta(days=eval_days)
+    return history[history["date"] <= cutoff], cutoff
+
+def held_out_rows(history, cutoff):
+    """Feature rows (computed over the full history) for the held-out days."""
+    frame = build_training_frame(history)
+    frame = frame[(frame["date"] > cutoff) & (frame["delay_minutes"] > -30) & (frame["delay_minutes"] < 120)]
+    return frame
+
+def measure_load(paths, loader):
+    """Load every artifact once; returns (objects, seconds, peak traced heap bytes)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects = [loader(path) for path in paths]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, elapsed, peak
+
+def bench_per_train(combined, eval_days, workdir, repeat, skip_mae=()):
+    """Train, load and evaluate one model per train; MAE excludes `skip_mae` trains."""
+    workdir.mkdir(parents=True, exist_ok=True)
+    errors, sizes, model_paths, trains = [], 0, [], []
+    for train_number, history in combined.groupby("train_number"):
+        train_history, cutoff = split(history, eval_days)
+        model_file = workdir / f"{train_number}_model{MODEL_SUFFIX}"
+        encoder_file = workdir / f"{train_number}_encoder{ENCODER_SUFFIX}"
+        with contextlib.redirect_stdout(io.StringIO()):
+            model, encoder = train_model(train_number, history=train_history.drop(columns="train_number"),
+                                         model_file=model_file, encoder_file=encoder_file)
+        # Model selection may have saved a simple model as .json instead
+        model_file = model_fallback(model_file)
+        sizes += model_file.stat().st_size + encoder_file.stat().st_size
+        model_paths += [model_file, encoder_file]
+
+        rows = held_out_rows(history.drop(columns="train_number"), cutoff)
+        rows["station_encoded"] = encoder.transform(rows["station"])
+        if train_number not in skip_mae:
+            errors.append(np.abs(model.predict(rows[FEATURES]) - rows["delay_minutes"].to_numpy()))
+        trains.append((train_number, model, encoder, StationHistory.from_frame(history)))
+
+    _, load_seconds, load_peak = measure_load(
+        model_paths, lambda path: load_encoder(path) if path.stem.endswith("_encoder") else load_model(path))
+
+    def predict_one():
+        for train_number, model, encoder, station_history in trains:
+            frame = build_batch_inference_frame(station_history, [pd.Timestamp.today().normalize()])
+            frame["station_encoded"] = encoder.transform(frame["station"])
+            model.predict(frame[FEATURES])
+
+    return {
+        "models": len(trains),
+        "artifact_bytes": sizes,
+        "load_ms": round(load_seconds * 1000, 2),
+        "load_heap_bytes": load_peak,
+        "predict_ms": round(time_call(predict_one, repeat) / len(trains), 3),
+        "mae": round(float(np.concatenate(errors).mean()), 3)
+    }
+
+def bench_global(combined, eval_days, unseen, workdir, repeat):
+    """Train, load and evaluate one model across trains, keeping `unseen` trains out of training."""
+    workdir.mkdir(parents=True, exist_ok=True)
+    seen = combined[~combined["train_number"].isin(unseen)]
+
+    parts = [split(history, eval_days) for _, history in seen.groupby("train_number")]
+    train_part = pd.concat([part for part, _ in parts], ignore_index=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        train_global_model(model_dir=workdir, combined=train_part, eval_days=0)
+
+    paths = [workdir / CURRENT_LINK / MODEL_FILE, workdir / CURRENT_LINK / META_FILE]
+    (model, _), load_seconds, load_peak = measure_load(
+        paths, lambda path: load_model(path) if path.suffix == MODEL_SUFFIX else json.loads(path.read_text()))
+    global_model = GlobalModel(model, json.loads(paths[1].read_text()))
+
+    errors, cold_errors, histories = [], [], []
+    for train_number, history in combined.groupby("train_number"):
+        _, cutoff = split(history, eval_days)
+        rows = held_out_rows(history.drop(columns="train_number"), cutoff)
+        if train_number in unseen:
+            # Cold start: no train identity and no history, stations only
+            dates = sorted(rows["date"].unique())
+            stations = history["station"].unique()
+            predicted = global_model.predict(train_number, dates, stations=stations)
+            lookup = {(date, station): delay for date, delays in zip(dates, predicted) for station, delay in delays.items()}
+            cold_errors.append(np.abs(np.array([lookup[(d, s)] for d, s in zip(rows["date"], rows["station"])])
+                                      - rows["delay_minutes"].to_numpy()))
+            continue
+        rows["train_encoded"] = float(global_model.trains.get_indexer([train_number])[0])
+        rows["station_encoded"] = global_model.stations.get_indexer(rows["station"]).astype(float)
+        errors.append(np.abs(model.predict(rows[GLOBAL_FEATURES]) - rows["delay_minutes"].to_numpy()))
+        histories.append((train_number, StationHistory.from_frame(history)))
+
+    def predict_one():
+        for train_number, station_history in histories:
+            global_model.predict(train_number, [pd.Timestamp.today().normalize()], station_history=station_history)
+
+    return {
+        "models": 1,
+        "artifact_bytes": sum(path.stat().st_size for path in paths),
+        "load_ms": round(load_seconds * 1000, 2),
+        "load_heap_bytes": load_peak,
+        "predict_ms": round(time_call(predict_one, repeat) / len(histories), 3),
+        "mae": round(float(np.concatenate(errors).mean()), 3),
+        "cold_start_trains": len(unseen),
+        "cold_start_mae": round(float(np.concatenate(cold_errors).mean()), 3) if cold_errors else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trains", type=int, default=8)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--eval-days", type=int, default=14)
+    parser.add_argument("--cold-trains", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--data", help="Combined CSV from mutiple_train_delay.py instead of synthetic data")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.data:
+        combined = pd.read_csv(args.data, parse_dates=["date"], dtype={"train_number": str})
+    else:
+        combined = synthetic_combined(args.trains, args.days)
+    print(f"History: {len(combined)} rows, {combined['train_number'].nunique()} trains, "
+          f"{combined['station'].nunique()} stations")
+
+    # Both sides report MAE on the same trains; the unseen ones only score the global cold start
+    unseen = set(sorted(combined["train_number"].unique())[:args.cold_trains])
+    with tempfile.TemporaryDirectory() as workdir:
+        per_train = bench_per_train(combined, args.eval_days, Path(workdir) / "per_train", args.repeat, unseen)
+        global_result = bench_global(combined, args.eval_days, unseen, Path(workdir) / "global", args.repeat)
+
+    print(f"{'':<10} {'models':>6} {'disk KB':>9} {'load ms':>9} {'heap KB':>9} {'predict ms':>11} {'MAE':>7}")
+    for label, result in [("per-train", per_train), ("global", global_result)]:
+        print(f"{label:<10} {result['models']:>6} {result['artifact_bytes'] / 1024:>9.1f} {result['load_ms']:>9.2f} "
+              f"{result['load_heap_bytes'] / 1024:>9.1f} {result['predict_ms']:>11.3f} {result['mae']:>7.2f}")
+    if global_result["cold_start_mae"] is not None:
+        print(f"Global model cold-start MAE on {global_result['cold_start_trains']} unseen trains: "
+              f"{global_result['cold_start_mae']:.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "global_model", "per_train": per_train, "global": global_result}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
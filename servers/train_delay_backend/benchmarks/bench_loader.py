@@ -0,0 +1,153 @@
+"""Benchmark: loading models from the native format vs joblib pickles.
+
+Trains a few per-train models on synthetic histories and saves each one twice: as
+the registry stores it now (XGBoost UBJ model + JSON station table) and as it was
+stored before (joblib pickles of the XGBRegressor and a LabelEncoder). Reports:
+- disk:       bytes per model + encoder pair
+- cold start: a fresh interpreter importing the loader and loading one pair,
+              as seen from inside the process and end to end
+- per model:  warm load time of each pair (median and max over all models)
+and checks that both formats predict the same values.
+
+Usage: python benchmarks/bench_loader.py [--models 10] [--days 365] [--stations 20] [--repeat 5] [--json out.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import joblib
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+from features import FEATURES, StationHistory, build_inference_frame
+from model import train_model
+from model_io import load_model, load_encoder, MODEL_SUFFIX, ENCODER_SUFFIX
+from bench_prediction_features import synthetic_history
+
+# Run in a fresh interpreter: time imports plus the first load, the way a new worker pays it
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {backend!r})
+{imports}
+imported = time.perf_counter()
+model, encoder = {load}
+loaded = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - start) * 1000, "load_ms": (loaded - imported) * 1000}}))
+"""
+FORMATS = {
+    "native": {
+        "imports": "from model_io import load_model, load_encoder",
+        "load": "load_model({model!r}), load_encoder({encoder!r})",
+        "loader": lambda model, encoder: (load_model(model), load_encoder(encoder))
+    },
+    "pickle": {
+        "imports": "import joblib",
+        "load": "joblib.load({model!r}), joblib.load({encoder!r})",
+        "loader": lambda model, encoder: (joblib.load(model), joblib.load(encoder))
+    }
+}
+
+def build_models(count, days, stations, workdir):
+    """Train `count` models and save each in both formats. Returns per-model file paths and a history."""
+    models = []
+    for seed in range(count):
+        history = synthetic_history(days, stations, seed=seed)
+        native = (workdir / f"{seed}_model{MODEL_SUFFIX}", workdir / f"{seed}_encoder{ENCODER_SUFFIX}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Always XGBoost: the comparison is about its storage format
+            model, encoder = train_model(str(seed), history=history, model_file=native[0], encoder_file=native[1],
+                                         model_selection=False)
+        pickle = (workdir / f"{seed}_model.pkl", workdir / f"{seed}_encoder.pkl")
+        joblib.dump(model, pickle[0])
+        joblib.dump(LabelEncoder().fit(list(encoder.classes_)), pickle[1])
+        models.append({"native": native, "pickle": pickle, "history": history})
+    return models
+
+def cold_start(paths, name, repeat):
+    """Best-of-`repeat` cold start of a fresh interpreter loading one model pair."""
+    spec = FORMATS[name]
+    code = COLD_START.format(backend=str(BACKEND_DIR), imports=spec["imports"],
+                             load=spec["load"].format(model=str(paths[0]), encoder=str(paths[1])))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        total_ms = (time.perf_counter() - start) * 1000
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        result["process_ms"] = total_ms
+        if best is None or total_ms < best["process_ms"]:
+            best = result
+    return {key: round(value, 2) for key, value in best.items()}
+
+def warm_loads(models, name, repeat):
+    """Best-of-`repeat` load time of each model pair in this process, in ms."""
+    loader = FORMATS[name]["loader"]
+    times = []
+    for entry in models:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            loader(*entry[name])
+            best = min(best, time.perf_counter() - start)
+        times.append(best * 1000)
+    return times
+
+def check_predictions(entry):
+    """Both formats must produce the same predictions for the same features."""
+    frames = []
+    for name in FORMATS:
+        model, encoder = FORMATS[name]["loader"](*entry[name])
+        station_history = StationHistory.from_frame(entry["history"])
+        frame = build_inference_frame(station_history, entry["history"]["date"].max())
+        frame["station_encoded"] = encoder.transform(frame["station"])
+        frames.append(model.predict(frame[FEATURES]))
+    if not np.array_equal(frames[0], frames[1]):
+        raise AssertionError("Native and pickled models predict different values")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=10)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--stations", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        models = build_models(args.models, args.days, args.stations, Path(workdir))
+        check_predictions(models[0])
+        for name in FORMATS:
+            loads = warm_loads(models, name, args.repeat)
+            results[name] = {
+                "bytes_per_model": round(statistics.mean(
+                    sum(path.stat().st_size for path in entry[name]) for entry in models)),
+                "cold_start": cold_start(models[0][name], name, args.repeat),
+                "load_median_ms": round(statistics.median(loads), 3),
+                "load_max_ms": round(max(loads), 3)
+            }
+
+    print(f"{args.models} models, {args.days} days x {args.stations} stations")
+    print(f"{'':<8} {'KB/model':>9} {'cold import':>12} {'cold load':>10} {'cold total':>11} "
+          f"{'load median':>12} {'load max':>9}  (ms)")
+    for name, result in results.items():
+        cold = result["cold_start"]
+        print(f"{name:<8} {result['bytes_per_model'] / 1024:>9.1f} {cold['import_ms']:>12.2f} {cold['load_ms']:>10.2f} "
+              f"{cold['process_ms']:>11.2f} {result['load_median_ms']:>12.3f} {result['load_max_ms']:>9.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "loader", "models": args.models, "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
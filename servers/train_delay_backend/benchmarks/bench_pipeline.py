@@ -0,0 +1,225 @@
+"""Benchmark: offline replay of the delay pipeline, stage by stage.
+
+Serves etrain pages from fixtures instead of the network (requests.get is swapped for
+a replay of the pages; synthetic ones from etrain_fixtures.py, or pages recorded from
+the site with --fixtures) and runs each stage the way the API does:
+- listing_scrape:  scrape_trains_between on the trains-between page
+- schedule_scrape: scrape_train_schedule on the schedule page
+- history_parse:   extract_delay_data_from_html on the saved history page (CSV + snapshot)
+- train:           train_model on the parsed history
+- predict:         predict_delays from the saved files, with the artifact cache cleared
+For each history size it reports the best-of-`repeat` wall time and the CPU time of that
+run (all threads of the process, so XGBoost's threads count), and the peak Python/NumPy
+heap of one extra run under tracemalloc (XGBoost's native allocations are not traced).
+Each stage's output is checked against the fixture (row and station counts).
+
+As a regression gate: save a run with --json, then pass it as --baseline to a later run.
+The run exits with status 1 when any stage's wall time or peak heap grew by more than
+--tolerance (and, for time, by more than --min-ms).
+
+Usage: python benchmarks/bench_pipeline.py [--days 30 90 365] [--stations 20] [--trains 20] [--repeat 5]
+                                          [--padding-kb 100] [--fixtures DIR] [--json out.json]
+                                          [--baseline previous.json] [--tolerance 0.25] [--min-ms 5]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import pandas as pd
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from scrape_trains import scrape_trains_between
+from scrape_schedule import scrape_train_schedule
+from delay_scrapper import download_html, extract_delay_data_from_html
+from model import train_model
+from predict import predict_delays
+from artifact_cache import artifact_cache
+from model_io import model_fallback, MODEL_SUFFIX, ENCODER_SUFFIX
+import etrain_fixtures
+
+STAGES = ['listing_scrape', 'schedule_scrape', 'history_parse', 'train', 'predict']
+SRC = ('Howrah Jn', 'HWH')
+DST = ('New Delhi', 'NDLS')
+TRAIN_NUMBER = '12301'
+
+@contextlib.contextmanager
+def replay(pages):
+    """Answer requests.get from `pages` ({'listing'|'schedule'|'history': html}) by URL shape."""
+    def get(url, *args, **kwargs):
+        response = requests.models.Response()
+        response.url = url
+        response.encoding = 'utf-8'
+        kind = 'listing' if '/trains/' in url else 'schedule' if '/schedule' in url else 'history' if '/history' in url else None
+        if kind is None or pages.get(kind) is None:
+            response.status_code = 404
+            response._content = b''
+        else:
+            response.status_code = 200
+            response._content = pages[kind].encode('utf-8')
+        return response
+
+    original = requests.get
+    requests.get = get
+    try:
+        yield
+    finally:
+        requests.get = original
+
+def measure(fn, repeat):
+    """Best-of-`repeat` wall time with that run's CPU time, plus the peak traced heap of one more run.
+
+    Returns (result of the last run, stats dict).
+    """
+    best = None
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = fn()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if best is None or wall < best[0]:
+            best = (wall, cpu)
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {'wall_ms': round(best[0] * 1000, 3), 'cpu_ms': round(best[1] * 1000, 3),
+                    'peak_kb': round(peak / 1024, 1)}
+
+def check(stage, ok, message):
+    if not ok:
+        raise AssertionError(f"{stage}: {message}")
+
+def run_size(pages, expected, workdir, repeat):
+    """Run every stage on one set of pages. `expected` holds counts to check, or None for recorded pages."""
+    workdir.mkdir(parents=True, exist_ok=True)
+    html_file = workdir / 'history.html'
+    history_file = workdir / f"{TRAIN_NUMBER}.csv"
+    snapshot_file = workdir / f"{TRAIN_NUMBER}_features.npz"
+    model_file = workdir / f"model{MODEL_SUFFIX}"
+    encoder_file = workdir / f"encoder{ENCODER_SUFFIX}"
+    train_name = etrain_fixtures.train_name(TRAIN_NUMBER)
+    results = {}
+
+    with replay(pages), contextlib.redirect_stdout(io.StringIO()):
+        trains, results['listing_scrape'] = measure(lambda: scrape_trains_between(*SRC, *DST, '20250521'), repeat)
+        check('listing_scrape', trains and (expected is None or len(trains) == expected['trains']),
+              f"parsed {len(trains or [])} trains")
+
+        url = f"https://etrain.info/train/{train_name.replace(' ', '-')}-{TRAIN_NUMBER}/schedule"
+        schedule, results['schedule_scrape'] = measure(lambda: scrape_train_schedule(url), repeat)
+        check('schedule_scrape', schedule and (expected is None or len(schedule['schedule']) == expected['stations']),
+              f"parsed {len(schedule['schedule']) if schedule else 0} stations")
+
+        check('history_parse', download_html(train_name, TRAIN_NUMBER, str(html_file)), "history page not served")
+        parsed, results['history_parse'] = measure(
+            lambda: extract_delay_data_from_html(str(html_file), TRAIN_NUMBER, str(history_file), str(snapshot_file)),
+            repeat)
+        rows = len(pd.read_csv(history_file)) if parsed else 0
+        check('history_parse', rows and (expected is None or rows == expected['days'] * expected['stations']),
+              f"parsed {rows} delay records")
+
+        (model, _), results['train'] = measure(
+            lambda: train_model(TRAIN_NUMBER, history_file=history_file, model_file=model_file,
+                                encoder_file=encoder_file),
+            repeat)
+        check('train', model is not None, "no model trained")
+        results['train']['model_kind'] = model.training_stats_['model_kind']
+
+        def predict():
+            artifact_cache.entries.clear()
+            return predict_delays(TRAIN_NUMBER, pd.Timestamp.today().normalize(), model_file=model_fallback(model_file),
+                                  encoder_file=encoder_file, history_file=history_file, snapshot_file=snapshot_file)
+        delays, results['predict'] = measure(predict, repeat)
+        check('predict', delays and (expected is None or len(delays) == expected['stations']),
+              f"predicted {len(delays or {})} stations")
+    results['history_rows'] = rows
+    return results
+
+def compare(results, baseline, tolerance, min_ms):
+    """Regressions of `results` against a previous run's results, as messages."""
+    regressions = []
+    for size, stages in results.items():
+        for stage in STAGES:
+            before = baseline.get(size, {}).get(stage)
+            if not before:
+                continue
+            now = stages[stage]
+            if now['wall_ms'] > before['wall_ms'] * (1 + tolerance) and now['wall_ms'] - before['wall_ms'] > min_ms:
+                regressions.append(f"{size} {stage}: wall {before['wall_ms']:.1f} -> {now['wall_ms']:.1f} ms")
+            if now['peak_kb'] > before['peak_kb'] * (1 + tolerance):
+                regressions.append(f"{size} {stage}: peak heap {before['peak_kb']:.0f} -> {now['peak_kb']:.0f} KB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 90, 365], help="History sizes to replay")
+    parser.add_argument("--stations", type=int, default=20)
+    parser.add_argument("--trains", type=int, default=20, help="Rows on the trains-between page")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--padding-kb", type=int, default=100, help="Unrelated markup added to each synthetic page")
+    parser.add_argument("--fixtures", help="Directory of recorded listing.html, schedule.html and history.html pages")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative growth before a regression")
+    parser.add_argument("--min-ms", type=float, default=5, help="Ignore wall-time growth smaller than this")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    stations = etrain_fixtures.station_codes(args.stations)
+    sizes = {}
+    recorded = etrain_fixtures.load_recorded(args.fixtures) if args.fixtures else {}
+    if recorded.get('history'):
+        sizes['recorded'] = (None, None)
+    else:
+        for days in args.days:
+            sizes[f"{days}d"] = (days, {'days': days, 'stations': args.stations, 'trains': args.trains})
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size, (days, expected) in sizes.items():
+            pages = {
+                'listing': etrain_fixtures.listing_html(SRC[1], DST[1], args.trains, padding_kb=args.padding_kb),
+                'schedule': etrain_fixtures.schedule_html(TRAIN_NUMBER, stations, padding_kb=args.padding_kb),
+                'history': etrain_fixtures.history_html(TRAIN_NUMBER, stations, days, padding_kb=args.padding_kb)
+                if days else None
+            }
+            # Recorded pages replace the synthetic ones; their counts can't be checked exactly
+            if any(recorded.values()):
+                pages.update({kind: page for kind, page in recorded.items() if page})
+                expected = None
+            results[size] = run_size(pages, expected, Path(workdir) / size, args.repeat)
+
+    print(f"{args.stations} stations, {args.trains} listed trains, best of {args.repeat}")
+    print(f"{'size':<9} {'stage':<16} {'wall ms':>10} {'cpu ms':>10} {'peak KB':>10}")
+    for size, stages in results.items():
+        for stage in STAGES:
+            row = stages[stage]
+            note = f"  ({row['model_kind']})" if 'model_kind' in row else ""
+            print(f"{size:<9} {stage:<16} {row['wall_ms']:>10.2f} {row['cpu_ms']:>10.2f} {row['peak_kb']:>10.1f}{note}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "pipeline", "stations": args.stations, "trains": args.trains,
+                       "repeat": args.repeat, "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, args.min_ms)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Micro-benchmark: per-station lag/rolling features used by predict_delays.
+
+Compares the vectorized StationHistory features (features.py) against the original
+row-wise implementation on a synthetic history and checks that both produce the same values.
+
+Usage: python benchmarks/bench_prediction_features.py [--days 365] [--stations 40] [--repeat 20]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from features import StationHistory, HISTORY_FEATURES
+
+def synthetic_history(days, stations, seed=42):
+    """Daily delays for `stations` stations over `days` days, with a few missing days."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=1), periods=days)
+    names = [f"ST{i:03d}" for i in range(stations)]
+    df = pd.DataFrame({
+        "date": np.repeat(dates, stations),
+        "station": np.tile(names, days),
+        "delay_minutes": rng.normal(15, 20, days * stations).round()
+    })
+    # Drop ~3% of rows so lag lookups hit the median fallback
+    return df[rng.random(len(df)) > 0.03].reset_index(drop=True)
+
+def legacy_features(history, target_date, stations):
+    """The original per-station implementation from predict_delays, kept as a reference."""
+    predict_df = pd.DataFrame({"station": stations})
+    history_sorted = history.sort_values(["station", "date"])
+    for lag in [1, 2, 3]:
+        lag_date = target_date - pd.Timedelta(days=lag)
+        lag_data = history_sorted[history_sorted["date"] == lag_date][["station", "delay_minutes"]]
+        lag_data = lag_data.rename(columns={"delay_minutes": f"prev_delay_{lag}"})
+        predict_df = predict_df.merge(lag_data, on="station", how="left")
+    station_medians = history_sorted.groupby("station")["delay_minutes"].median()
+    for lag in [1, 2, 3]:
+        col = f"prev_delay_{lag}"
+        predict_df[col] = predict_df.apply(
+            lambda row: station_medians.get(row["station"], 0) if pd.isna(row[col]) else row[col],
+            axis=1
+        )
+
+    def get_rolling_feature(station, date, window, agg_func):
+        s = history_sorted[(history_sorted["station"] == station) & (history_sorted["date"] < date)]
+        if len(s) < window:
+            return s["delay_minutes"].median() if not s.empty else 0
+        if agg_func == "mean":
+            return s.tail(window)["delay_minutes"].mean()
+        return s.tail(window)["delay_minutes"].median()
+
+    predict_df["rolling_mean_3"] = [get_rolling_feature(st, target_date, 3, "mean") for st in stations]
+    predict_df["rolling_median_7"] = [get_rolling_feature(st, target_date, 7, "median") for st in stations]
+    return {col: predict_df[col].to_numpy(dtype=float) for col in HISTORY_FEATURES}
+
+def vectorized_features(history, target_date, stations):
+    """Pack the history into arrays and build features for one target date."""
+    return StationHistory.from_frame(history, stations).features_for_date(target_date)
+
+def time_call(fn, repeat):
+    """Best-of-`repeat` wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--stations", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    history = synthetic_history(args.days, args.stations)
+    stations = history["station"].unique()
+    print(f"History: {len(history)} rows ({args.days} days x {args.stations} stations)")
+
+    for label, target_date in [("next day", history["date"].max() + pd.Timedelta(days=1)),
+                               ("in history", history["date"].max() - pd.Timedelta(days=30)),
+                               ("next week", history["date"].max() + pd.Timedelta(days=7))]:
+        expected = legacy_features(history, target_date, stations)
+        actual = vectorized_features(history, target_date, stations)
+        for col in HISTORY_FEATURES:
+            if not np.allclose(expected[col], actual[col], equal_nan=True):
+                print(f"MISMATCH in {col} for target {label}")
+                sys.exit(1)
+
+        legacy_ms = time_call(lambda: legacy_features(history, target_date, stations), max(1, args.repeat // 5))
+        vectorized_ms = time_call(lambda: vectorized_features(history, target_date, stations), args.repeat)
+        print(f"Target {label:<10}  legacy: {legacy_ms:8.2f} ms  vectorized: {vectorized_ms:6.2f} ms  "
+              f"speedup: {legacy_ms / vectorized_ms:6.1f}x")
+
+if __name__ == "__main__":
+    main()
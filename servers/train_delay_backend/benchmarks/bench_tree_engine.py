@@ -0,0 +1,89 @@
+"""Benchmark: XGBoost predict vs the flattened NumPy tree engine at small batch sizes.
+
+Scores feature rows from a synthetic history with depth-8 models of several sizes
+(early stopping usually leaves tens of trees; 500 is the training cap). For each batch
+size it reports the best-of-`repeat` time, given a DataFrame as predict.py does, of:
+- xgboost: XGBRegressor.predict
+- numpy:   the flattened engine alone (FlatEnsemble.predict_arrays)
+- served:  FlatEnsemble.predict, which hands batches above MAX_BATCH_CELLS to XGBoost
+and the largest difference between the engines' outputs.
+
+Usage: python benchmarks/bench_tree_engine.py [--batch-sizes 1 20 100 1000] [--trees 50 200 500] [--repeat 50]
+                                             [--json out.json]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+import numpy as np
+import xgboost as xgb
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from features import FEATURES, build_training_frame
+from model_io import StationEncoder
+from tree_engine import FlatEnsemble
+from bench_prediction_features import synthetic_history, time_call
+
+def feature_rows(days, stations):
+    """Feature rows for every day of a synthetic history, plus their targets."""
+    history = synthetic_history(days, stations)
+    frame = build_training_frame(history)
+    frame["station_encoded"] = StationEncoder.fit(frame["station"]).transform(frame["station"])
+    return frame[FEATURES], frame["delay_minutes"]
+
+def build_model(X, y, trees):
+    """A model with model.train_model's settings and a fixed number of trees."""
+    return xgb.XGBRegressor(n_estimators=trees, max_depth=8, learning_rate=0.05, min_child_weight=3,
+                            subsample=0.8, colsample_bytree=0.8, tree_method='hist', random_state=42).fit(X, y)
+
+def run(model, X, batch_sizes, repeat):
+    """Time both engines on each batch size. Returns a result dict per batch size."""
+    engine = FlatEnsemble.from_model(model)
+    rng = np.random.default_rng(0)
+    results = []
+    for size in batch_sizes:
+        batch = X.iloc[rng.integers(0, len(X), size)]
+        expected = model.predict(batch)
+        actual = engine.predict_arrays(engine._matrix(batch))
+        xgb_ms = time_call(lambda: model.predict(batch), repeat)
+        numpy_ms = time_call(lambda: engine.predict_arrays(engine._matrix(batch)), repeat)
+        served_ms = time_call(lambda: engine.predict(batch), repeat)
+        results.append({
+            "batch_size": size,
+            "xgboost_ms": round(xgb_ms, 4),
+            "numpy_ms": round(numpy_ms, 4),
+            "served_ms": round(served_ms, 4),
+            "speedup": round(xgb_ms / served_ms, 2),
+            "max_abs_diff": float(np.abs(expected - actual).max())
+        })
+    return {"trees": engine.n_trees, "depth": engine.depth, "results": results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 20, 100, 1000])
+    parser.add_argument("--trees", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--stations", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    X, y = feature_rows(args.days, args.stations)
+
+    output = {}
+    for trees in args.trees:
+        result = run(build_model(X, y, trees), X, args.batch_sizes, args.repeat)
+        output[f"trees_{trees}"] = result
+        print(f"\n{result['trees']} trees, depth {result['depth']}")
+        print(f"{'batch':>6} {'xgboost ms':>11} {'numpy ms':>9} {'served ms':>10} {'speedup':>8} {'max diff':>10}")
+        for row in result["results"]:
+            print(f"{row['batch_size']:>6} {row['xgboost_ms']:>11.3f} {row['numpy_ms']:>9.3f} {row['served_ms']:>10.3f} "
+                  f"{row['speedup']:>7.1f}x {row['max_abs_diff']:>10.2e}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "tree_engine", **output}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
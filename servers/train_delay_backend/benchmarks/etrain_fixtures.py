@@ -0,0 +1,130 @@
+"""Synthetic etrain.info pages in the markup the scrapers parse.
+
+Generates the three page kinds the pipeline downloads, deterministically from a seed:
+- listing:  trains between two stations (scrape_trains.scrape_trains_between)
+- schedule: a train's station list and timings (scrape_schedule.scrape_train_schedule)
+- history:  a train's daily per-station delays (delay_scrapper.parse_delay_records)
+
+Only the elements the parsers read are reproduced; `padding_kb` adds unrelated markup
+so parse costs scale like a full page. Pages recorded from the site can be used instead
+through load_recorded().
+"""
+import datetime
+import html
+import json
+from pathlib import Path
+import numpy as np
+
+PAGE_KINDS = ('listing', 'schedule', 'history')
+CLASSES = ['1A', '2A', '3A', '3E', 'SL', 'CC', '2S']
+
+def station_codes(count):
+    """`count` distinct station codes: HWH-like three-letter codes."""
+    letters = [chr(ord('A') + i) for i in range(26)]
+    return [letters[i // 676 % 26] + letters[i // 26 % 26] + letters[i % 26] for i in range(count)]
+
+def train_name(train_number):
+    return f"Test Express {train_number}"
+
+def _page(body, padding_kb=0, title="etrain.info"):
+    # Stand-in for the site's header, navigation, scripts and ads
+    filler = "".join(f"<div class=\"ad\"><a href=\"/x/{i}\">Link {i}</a><span>{'lorem ipsum ' * 6}</span></div>"
+                     for i in range(padding_kb * 1024 // 128))
+    return (f"<html lang=\"en\"><head><meta charset=\"utf-8\"><title>{title}</title></head>"
+            f"<body><header>{filler[:len(filler) // 2]}</header><main>{body}</main>"
+            f"<footer>{filler[len(filler) // 2:]}</footer></body></html>")
+
+def listing_html(src_code, dst_code, trains=20, seed=0, padding_kb=0, first_number=12301):
+    """Trains-between page with `trains` rows, numbered from `first_number`."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(trains):
+        number = str(first_number + i)
+        departure = int(rng.integers(0, 24 * 60))
+        duration = int(rng.integers(60, 36 * 60))
+        arrival = (departure + duration) % (24 * 60)
+        data = {
+            'num': number, 'name': train_name(number), 'typ': 'SF', 's': src_code, 'd': dst_code,
+            'st': f"{departure // 60:02d}:{departure % 60:02d}", 'dt': f"{arrival // 60:02d}:{arrival % 60:02d}",
+            'tt': f"{duration // 60:02d}:{duration % 60:02d}",
+            'dy': [day for day in ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN'] if rng.random() < 0.7]
+        }
+        available = rng.random(len(CLASSES)) < 0.5
+        cells = "".join(f"<td class=\"wd22{' bgrn' if ok else ''}\" title=\"{cls}\">{cls}</td>"
+                        for cls, ok in zip(CLASSES, available))
+        links = "".join(f"<a class=\"cavlink\" href=\"#\">{cls}</a>" for cls, ok in zip(CLASSES, available) if ok)
+        icons = "<i class=\"icon-food\"></i>" if rng.random() < 0.3 else ""
+        rows.append(f"<tr data-train=\"{html.escape(json.dumps(data))}\" book=\"1\" ar=\"120\" sd=\"\" ed=\"\">"
+                    f"<td>{number}</td><td>{train_name(number)}{icons}</td>{cells}"
+                    f"<td><div class=\"flexRow\">{links}</div></td></tr>")
+    return _page(f"<table class=\"trnlstcont\">{''.join(rows)}</table>", padding_kb,
+                 title=f"Trains from {src_code} to {dst_code}")
+
+def schedule_html(train_number, stations, padding_kb=0, name=None):
+    """Schedule page for a train stopping at `stations` (codes), about an hour apart."""
+    name = name or train_name(train_number)
+    rows = ["<tr><th>#</th><th>Station</th><th>Timings</th></tr>"]
+    minutes = 6 * 60
+    for i, code in enumerate(stations, start=1):
+        arrival = "Source" if i == 1 else f"{minutes // 60 % 24:02d}:{minutes % 60:02d} (Day {minutes // 1440 + 1})"
+        minutes += 5
+        departure = "Destination" if i == len(stations) else f"{minutes // 60 % 24:02d}:{minutes % 60:02d} (Day {minutes // 1440 + 1})"
+        minutes += 55
+        wifi = '<i class="icon-wifi"></i>' if i % 3 == 0 else ''
+        rows.append(
+            f"<tr><td class=\"txt-center\"><div class=\"pdl5\">{i}</div><small><div class=\"pdl5\">{code}</div></small></td>"
+            f"<td class=\"intstnCont\"><div class=\"fixwelps\">Station {code}</div>"
+            f"<div class=\"nowrap\"><div class=\"fixw70\">{(i - 1) * 60} km</div><small>Platform: {i % 6 + 1}</small></div>"
+            f"{wifi}</td>"
+            f"<td><div class=\"nowrap\">{arrival}</div><div class=\"nowrap\">{departure}</div></td></tr>"
+        )
+    header = (f"<div class=\"bx3_bgm\">{name} ({train_number})</div>"
+              "<div><b>Running Days:</b> Mon Wed Fri<b>Type:</b> Superfast<b>Zone:</b> ER"
+              "<b>Available Classes:</b> 1A 2A 3A SL<b>Pantry Available</b></div>")
+    return _page(header + f"<table class=\"fullw nocps nolrborder bx3_brl\">{''.join(rows)}</table>", padding_kb,
+                 title=f"{name} schedule")
+
+# Days of earlier shocks folded into each day's AR(1) component (0.7 ** 30 is negligible)
+AR_MEMORY_DAYS = 30
+
+def _day_draws(seed, day, stations):
+    """(AR shock, per-station noise, missing mask) for one day, seeded by (seed, day) alone."""
+    rng = np.random.default_rng([seed, day.toordinal()])
+    return rng.normal(0, 6), rng.normal(5, 4, stations), rng.random(stations) < 0.02
+
+def history_html(train_number, stations, days, end=None, seed=0, padding_kb=0):
+    """History page with `days` days of delays at `stations`, ending the day before `end`.
+
+    Delays grow along the route and combine a weekday effect, a day-to-day AR(1) component
+    and noise; about 2% of values are missing (null), as on the site. Each day's values
+    depend only on `seed` and the date, so windows of different lengths agree on the days
+    they share.
+    """
+    end = end or datetime.date.today()
+    start = end - datetime.timedelta(days=days + AR_MEMORY_DAYS)
+    draws = [_day_draws(seed, start + datetime.timedelta(days=i), len(stations)) for i in range(days + AR_MEMORY_DAYS)]
+    dates = [start + datetime.timedelta(days=AR_MEMORY_DAYS + i) for i in range(days)]
+    weekday = np.array([0, 1, 2, 1, 4, 8, 6])[[d.weekday() for d in dates]]
+    # ar[d] = sum over k of 0.7 ** k * shock[d - k], the AR(1) recursion truncated to AR_MEMORY_DAYS
+    shocks = np.array([shock for shock, _, _ in draws])
+    ar = np.convolve(shocks, 0.7 ** np.arange(AR_MEMORY_DAYS + 1))[AR_MEMORY_DAYS:AR_MEMORY_DAYS + days]
+    noise = np.array([noise for _, noise, _ in draws[AR_MEMORY_DAYS:]]).reshape(days, len(stations))
+    missing = np.array([gaps for _, _, gaps in draws[AR_MEMORY_DAYS:]]).reshape(days, len(stations))
+    delays = np.arange(len(stations))[None, :] * 1.5 + weekday[:, None] + ar[:, None] + noise
+
+    header = "[{'type':'date'}," + ",".join(f"{{'label':'{code}'}}" for code in stations) + "]"
+    rows = []
+    for date, values, gaps in zip(dates, np.maximum(delays, 0).astype(int), missing):
+        cells = ",".join('null' if gap else str(value) for value, gap in zip(values, gaps))
+        rows.append(f"[new Date({date.year},{date.month - 1},{date.day}),{cells}]")
+    script = f"<script>var et = et || {{}};</script><script>et.rsStat.tooltipData = [{header},{','.join(rows)}];</script>"
+    return _page(f"<div id=\"rsStat\"></div>{script}", padding_kb, title=f"{train_name(train_number)} running history")
+
+def load_recorded(directory):
+    """Read recorded pages saved as <directory>/{listing,schedule,history}.html; missing kinds are None."""
+    directory = Path(directory)
+    pages = {}
+    for kind in PAGE_KINDS:
+        path = directory / f"{kind}.html"
+        pages[kind] = path.read_text(encoding='utf-8') if path.exists() else None
+    return pages
@@ -0,0 +1,254 @@
+"""Local etrain.info stand-in: serves listing, schedule and history pages with injected latency and failures.
+
+Answers the URL shapes the scrapers request, so any of them can be pointed at it with
+ETRAIN_BASE_URL=http://127.0.0.1:8765:
+- /trains/<Src-Name-SRC>-to-<Dst-Name-DST>[?date=YYYYMMDD]  trains-between listing
+- /train/<Train-Name>-<number>/schedule                       schedule
+- /train/<Train-Name>-<number>/history?d=1w|1m|3m|6m|1y       delay history up to yesterday
+Pages are synthetic (etrain_fixtures.py) and stable per route and train: a route always
+lists the same trains, a train always has the same stations (starting and ending at the
+route it was listed for, once listed) and a day's delays are the same in every history
+window. With --fixtures, pages recorded from the site are served for every URL of their
+kind instead.
+
+Fault injection, drawn per request from --seed:
+- latency before the response starts, from --latency (see parse_latency)
+- --rate-429 of requests get 429 with a Retry-After header, --rate-5xx get 500/502/503
+- --slow-body-rate of responses stream their body at --slow-body-kbps; each chunk arrives
+  well within a client's read timeout, so only a total deadline catches them
+GET /__stats returns request counts by page kind and status as JSON.
+
+Usage: python benchmarks/etrain_server.py [--port 8765] [--latency lognormal:150:0.5] [--rate-429 0.02]
+                                         [--rate-5xx 0.01] [--slow-body-rate 0.05] [--slow-body-kbps 16]
+                                         [--padding-kb 100] [--fixtures DIR] [--seed 0]
+"""
+import argparse
+import functools
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import etrain_fixtures
+from delay_scrapper import HISTORY_WINDOWS
+
+LISTING_PATH = re.compile(r"^/trains/(?P<src>.+)-to-(?P<dst>.+)$")
+TRAIN_PATH = re.compile(r"^/train/(?P<name>.+)-(?P<number>\d+)/(?P<kind>schedule|history)$")
+STATION_POOL = etrain_fixtures.station_codes(400)
+WINDOW_DAYS = dict(HISTORY_WINDOWS)
+CHUNK_BYTES = 1024
+
+def parse_latency(spec):
+    """Build a sampler of latencies in seconds from a spec, all values in milliseconds:
+    fixed:MS, uniform:LO:HI, normal:MEAN:SD, lognormal:MEDIAN:SIGMA or exponential:MEAN.
+    """
+    kind, *values = spec.split(":")
+    try:
+        values = [float(value) for value in values]
+        samplers = {
+            'fixed': lambda rng, ms: ms,
+            'uniform': lambda rng, lo, hi: rng.uniform(lo, hi),
+            'normal': lambda rng, mean, sd: max(0.0, rng.gauss(mean, sd)),
+            'lognormal': lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma),
+            'exponential': lambda rng, mean: rng.expovariate(1 / mean)
+        }
+        sampler = samplers[kind]
+        sampler(random.Random(0), *values)
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        raise argparse.ArgumentTypeError(f"Invalid latency spec: {spec}") from None
+    return lambda rng: sampler(rng, *values) / 1000
+
+def route_trains(src, dst):
+    """(first train number, count) listed for a route; stable across runs."""
+    key = zlib.crc32(f"{src}-{dst}".encode())
+    return 10000 + key % 80000, 5 + key % 26
+
+def train_stations(number, route=None):
+    """Station codes a train stops at; stable across runs.
+
+    With `route`, the (src, dst) codes of a listing the train appears in, the train
+    starts at src and ends at dst, so both are in its schedule and history.
+    """
+    rng = random.Random(int(number))
+    stations = sorted(rng.sample(STATION_POOL, rng.randint(8, 25)), key=STATION_POOL.index)
+    if route is None:
+        return stations
+    src, dst = route
+    return [src] + [code for code in stations if code not in route] + [dst]
+
+class EtrainStub:
+    """Page generation, fault injection and counters shared by the request handlers."""
+
+    def __init__(self, latency=None, rate_429=0.0, rate_5xx=0.0, slow_body_rate=0.0, slow_body_kbps=16,
+                 padding_kb=100, recorded=None, retry_after=1, seed=0):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.slow_body_rate = slow_body_rate
+        self.slow_body_kbps = slow_body_kbps
+        self.padding_kb = padding_kb
+        self.recorded = recorded or {}
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.routes = {}  # train number -> (src, dst) of the last listing it appeared in
+
+    def draw(self):
+        """Decide this request's fate: (latency seconds, error status or None, slow body?)."""
+        with self.lock:
+            latency = self.latency(self.rng) if self.latency else 0.0
+            roll = self.rng.random()
+            server_error = self.rng.choice((500, 502, 503))
+            slow = self.rng.random() < self.slow_body_rate
+        if roll < self.rate_429:
+            return latency, 429, False
+        if roll < self.rate_429 + self.rate_5xx:
+            return latency, server_error, False
+        return latency, None, slow
+
+    def count(self, kind, status, slow=False):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats[f"kind:{kind}"] += 1
+            self.stats[f"status:{status}"] += 1
+            if slow:
+                self.stats['slow_bodies'] += 1
+
+    def page(self, path, query):
+        """(kind, html) for a request path, or (None, None) if no page lives there."""
+        match = LISTING_PATH.match(path)
+        if match:
+            src, dst = (slug.rsplit("-", 1)[-1].upper() for slug in (match['src'], match['dst']))
+            return 'listing', self.recorded.get('listing') or self._listing(src, dst)
+        match = TRAIN_PATH.match(path)
+        if not match:
+            return None, None
+        kind = match['kind']
+        if self.recorded.get(kind):
+            return kind, self.recorded[kind]
+        with self.lock:
+            route = self.routes.get(int(match['number']))
+        if kind == 'schedule':
+            return kind, self._schedule(match['number'], match['name'].replace("-", " "), route)
+        days = WINDOW_DAYS.get(query.get('d', ['1y'])[0], 365)
+        return kind, self._history(match['number'], days, date.today(), route)
+
+    def _listing(self, src, dst):
+        first, count = route_trains(src, dst)
+        with self.lock:
+            self.routes.update((first + i, (src, dst)) for i in range(count))
+        return self._listing_html(src, dst)
+
+    @functools.lru_cache(maxsize=256)
+    def _listing_html(self, src, dst):
+        first, count = route_trains(src, dst)
+        return etrain_fixtures.listing_html(src, dst, count, seed=first, padding_kb=self.padding_kb, first_number=first)
+
+    @functools.lru_cache(maxsize=1024)
+    def _schedule(self, number, name, route):
+        return etrain_fixtures.schedule_html(number, train_stations(number, route), padding_kb=self.padding_kb,
+                                             name=name)
+
+    @functools.lru_cache(maxsize=1024)
+    def _history(self, number, days, today, route):
+        return etrain_fixtures.history_html(number, train_stations(number, route), days, end=today,
+                                            seed=int(number), padding_kb=self.padding_kb)
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/__stats":
+                with stub.lock:
+                    return self._send(200, json.dumps(dict(stub.stats)).encode(), "application/json")
+
+            kind, html = stub.page(url.path, parse_qs(url.query))
+            latency, error, slow = stub.draw()
+            time.sleep(latency)
+            if kind is None:
+                stub.count('unknown', 404)
+                return self._send(404, b"Not Found")
+            if error:
+                stub.count(kind, error)
+                headers = {"Retry-After": str(stub.retry_after)} if error == 429 else {}
+                return self._send(error, f"Error {error}".encode(), headers=headers)
+            stub.count(kind, 200, slow)
+            self._send(200, html.encode("utf-8"), "text/html; charset=utf-8",
+                       rate=stub.slow_body_kbps * 1024 if slow else None)
+
+        def _send(self, status, body, content_type="text/plain", headers=None, rate=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            try:
+                if rate is None:
+                    self.wfile.write(body)
+                    return
+                for start in range(0, len(body), CHUNK_BYTES):
+                    self.wfile.write(body[start:start + CHUNK_BYTES])
+                    self.wfile.flush()
+                    time.sleep(CHUNK_BYTES / rate)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up (e.g. hit its timeout)
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def start_server(stub, host="127.0.0.1", port=8765):
+    """Serve `stub` on a background thread; returns the server (call shutdown() to stop it)."""
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=parse_latency, help="Latency distribution, e.g. fixed:50 or lognormal:150:0.5")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Fraction of requests answered 500/502/503")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--slow-body-rate", type=float, default=0.0, help="Fraction of pages streamed slowly")
+    parser.add_argument("--slow-body-kbps", type=float, default=16, help="Streaming rate of slow pages in KB/s")
+    parser.add_argument("--padding-kb", type=int, default=100, help="Unrelated markup added to each synthetic page")
+    parser.add_argument("--fixtures", help="Directory of recorded listing.html, schedule.html and history.html pages")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = EtrainStub(args.latency, args.rate_429, args.rate_5xx, args.slow_body_rate, args.slow_body_kbps,
+                      args.padding_kb, etrain_fixtures.load_recorded(args.fixtures) if args.fixtures else None,
+                      args.retry_after, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stub))
+    server.daemon_threads = True
+    print(f"Serving etrain stand-in on http://{args.host}:{server.server_port} "
+          f"(set ETRAIN_BASE_URL to this address)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(dict(stub.stats)))
+
+if __name__ == "__main__":
+    main()
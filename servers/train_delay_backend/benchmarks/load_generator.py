@@ -0,0 +1,220 @@
+"""Load generator: drives the delay API at a target request rate and reports latency percentiles.
+
+Sends an open-loop stream of requests (arrivals don't wait for responses, so a slow
+server builds a backlog instead of slowing the test down) to /api/trains-between and
+/api/train-schedule in the proportions given by --mix. Routes and trains come from a
+catalog matching etrain_server.py's pages, and popularity follows a Zipf distribution
+(rank k is requested with weight 1 / k ** --zipf). A --cold-fraction of requests go to
+routes or trains never requested before, which have no model yet.
+
+Each request is labelled cold (first request for its route or train in this run) or
+warm. For every endpoint and label it reports the count, the error rate (non-2xx and
+failed requests), throughput and latency percentiles. Latency is measured from each
+request's scheduled send time, so time spent queued behind --concurrency counts.
+
+Usage: python benchmarks/load_generator.py [--base-url http://127.0.0.1:5000] [--rps 5] [--duration 60]
+                                          [--mix trains-between=0.3,train-schedule=0.7] [--routes 50] [--zipf 1.1]
+                                          [--cold-fraction 0.05] [--concurrency 32] [--warmup 0]
+                                          [--json out.json] [--baseline previous.json]
+Run the API against the stand-in first, e.g.:
+    python benchmarks/etrain_server.py --port 8765 &
+    ETRAIN_BASE_URL=http://127.0.0.1:8765 gunicorn --threads 8 app:app &
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+import numpy as np
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from etrain_server import STATION_POOL, route_trains
+from etrain_fixtures import train_name
+
+ENDPOINTS = {
+    'trains-between': '/api/trains-between',
+    'train-schedule': '/api/train-schedule'
+}
+PERCENTILES = (50, 95, 99)
+
+def parse_mix(spec):
+    """'trains-between=0.3,train-schedule=0.7' -> {endpoint: weight}."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {name!r} (expected one of: {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+class Workload:
+    """Draws requests: a Zipf-popular catalog of routes and trains, plus never-seen ones for cold requests."""
+
+    def __init__(self, routes, zipf, cold_fraction, mix, seed=0):
+        self.rng = random.Random(seed)
+        pairs = [(STATION_POOL[i], STATION_POOL[-1 - i]) for i in range(len(STATION_POOL) // 2)]
+        self.rng.shuffle(pairs)
+        self.routes = pairs[:routes]
+        self.fresh_routes = pairs[routes:]
+        self.trains = [str(first + i) for first, count in (route_trains(*route) for route in self.routes)
+                       for i in range(count)]
+        self.fresh_train = 99999
+        self.route_weights = 1 / np.arange(1, len(self.routes) + 1) ** zipf
+        self.train_weights = 1 / np.arange(1, len(self.trains) + 1) ** zipf
+        self.cold_fraction = cold_fraction
+        self.endpoints, self.endpoint_weights = zip(*mix.items())
+        self.today = date.today().strftime("%Y%m%d")
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def draw(self):
+        """Next request as (endpoint, query params, cold?)."""
+        with self.lock:
+            endpoint = self.rng.choices(self.endpoints, self.endpoint_weights)[0]
+            fresh = self.rng.random() < self.cold_fraction
+            if endpoint == 'trains-between':
+                if fresh and self.fresh_routes:
+                    src, dst = self.fresh_routes.pop()
+                else:
+                    src, dst = self.rng.choices(self.routes, self.route_weights)[0]
+                key = (endpoint, src, dst)
+                params = {'source_name': f"Station {src}", 'source_code': src,
+                          'destination_name': f"Station {dst}", 'destination_code': dst, 'date': self.today}
+            else:
+                if fresh:
+                    number, self.fresh_train = str(self.fresh_train), self.fresh_train - 1
+                else:
+                    number = self.rng.choices(self.trains, self.train_weights)[0]
+                key = (endpoint, number)
+                params = {'train_name': train_name(number), 'train_number': number, 'date': self.today}
+            cold = key not in self.seen
+            self.seen.add(key)
+        return endpoint, params, cold
+
+def send(session_pool, base_url, endpoint, params, timeout):
+    """Issue one request; returns (status code or None, error message or None)."""
+    session = getattr(session_pool, 'session', None)
+    if session is None:
+        session = session_pool.session = requests.Session()
+    try:
+        response = session.get(base_url + ENDPOINTS[endpoint], params=params, timeout=timeout)
+        return response.status_code, None
+    except requests.RequestException as e:
+        return None, type(e).__name__
+
+def run(args, workload, duration, record):
+    """Send requests for `duration` seconds at args.rps; `record` gets one result dict per request."""
+    sessions = threading.local()
+    rng = random.Random(args.seed + 1)
+
+    def task(scheduled, endpoint, params, cold):
+        status, error = send(sessions, args.base_url, endpoint, params, args.timeout)
+        record({'endpoint': endpoint, 'cold': cold, 'status': status, 'error': error,
+                'latency': time.perf_counter() - scheduled})
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        start = time.perf_counter()
+        scheduled = start
+        while scheduled - start < duration:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(task, scheduled, *workload.draw())
+            gap = rng.expovariate(args.rps) if args.arrivals == 'poisson' else 1 / args.rps
+            scheduled += gap
+    return time.perf_counter() - start
+
+def summarize(results, elapsed):
+    """Per-group stats for the results of a run; groups are 'all', each endpoint and endpoint/cold|warm."""
+    groups = defaultdict(list)
+    for result in results:
+        label = 'cold' if result['cold'] else 'warm'
+        for group in ('all', result['endpoint'], f"{result['endpoint']}/{label}"):
+            groups[group].append(result)
+
+    summary = {}
+    for group, items in groups.items():
+        latencies = np.array([item['latency'] for item in items]) * 1000
+        ok = [item for item in items if item['status'] is not None and 200 <= item['status'] < 300]
+        statuses = defaultdict(int)
+        for item in items:
+            statuses[str(item['status'] or item['error'])] += 1
+        summary[group] = {
+            'requests': len(items),
+            'errors': len(items) - len(ok),
+            'error_rate': round(1 - len(ok) / len(items), 4),
+            'throughput_rps': round(len(ok) / elapsed, 3),
+            **{f"p{p}_ms": round(float(np.percentile(latencies, p)), 1) for p in PERCENTILES},
+            'mean_ms': round(float(latencies.mean()), 1),
+            'max_ms': round(float(latencies.max()), 1),
+            'statuses': dict(statuses)
+        }
+    return dict(sorted(summary.items(), key=lambda item: (item[0] != 'all', item[0])))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--rps", type=float, default=5, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to send requests for")
+    parser.add_argument("--arrivals", choices=["poisson", "constant"], default="poisson")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("trains-between=0.3,train-schedule=0.7"))
+    parser.add_argument("--routes", type=int, default=50, help="Routes in the popular catalog")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of route and train popularity")
+    parser.add_argument("--cold-fraction", type=float, default=0.05, help="Fraction of requests for never-seen trains")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--warmup", type=float, default=0, help="Seconds of unrecorded load before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare percentiles against")
+    args = parser.parse_args()
+
+    workload = Workload(args.routes, args.zipf, args.cold_fraction, args.mix, args.seed)
+    if args.warmup:
+        print(f"Warming up for {args.warmup:.0f}s...")
+        run(args, workload, args.warmup, lambda result: None)
+
+    results = []
+    lock = threading.Lock()
+
+    def record(result):
+        with lock:
+            results.append(result)
+
+    print(f"Sending {args.rps:g} req/s for {args.duration:.0f}s to {args.base_url}...")
+    sending = run(args, workload, args.duration, record)
+    # run() returns once every request finished; throughput counts the time to drain the backlog
+    elapsed = max(sending, args.duration)
+    summary = summarize(results, elapsed)
+
+    print(f"\n{len(results)} requests in {elapsed:.1f}s (target {args.rps:g} req/s, {args.arrivals} arrivals)")
+    print(f"{'group':<28} {'reqs':>6} {'err %':>6} {'ok/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for group, row in summary.items():
+        print(f"{group:<28} {row['requests']:>6} {row['error_rate'] * 100:>6.1f} {row['throughput_rps']:>7.2f} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["summary"]
+        print(f"\nChange against {args.baseline}:")
+        for group, row in summary.items():
+            if group in baseline:
+                before = baseline[group]
+                changes = "  ".join(f"p{p} {row[f'p{p}_ms'] - before[f'p{p}_ms']:+.1f} ms" for p in PERCENTILES)
+                print(f"{group:<28} {changes}  err {100 * (row['error_rate'] - before['error_rate']):+.1f} pts")
+
+    if args.json:
+        config = {key: value for key, value in vars(args).items() if key not in ("json", "baseline")}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "load", "config": config, "elapsed_seconds": round(elapsed, 2),
+                       "summary": summary}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
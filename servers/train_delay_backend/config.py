@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+
+# Base directories (absolute so the app works regardless of the working directory)
+BASE_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_DIR = BASE_DIR / "pipeline_output"
+
+# Model registry
+REGISTRY_DIR = Path(os.environ.get('MODEL_REGISTRY_DIR', OUTPUT_DIR / "models"))
+MODEL_TTL_HOURS = float(os.environ.get('MODEL_TTL_HOURS', 24))
+REGISTRY_MAX_BYTES = int(os.environ.get('REGISTRY_MAX_BYTES', 512 * 1024 * 1024))  # 512 MB
+REGISTRY_VERSIONS_PER_TRAIN = int(os.environ.get('REGISTRY_VERSIONS_PER_TRAIN', 2))
+
+# In-memory cache of loaded models, encoders and history frames
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get('ARTIFACT_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 256 MB
+
+# Concurrency
+PIPELINE_MAX_WORKERS = int(os.environ.get('PIPELINE_MAX_WORKERS', 8))  # Global cap on trains processed at once
+REQUEST_MAX_WORKERS = int(os.environ.get('REQUEST_MAX_WORKERS', 4))  # Cap per trains-between request
+TRAINING_PROCESSES = int(os.environ.get('TRAINING_PROCESSES', 2))  # 0 trains on the request thread
+
+# Single-flight coalescing of duplicate per-train work
+SINGLE_FLIGHT_LOCK_DIR = Path(os.environ.get('SINGLE_FLIGHT_LOCK_DIR', OUTPUT_DIR / "locks"))
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_LOCK_TIMEOUT', 300))  # seconds
+
+# Local delay history store
+HISTORY_DB = Path(os.environ.get('HISTORY_DB', OUTPUT_DIR / "history.sqlite3"))
+HISTORY_RETENTION_DAYS = int(os.environ.get('HISTORY_RETENTION_DAYS', 365))
+HISTORY_MIN_REFRESH_MINUTES = float(os.environ.get('HISTORY_MIN_REFRESH_MINUTES', 60))
+
+# Delay calendar
+CALENDAR_DEFAULT_DAYS = int(os.environ.get('CALENDAR_DEFAULT_DAYS', 7))
+CALENDAR_MAX_DAYS = int(os.environ.get('CALENDAR_MAX_DAYS', 14))
+
+# Batch prediction
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 500))
+
+# Global cross-train model (trained offline with `python global_model.py`)
+GLOBAL_MODEL_DIR = Path(os.environ.get('GLOBAL_MODEL_DIR', OUTPUT_DIR / "global_model"))
+USE_GLOBAL_MODEL = os.environ.get('USE_GLOBAL_MODEL', '0') == '1'
+
+# Incremental training: continue boosting the previous model on recent days, with a
+# full retrain once the last one is older than FULL_RETRAIN_DAYS
+INCREMENTAL_TRAINING = os.environ.get('INCREMENTAL_TRAINING', '1') == '1'
+INCREMENTAL_TREES = int(os.environ.get('INCREMENTAL_TREES', 20))
+INCREMENTAL_LEARNING_RATE = float(os.environ.get('INCREMENTAL_LEARNING_RATE', 0.02))
+INCREMENTAL_WINDOW_DAYS = int(os.environ.get('INCREMENTAL_WINDOW_DAYS', 60))
+FULL_RETRAIN_DAYS = float(os.environ.get('FULL_RETRAIN_DAYS', 7))
+
+# Training cost controls
+TRAINING_N_JOBS = int(os.environ.get('TRAINING_N_JOBS', max(1, (os.cpu_count() or 1) // max(1, TRAINING_PROCESSES))))
+TRAINING_EARLY_STOPPING_ROUNDS = int(os.environ.get('TRAINING_EARLY_STOPPING_ROUNDS', 30))
+TRAINING_TIME_BUDGET_SECONDS = float(os.environ.get('TRAINING_TIME_BUDGET_SECONDS', 30))  # 0 disables
+
+# Models are scored on the last TRAINING_HOLDOUT_DAYS days of history, and XGBoost stops
+# early on the same number of days before them
+TRAINING_HOLDOUT_DAYS = int(os.environ.get('TRAINING_HOLDOUT_DAYS', 14))
+
+# Where models are trained: 'process' trains in each API worker (in a pool of
+# TRAINING_PROCESSES processes), 'queue' hands jobs to training_worker.py
+TRAINING_BACKEND = os.environ.get('TRAINING_BACKEND', 'process')
+TRAINING_JOBS_DB = Path(os.environ.get('TRAINING_JOBS_DB', OUTPUT_DIR / "training_jobs.sqlite3"))
+TRAINING_JOB_MAX_ATTEMPTS = int(os.environ.get('TRAINING_JOB_MAX_ATTEMPTS', 3))
+TRAINING_JOB_RETRY_SECONDS = float(os.environ.get('TRAINING_JOB_RETRY_SECONDS', 30))  # doubles per attempt
+TRAINING_JOB_LEASE_SECONDS = float(os.environ.get('TRAINING_JOB_LEASE_SECONDS', 600))
+TRAINING_JOB_WAIT_SECONDS = float(os.environ.get('TRAINING_JOB_WAIT_SECONDS', 20))  # request wait for a new model
+TRAINING_WORKER_POLL_SECONDS = float(os.environ.get('TRAINING_WORKER_POLL_SECONDS', 1))
+
+# Prediction engine: 'xgboost', or 'numpy' to score with the flattened tree arrays in tree_engine.py
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'xgboost')
+
+# Cold-start baseline: a train with no model gets heuristic delays from its history right
+# away while its model trains in the background
+COLD_START_BASELINE = os.environ.get('COLD_START_BASELINE', '1') == '1'
+BASELINE_METHOD = os.environ.get('BASELINE_METHOD', 'ewma')  # 'ewma' or 'median'
+BASELINE_EWMA_ALPHA = float(os.environ.get('BASELINE_EWMA_ALPHA', 0.3))
+BACKGROUND_BUILD_MAX_PENDING = int(os.environ.get('BACKGROUND_BUILD_MAX_PENDING', 1000))  # queued cold trains
+
+# Model selection: small histories get a median, smoothing or ridge model instead of
+# XGBoost, picked by size and by backtest error on the held-out days
+MODEL_SELECTION = os.environ.get('MODEL_SELECTION', '1') == '1'
+SELECTION_MIN_ROWS_RIDGE = int(os.environ.get('SELECTION_MIN_ROWS_RIDGE', 50))
+SELECTION_MIN_ROWS_XGBOOST = int(os.environ.get('SELECTION_MIN_ROWS_XGBOOST', 500))
+SELECTION_MIN_ROWS_PER_STATION = int(os.environ.get('SELECTION_MIN_ROWS_PER_STATION', 30))  # for XGBoost
+SELECTION_TOLERANCE = float(os.environ.get('SELECTION_TOLERANCE', 0.02))  # relative MAE a simpler model may lose
+
+# Upstream site the scrapers download from; point it at a local stand-in such as
+# benchmarks/etrain_server.py to test load, failures and timeouts offline
+ETRAIN_BASE_URL = os.environ.get('ETRAIN_BASE_URL', 'https://etrain.info').rstrip('/')
+SCRAPE_TIMEOUT_SECONDS = float(os.environ.get('SCRAPE_TIMEOUT_SECONDS', 30))
+
+# Upper bounds (seconds) of the stage and request latency histograms served at /metrics
+METRICS_STAGE_BUCKETS = tuple(float(bound) for bound in os.environ.get(
+    'METRICS_STAGE_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,120,300').split(','))
+
+# Request tracing: spans for the stages of each API request, exported as OTLP JSON to a
+# file (one export request per line) and/or an OTLP/HTTP collector; off when neither is set
+TRACE_EXPORT_FILE = os.environ.get('TRACE_EXPORT_FILE', '')
+TRACE_EXPORT_URL = os.environ.get('TRACE_EXPORT_URL', '')  # e.g. http://localhost:4318/v1/traces
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 1.0))
+TRACE_MIN_DURATION_MS = float(os.environ.get('TRACE_MIN_DURATION_MS', 0))  # only export slower requests
+TRACE_EXPORT_INTERVAL_SECONDS = float(os.environ.get('TRACE_EXPORT_INTERVAL_SECONDS', 5))
+TRACE_MAX_QUEUED_SPANS = int(os.environ.get('TRACE_MAX_QUEUED_SPANS', 10000))
+TRACE_SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'train-delay-backend')
@@ -1,104 +1,124 @@
 import requests
 import re
 import json
-from bs4 import BeautifulSoup
+import csv
+import pandas as pd
+from features import write_snapshot
+from config import ETRAIN_BASE_URL, SCRAPE_TIMEOUT_SECONDS
+from metrics import timed, scrape_failures
+from tracing import current_span, SPAN_KIND_CLIENT
+
+# History windows supported by etrain's `d` parameter, shortest first, with their length in days
+HISTORY_WINDOWS = [('1w', 7), ('1m', 30), ('3m', 90), ('6m', 180), ('1y', 365)]
+
+@timed('history_download', kind=SPAN_KIND_CLIENT)
+def fetch_history_html(train_name: str, train_number: str, window: str = '1y'):
+    """Download a train's delay history page for a window (e.g. '1w', '1y') and return its HTML, or None on failure."""
+    url = f"{ETRAIN_BASE_URL}/train/{train_name.replace(' ', '-')}-{train_number}/history?d={window}"
+    current_span().set_attributes({'train.number': train_number, 'history.window': window, 'http.url': url})
 
-def download_html(train_name: str, train_number: str):
-    url = f"https://etrain.info/train/{train_name.replace(' ', '-')}-{train_number}/history?d=1y"
-    
     print(f"Downloading HTML for {train_name} ({train_number})...")
     print(f"URL: {url}")
-    
+
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
         'Connection': 'keep-alive',
     }
-    
+
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = requests.get(url, headers=headers, timeout=SCRAPE_TIMEOUT_SECONDS)
+        current_span().set_attributes({'http.status_code': response.status_code,
+                                       'http.response.body.size': len(response.content)})
         response.raise_for_status()  # Raise an exception for bad status codes
-        
+
         if response.status_code == 200:
-            # Save the HTML content to a file
-            html_file = f"{train_number}_history.html"
-            with open(html_file, "w", encoding="utf-8") as file:
-                file.write(response.text)
-            print(f"HTML file saved as {html_file}")
             print(f"Response size: {len(response.text)} bytes")
-            return html_file
+            return response.text
         else:
             print(f"Failed to download the HTML. Status code: {response.status_code}")
             print(f"Response content: {response.text[:500]}")  # Print first 500 chars of response
             return None
     except requests.exceptions.Timeout:
-        print("Request timed out after 30 seconds")
+        print(f"Request timed out after {SCRAPE_TIMEOUT_SECONDS:g} seconds")
+        scrape_failures.inc(page='history', reason='timeout')
         return None
     except requests.exceptions.RequestException as e:
         print(f"Request failed: {e}")
+        reason = 'http_error' if isinstance(e, requests.exceptions.HTTPError) else 'request_error'
+        scrape_failures.inc(page='history', reason=reason)
         return None
     except Exception as e:
         print(f"Unexpected error: {e}")
+        scrape_failures.inc(page='history', reason='error')
         return None
 
-def extract_delay_data_from_html(html_file: str, train_number: str):
-    # Load the saved HTML file
-    with open(html_file, "r", encoding="utf-8") as f:
-        html = f.read()
+def download_html(train_name: str, train_number: str, output_file: str = None):
+    """Download a train's delay history page and save it to a file."""
+    html = fetch_history_html(train_name, train_number)
+    if html is None:
+        return None
+
+    # Save the HTML content to a file
+    html_file = output_file or f"{train_number}_history.html"
+    with open(html_file, "w", encoding="utf-8") as file:
+        file.write(html)
+    print(f"HTML file saved as {html_file}")
+    return html_file
+
+@timed('html_parse')
+def parse_delay_records(html: str):
+    """Extract daily per-station delay records from a history page's HTML.
+
+    Returns a list of {"date", "station", "delay_minutes"} dicts, empty if the page
+    has no delay data.
+    """
+    # The delay data is a JavaScript array assigned in an inline script; matching it
+    # directly avoids building a DOM for the whole page
+    current_span().set_attribute('html.size', len(html))
+    match = re.search(r"et\.rsStat\.tooltipData\s*=\s*(\[[\s\S]+?\]);", html)
+    if not match:
+        print("No delay data found in HTML")
+        scrape_failures.inc(page='history', reason='no_data')
+        return []
+
+    js_array = match.group(1)
+    print("Successfully extracted JavaScript array")
+
+    # Clean up the JavaScript array to make it valid JSON
+    # Replace new Date() with ISO date string
+    js_array = re.sub(r'new Date\((\d+),(\d+),(\d+)\)',
+                    lambda m: f'"{int(m[1])}-{int(m[2])+1:02d}-{int(m[3]):02d}"',
+                    js_array)
+
+    # Replace null with 0
+    js_array = js_array.replace("null", "0")
 
-    # Parse HTML using BeautifulSoup
-    soup = BeautifulSoup(html, "html.parser")
-
-    # Find the script tag containing the delay data
-    script_tags = soup.find_all("script")
-    delay_data = None
-    
-    print(f"Searching for delay data in {len(script_tags)} script tags...")
-    
-    for script in script_tags:
-        if script.string and "et.rsStat.tooltipData" in script.string:
-            print("Found script tag with delay data")
-            # Extract the JavaScript array
-            match = re.search(r"et\.rsStat\.tooltipData\s*=\s*(\[[\s\S]+?\]);", script.string)
-            if match:
-                js_array = match.group(1)
-                print("Successfully extracted JavaScript array")
-                
-                # Clean up the JavaScript array to make it valid JSON
-                # Replace new Date() with ISO date string
-                js_array = re.sub(r'new Date\((\d+),(\d+),(\d+)\)', 
-                                lambda m: f'"{int(m[1])}-{int(m[2])+1:02d}-{int(m[3]):02d}"', 
-                                js_array)
-                
-                # Replace null with 0
-                js_array = js_array.replace("null", "0")
-                
-                # Remove trailing commas
-                js_array = re.sub(r",\s*]", "]", js_array)
-                js_array = re.sub(r",\s*}", "}", js_array)
-                
-                # Convert single quotes to double quotes
-                js_array = js_array.replace("'", '"')
-                
-                try:
-                    delay_data = json.loads(js_array)
-                    print(f"Successfully parsed delay data with {len(delay_data)} rows")
-                    break
-                except json.JSONDecodeError as e:
-                    print(f"Error parsing delay data: {e}")
-                    print("Problematic JSON snippet:", js_array[:200])  # Print first 200 chars for debugging
-                    continue
+    # Remove trailing commas
+    js_array = re.sub(r",\s*]", "]", js_array)
+    js_array = re.sub(r",\s*}", "}", js_array)
+
+    # Convert single quotes to double quotes
+    js_array = js_array.replace("'", '"')
+
+    try:
+        delay_data = json.loads(js_array)
+        print(f"Successfully parsed delay data with {len(delay_data)} rows")
+    except json.JSONDecodeError as e:
+        print(f"Error parsing delay data: {e}")
+        print("Problematic JSON snippet:", js_array[:200])  # Print first 200 chars for debugging
+        return []
 
     if not delay_data:
         print("No delay data found in HTML")
-        return False
+        return []
 
     # Process the delay data
     # First row contains column headers (station names)
     station_names = [entry["label"] for entry in delay_data[0][1:]]
     print(f"Found {len(station_names)} stations in delay data")
-    
+
     # Remaining rows contain daily data
     records = []
     for row in delay_data[1:]:
@@ -111,16 +131,35 @@ def extract_delay_data_from_html(html_file: str, train_number: str):
             })
 
     print(f"Processed {len(records)} delay records")
+    current_span().set_attributes({'station.count': len(station_names), 'delay.records': len(records)})
+    return records
 
-    # Save to CSV
-    import csv
-    filename = f"{train_number}.csv"
+def save_delay_records(records, filename):
+    """Save delay records to a CSV file."""
     with open(filename, "w", newline="") as f:
         writer = csv.DictWriter(f, fieldnames=["date", "station", "delay_minutes"])
         writer.writeheader()
         writer.writerows(records)
         print(f"\n✅ Delay data saved to {filename}")
-    
+
+def extract_delay_data_from_html(html_file: str, train_number: str, output_file: str = None,
+                                 snapshot_file: str = None):
+    """Extract delay records from a saved history page into a CSV and a feature snapshot."""
+    # Load the saved HTML file
+    with open(html_file, "r", encoding="utf-8") as f:
+        html = f.read()
+
+    records = parse_delay_records(html)
+    if not records:
+        return False
+
+    # Save to CSV
+    save_delay_records(records, output_file or f"{train_number}.csv")
+
+    # Per-station snapshot of the latest delays, enough to predict upcoming dates
+    history = pd.DataFrame(records)
+    history["date"] = pd.to_datetime(history["date"])
+    write_snapshot(history, snapshot_file or f"{train_number}_features.npz")
     return True
 
 if __name__ == "__main__":
@@ -132,4 +171,4 @@ if __name__ == "__main__":
 
     # If HTML file is downloaded successfully, extract delay data
     if html_file:
-        extract_delay_data_from_html(html_file, train_number)
\ No newline at end of file
+        extract_delay_data_from_html(html_file, train_number)
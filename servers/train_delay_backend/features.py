@@ -0,0 +1,299 @@
+import numpy as np
+import pandas as pd
+
+# Feature definitions shared by training (model.py) and inference (predict.py)
+LAGS = [1, 2, 3]
+ROLLING_WINDOWS = [("rolling_mean_3", 3, "mean"), ("rolling_median_7", 7, "median")]
+DATE_FEATURES = [
+    "day", "month", "year", "day_of_week", "is_weekend",
+    "month_sin", "month_cos", "day_sin", "day_cos"
+]
+HISTORY_FEATURES = [f"prev_delay_{lag}" for lag in LAGS] + [name for name, _, _ in ROLLING_WINDOWS]
+FEATURES = ["station_encoded"] + DATE_FEATURES + HISTORY_FEATURES
+
+# Days of history per station needed to build features for dates after the history ends
+STATE_DAYS = max(max(LAGS), max(window for _, window, _ in ROLLING_WINDOWS))
+
+# (station, day) pairs are packed into one sortable int64 key
+KEY_SPAN = 1 << 32
+DAY_OFFSET = 1 << 20
+
+def to_days(dates):
+    """Convert dates to int64 day numbers (days since 1970-01-01)."""
+    values = np.asarray(dates)
+    if not np.issubdtype(values.dtype, np.datetime64):
+        values = pd.to_datetime(values).values
+    return values.astype("datetime64[D]").astype(np.int64)
+
+def date_features(days):
+    """Calendar features for an array of day numbers."""
+    index = pd.DatetimeIndex(np.asarray(days).astype("datetime64[D]"))
+    month = index.month.to_numpy()
+    day = index.day.to_numpy()
+    day_of_week = index.dayofweek.to_numpy()
+    return {
+        "day": day,
+        "month": month,
+        "year": index.year.to_numpy(),
+        "day_of_week": day_of_week,
+        "is_weekend": (day_of_week >= 5).astype(int),
+        "month_sin": np.sin(2 * np.pi * month / 12),
+        "month_cos": np.cos(2 * np.pi * month / 12),
+        "day_sin": np.sin(2 * np.pi * day / 31),
+        "day_cos": np.cos(2 * np.pi * day / 31)
+    }
+
+def _keys(codes, days):
+    return np.asarray(codes, dtype=np.int64) * KEY_SPAN + (np.asarray(days, dtype=np.int64) + DAY_OFFSET)
+
+class StationHistory:
+    """A train's delay history packed into NumPy arrays sorted by (station, day).
+
+    Lag and rolling features for any (station, day) are resolved with searchsorted on
+    the packed keys, so building them for every training row or for every station at
+    one target date costs a few array passes rather than per-station DataFrame filters.
+
+    Feature definitions (identical for training and inference):
+    - prev_delay_N: delay exactly N days before, or the station's median if that day is missing
+    - rolling_mean_3 / rolling_median_7: mean/median of the station's last 3/7 days
+      before the date; with fewer days, the median of those available; with none, the
+      station's median
+
+    The station's median is taken over the full history at inference time. Training
+    rows pass point_in_time=True and use the median of the days strictly before the
+    row's date instead, so the fallback never sees the row's own delay or later days.
+    """
+
+    def __init__(self, stations, codes, days, delays, medians=None, last_day=None):
+        self.stations = np.asarray(stations, dtype=object)
+        keys = _keys(codes, days)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.codes = np.asarray(codes, dtype=np.int64)[order]
+        self.days = np.asarray(days, dtype=np.int64)[order]
+        self.delays = np.asarray(delays, dtype=float)[order]
+
+        station_ids = np.arange(len(self.stations))
+        self.starts = np.searchsorted(self.keys, station_ids * KEY_SPAN)
+        self.ends = np.searchsorted(self.keys, (station_ids + 1) * KEY_SPAN)
+        if medians is None:
+            medians = pd.Series(self.delays).groupby(self.codes).median().reindex(station_ids).to_numpy()
+        self.medians = np.nan_to_num(np.asarray(medians, dtype=float), nan=0.0)
+        if last_day is None and len(self.days):
+            last_day = self.days.max()
+        self.last_day = int(last_day) if last_day is not None else None
+        self._recent = None
+
+    @classmethod
+    def from_frame(cls, history, stations=None):
+        """Build from a DataFrame with date, station and delay_minutes columns.
+
+        Stations default to the order they first appear in the history.
+        """
+        if stations is None:
+            stations = history["station"].unique()
+        codes = pd.Index(stations).get_indexer(history["station"])
+        known = codes >= 0
+        return cls(
+            stations,
+            codes[known],
+            to_days(history["date"])[known],
+            history["delay_minutes"].to_numpy(dtype=float)[known]
+        )
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        """Approximate memory footprint in bytes."""
+        return int(self.keys.nbytes + self.codes.nbytes + self.days.nbytes + self.delays.nbytes
+                   + self.medians.nbytes + self.starts.nbytes + self.ends.nbytes
+                   + sum(len(str(s)) + 50 for s in self.stations))
+
+    def recent(self):
+        """The last STATE_DAYS rows per station, with medians from the full history.
+
+        Yields exactly the same features as the full history for any date after
+        `last_day`; computed once and cached on the instance.
+        """
+        if self._recent is None:
+            rank = np.arange(len(self.keys)) - self.starts[self.codes]
+            count = (self.ends - self.starts)[self.codes]
+            keep = rank >= count - STATE_DAYS
+            self._recent = StationHistory(self.stations, self.codes[keep], self.days[keep],
+                                          self.delays[keep], self.medians, self.last_day)
+        return self._recent
+
+    def with_day(self, day, delays):
+        """A new state with one more day of delays (one per station) after `last_day`.
+
+        Used to feed predicted days back into later days' features. Medians are kept
+        from the real history.
+        """
+        recent = self.recent()
+        station_ids = np.arange(len(self.stations))
+        return StationHistory(
+            self.stations,
+            np.concatenate([recent.codes, station_ids]),
+            np.concatenate([recent.days, np.full(len(station_ids), day, dtype=np.int64)]),
+            np.concatenate([recent.delays, np.asarray(delays, dtype=float)]),
+            self.medians,
+            day
+        )
+
+    def save(self, path):
+        """Write the arrays to a compressed .npz file (no pickled objects)."""
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                stations=np.asarray(self.stations, dtype=str),
+                codes=self.codes.astype(np.int32),
+                days=self.days.astype(np.int32),
+                delays=self.delays.astype(np.float32),
+                medians=self.medians,
+                last_day=np.int64(self.last_day if self.last_day is not None else -1)
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Read arrays written by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            last_day = int(data["last_day"])
+            return cls(
+                data["stations"].astype(object),
+                data["codes"],
+                data["days"],
+                data["delays"],
+                data["medians"],
+                last_day if last_day >= 0 else None
+            )
+
+    def prior_medians(self, codes, days):
+        """Each (station code, day) query's station median over the days strictly before it.
+
+        Queries with no earlier days get 0, as stations without history do.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(self.keys) == 0:
+            return np.zeros(len(codes))
+        expanding = (pd.Series(self.delays).groupby(self.codes).expanding().median()
+                     .reset_index(level=0, drop=True).sort_index().to_numpy())
+        cut = np.searchsorted(self.keys, _keys(codes, days))
+        found = cut > self.starts[codes]
+        return np.where(found, expanding[np.maximum(cut - 1, 0)], 0.0)
+
+    def features_at(self, codes, days, point_in_time=False):
+        """History features for (station code, day) queries. Returns name -> array.
+
+        With point_in_time, missing lags and windows fall back to prior_medians()
+        rather than the full-history median (used for training rows).
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        query_keys = _keys(codes, days)
+        medians = self.prior_medians(codes, days) if point_in_time else self.medians[codes]
+        features = {}
+
+        if len(self.keys) == 0:
+            for name in HISTORY_FEATURES:
+                features[name] = medians.copy()
+            return features
+
+        for lag in LAGS:
+            lag_keys = query_keys - lag
+            idx = np.searchsorted(self.keys, lag_keys)
+            safe_idx = np.minimum(idx, len(self.keys) - 1)
+            found = (idx < len(self.keys)) & (self.keys[safe_idx] == lag_keys)
+            features[f"prev_delay_{lag}"] = np.where(found, self.delays[safe_idx], medians)
+
+        # Each query's station rows strictly before its day end at `cut`
+        starts = self.starts[codes]
+        cut = np.searchsorted(self.keys, query_keys)
+        available = cut - starts
+        for name, window, agg in ROLLING_WINDOWS:
+            idx = cut[:, None] - np.arange(window, 0, -1)[None, :]
+            values = medians.copy()
+
+            # Full windows need no NaN handling, which keeps the common case fast
+            full = available >= window
+            window_values = self.delays[idx[full]]
+            values[full] = window_values.mean(axis=1) if agg == "mean" else np.median(window_values, axis=1)
+
+            # Short windows (a station's first days) use the median of what is available
+            partial = (available > 0) & ~full
+            if partial.any():
+                partial_values = np.where(idx[partial] >= starts[partial, None],
+                                          self.delays[np.maximum(idx[partial], 0)], np.nan)
+                values[partial] = np.nanmedian(partial_values, axis=1)
+            features[name] = values
+
+        return features
+
+    def features_for_date(self, target_date):
+        """History features of every station for one target date."""
+        return self.features_for_dates([target_date])
+
+    def features_for_dates(self, target_dates):
+        """History features of every station for several target dates, date-major.
+
+        When every date is after the history ends they are served from the small
+        recent() state.
+        """
+        target_days = to_days(target_dates)
+        source = self.recent() if self.last_day is not None and target_days.min() > self.last_day else self
+        station_ids = np.arange(len(self.stations))
+        return source.features_at(np.tile(station_ids, len(target_days)), np.repeat(target_days, len(station_ids)))
+
+def write_snapshot(history, path):
+    """Write a train's feature snapshot: each station's last STATE_DAYS delays and overall median.
+
+    The snapshot is a few KB and is all prediction needs for dates after the history
+    ends. Returns the snapshot.
+    """
+    snapshot = StationHistory.from_frame(history).recent()
+    snapshot.save(path)
+    return snapshot
+
+def build_training_frame(history):
+    """Build the feature frame for every row of a delay history.
+
+    Returns a DataFrame with date, station, delay_minutes and all features except
+    station_encoded (the encoder is fit by the caller), sorted by station and date.
+    """
+    station_history = StationHistory.from_frame(history)
+    frame = pd.DataFrame({
+        "date": station_history.days.astype("datetime64[D]").astype("datetime64[ns]"),
+        "station": station_history.stations[station_history.codes],
+        "delay_minutes": station_history.delays
+    })
+    for name, values in date_features(station_history.days).items():
+        frame[name] = values
+    for name, values in station_history.features_at(station_history.codes, station_history.days,
+                                                    point_in_time=True).items():
+        frame[name] = values
+    return frame
+
+def build_inference_frame(station_history, target_date):
+    """Build the feature frame for every station of a train on one target date.
+
+    Returns a DataFrame with station and all features except station_encoded.
+    """
+    return build_batch_inference_frame(station_history, [target_date])
+
+def build_batch_inference_frame(station_history, target_dates):
+    """Build the feature frame for every station of a train on each of `target_dates`.
+
+    Rows are date-major (all stations for the first date, then the next). Returns a
+    DataFrame with date, station and all features except station_encoded.
+    """
+    n_stations = len(station_history.stations)
+    days = np.repeat(to_days(target_dates), n_stations)
+    frame = pd.DataFrame({
+        "date": days.astype("datetime64[D]").astype("datetime64[ns]"),
+        "station": np.tile(station_history.stations, len(target_dates))
+    })
+    for name, values in date_features(days).items():
+        frame[name] = values
+    for name, values in station_history.features_for_dates(target_dates).items():
+        frame[name] = values
+    return frame
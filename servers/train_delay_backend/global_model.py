@@ -0,0 +1,210 @@
+import json
+import os
+import shutil
+import tempfile
+import argparse
+import logging
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import mean_absolute_error
+from artifact_cache import artifact_cache
+from model_io import save_model, load_inference_model, MODEL_SUFFIX
+from features import FEATURES, HISTORY_FEATURES, StationHistory, build_training_frame, build_batch_inference_frame
+from config import GLOBAL_MODEL_DIR, TRAINING_N_JOBS
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Per-train features plus the train's identity
+GLOBAL_FEATURES = ["train_encoded"] + FEATURES
+
+# Share of training rows with train identity and history hidden, so the model learns a
+# station-level prior for trains it has never seen
+COLD_START_FRACTION = 0.1
+
+MODEL_FILE = 'model' + MODEL_SUFFIX
+META_FILE = 'meta.json'
+VERSIONS_DIR = 'versions'
+CURRENT_LINK = 'current'
+VERSIONS_KEPT = 2  # the live version and the one before it
+
+def build_global_training_frame(combined):
+    """Build per-train features for a combined history with a train_number column."""
+    frames = []
+    for train_number, history in combined.groupby("train_number", sort=False):
+        frame = build_training_frame(history)
+        frame["train_number"] = str(train_number)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def train_global_model(data_file="combined_train_delay_data.csv", model_dir=GLOBAL_MODEL_DIR, combined=None,
+                       eval_days=14):
+    """Train one delay model across all trains, with train and station identity as features.
+
+    Reads the CSV written by mutiple_train_delay.py unless a `combined` DataFrame is
+    given. The last `eval_days` days of each train are held out to report MAE, then the
+    model is refit on everything. Writes model.ubj and meta.json (train and station
+    vocabularies, metrics) to a new version directory under `model_dir` and publishes
+    it by swapping the `current` symlink, so readers never see a model with another
+    version's meta. Returns the loaded GlobalModel.
+    """
+    model_dir = Path(model_dir)
+
+    if combined is None:
+        combined = pd.read_csv(data_file, parse_dates=["date"], dtype={"train_number": str})
+        logger.info(f"Loaded {len(combined)} rows from {data_file}")
+    combined = combined.assign(train_number=combined["train_number"].astype(str))
+
+    # Features see the full history; extreme delays are dropped as targets only
+    df = build_global_training_frame(combined)
+    df = df[(df["delay_minutes"] > -30) & (df["delay_minutes"] < 120)].reset_index(drop=True)
+    if len(df) < 2:
+        raise ValueError(f"Not enough delay data to train a global model ({len(df)} rows)")
+
+    trains = sorted(df["train_number"].unique())
+    stations = sorted(df["station"].unique())
+    df["train_encoded"] = pd.Index(trains).get_indexer(df["train_number"]).astype(float)
+    df["station_encoded"] = pd.Index(stations).get_indexer(df["station"])
+
+    rng = np.random.default_rng(42)
+    cold = rng.random(len(df)) < COLD_START_FRACTION
+    df.loc[cold, ["train_encoded"] + HISTORY_FEATURES] = np.nan
+
+    # Hold out each train's most recent days for evaluation
+    last_date = df.groupby("train_number")["date"].transform("max")
+    held_out = df["date"] > last_date - pd.Timedelta(days=eval_days)
+    metrics = {'rows': int(len(df)), 'trains': len(trains), 'stations': len(stations)}
+    if held_out.any() and (~held_out).sum() >= 2:
+        model = _new_regressor()
+        model.fit(df.loc[~held_out, GLOBAL_FEATURES], df.loc[~held_out, "delay_minutes"])
+        evaluation = df[held_out & ~cold]
+        metrics['mae'] = round(float(mean_absolute_error(
+            evaluation["delay_minutes"], model.predict(evaluation[GLOBAL_FEATURES]))), 3)
+        logger.info(f"Global model MAE on last {eval_days} days: {metrics['mae']:.2f} minutes")
+
+    model = _new_regressor()
+    model.fit(df[GLOBAL_FEATURES], df["delay_minutes"])
+
+    meta = {
+        'trained_at': datetime.now().timestamp(),
+        'features': GLOBAL_FEATURES,
+        'trains': trains,
+        'stations': stations,
+        'metrics': metrics
+    }
+    version_dir = _publish_version(model_dir, lambda path: (
+        save_model(model, path / MODEL_FILE),
+        (path / META_FILE).write_text(json.dumps(meta, indent=2), encoding='utf-8')
+    ))
+    logger.info(f"Saved global model for {len(trains)} trains and {len(stations)} stations to {version_dir}")
+    return GlobalModel(model, meta)
+
+def _new_regressor():
+    """Same settings as the per-train models in model.py."""
+    return xgb.XGBRegressor(
+        objective='reg:squarederror',
+        n_estimators=500,
+        max_depth=8,
+        learning_rate=0.05,
+        min_child_weight=3,
+        subsample=0.8,
+        colsample_bytree=0.8,
+        tree_method='hist',
+        n_jobs=TRAINING_N_JOBS,
+        random_state=42
+    )
+
+def _publish_version(model_dir, write):
+    """Write a new version directory with `write` and make it current in one atomic step.
+
+    Layout: <model_dir>/versions/<YYYYMMDDHHMMSSffffff>-<suffix>/{model.ubj, meta.json}, with
+    <model_dir>/current a relative symlink to the live version. Older versions beyond
+    VERSIONS_KEPT are removed; readers that already loaded them keep their objects.
+    """
+    versions_dir = model_dir / VERSIONS_DIR
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    version_dir = Path(tempfile.mkdtemp(prefix=f"{datetime.now():%Y%m%d%H%M%S%f}-", dir=versions_dir))
+    try:
+        write(version_dir)
+        # Renaming a fresh symlink over the old one swaps versions atomically
+        link = model_dir / f".{CURRENT_LINK}.{os.getpid()}.tmp"
+        link.unlink(missing_ok=True)
+        link.symlink_to(Path(VERSIONS_DIR) / version_dir.name)
+        os.replace(link, model_dir / CURRENT_LINK)
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    for old_dir in sorted(versions_dir.iterdir(), reverse=True)[VERSIONS_KEPT:]:
+        if old_dir != version_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    return version_dir
+
+def _current_version_dir(model_dir):
+    """The live version directory, or `model_dir` itself for models saved by older releases."""
+    current = model_dir / CURRENT_LINK
+    return current.resolve() if current.is_symlink() else model_dir
+
+class GlobalModel:
+    """A single delay model serving every train, including trains it has not seen."""
+
+    def __init__(self, model, meta):
+        self.model = model
+        self.meta = meta
+        self.trains = pd.Index(meta['trains'])
+        self.stations = pd.Index(meta['stations'])
+
+    @classmethod
+    def load(cls, model_dir=GLOBAL_MODEL_DIR):
+        """Load the global model through the artifact cache, or None if it has not been trained."""
+        version_dir = _current_version_dir(Path(model_dir))
+        try:
+            meta = artifact_cache.get(version_dir / META_FILE, lambda path: json.loads(path.read_text(encoding='utf-8')))
+            model = artifact_cache.get(version_dir / MODEL_FILE, load_inference_model)
+        except FileNotFoundError:
+            return None
+        return cls(model, meta)
+
+    def knows(self, train_number):
+        """Whether the train was in the training data."""
+        return str(train_number) in self.trains
+
+    def predict(self, train_number, target_dates, station_history=None, stations=None):
+        """Predict delays for a train on each of `target_dates`.
+
+        With a StationHistory, lag and rolling features come from it; otherwise (cold
+        start) only `stations` are needed and history features are left missing.
+        Returns a list of {station: delay} aligned with `target_dates`.
+        """
+        if station_history is not None:
+            frame = build_batch_inference_frame(station_history, target_dates)
+        else:
+            frame = build_batch_inference_frame(StationHistory(stations, [], [], []), target_dates)
+            frame[HISTORY_FEATURES] = np.nan
+
+        n_stations = len(frame) // len(target_dates)
+        train_code = self.trains.get_indexer([str(train_number)])[0]
+        frame["train_encoded"] = float(train_code) if train_code >= 0 else np.nan
+        station_codes = self.stations.get_indexer(frame["station"]).astype(float)
+        frame["station_encoded"] = np.where(station_codes >= 0, station_codes, np.nan)
+
+        predicted = self.model.predict(frame[GLOBAL_FEATURES]).reshape(len(target_dates), n_stations)
+        station_names = frame["station"].to_numpy()[:n_stations]
+        return [{station: round(float(delay), 2) for station, delay in zip(station_names, delays)}
+                for delays in predicted]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the global cross-train delay model")
+    parser.add_argument("--data", default="combined_train_delay_data.csv",
+                        help="Combined history CSV written by mutiple_train_delay.py")
+    parser.add_argument("--model-dir", default=str(GLOBAL_MODEL_DIR))
+    parser.add_argument("--eval-days", type=int, default=14)
+    args = parser.parse_args()
+    train_global_model(args.data, args.model_dir, eval_days=args.eval_days)
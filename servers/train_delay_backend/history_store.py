@@ -0,0 +1,146 @@
+import sqlite3
+import time
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+import pandas as pd
+from delay_scrapper import fetch_history_html, parse_delay_records, HISTORY_WINDOWS
+from config import HISTORY_DB, HISTORY_RETENTION_DAYS, HISTORY_MIN_REFRESH_MINUTES
+from tracing import span, current_span
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class HistoryStore:
+    """Local SQLite store of daily per-station delays, keyed by train, station and date.
+
+    A refresh downloads only the shortest etrain history window that covers the days
+    since the last stored date and merges it idempotently, instead of re-fetching a
+    full year every time.
+    """
+
+    def __init__(self, db_path=HISTORY_DB, retention_days=HISTORY_RETENTION_DAYS,
+                 min_refresh_minutes=HISTORY_MIN_REFRESH_MINUTES):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.retention_days = retention_days
+        self.min_refresh_seconds = min_refresh_minutes * 60
+        self._init_db()
+
+    def _connect(self):
+        """Open a connection; one per operation keeps the store safe to share between threads."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """Create tables if they don't exist."""
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS delays (
+                    train_number TEXT NOT NULL,
+                    station TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    delay_minutes REAL NOT NULL,
+                    PRIMARY KEY (train_number, station, date)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS refreshes (
+                    train_number TEXT PRIMARY KEY,
+                    last_date TEXT,
+                    refreshed_at REAL NOT NULL,
+                    window TEXT NOT NULL
+                )
+            """)
+
+    def get_refresh_state(self, train_number):
+        """Get the last stored date and last refresh time for a train, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT last_date, refreshed_at, window FROM refreshes WHERE train_number = ?",
+                (str(train_number),)
+            ).fetchone()
+        if not row:
+            return None
+        return {'last_date': row[0], 'refreshed_at': row[1], 'window': row[2]}
+
+    def choose_window(self, last_date):
+        """Pick the shortest history window that covers the days since `last_date`."""
+        if not last_date:
+            return HISTORY_WINDOWS[-1][0]
+        gap_days = (datetime.now().date() - datetime.strptime(last_date, '%Y-%m-%d').date()).days
+        for window, days in HISTORY_WINDOWS:
+            if days >= gap_days:
+                return window
+        return HISTORY_WINDOWS[-1][0]
+
+    def merge(self, train_number, records, window):
+        """Upsert delay records for a train; re-merging the same records is a no-op."""
+        rows = [(str(train_number), r['station'], r['date'], float(r['delay_minutes'])) for r in records]
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO delays (train_number, station, date, delay_minutes) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            # Drop days that fell out of the retention window
+            conn.execute("DELETE FROM delays WHERE train_number = ? AND date < ?", (str(train_number), cutoff))
+            last_date = conn.execute(
+                "SELECT MAX(date) FROM delays WHERE train_number = ?", (str(train_number),)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO refreshes (train_number, last_date, refreshed_at, window) VALUES (?, ?, ?, ?)",
+                (str(train_number), last_date, time.time(), window)
+            )
+        return len(rows)
+
+    def load(self, train_number):
+        """Load a train's stored history as a DataFrame with date, station and delay_minutes."""
+        with self._connect() as conn:
+            df = pd.read_sql_query(
+                "SELECT date, station, delay_minutes FROM delays WHERE train_number = ? ORDER BY date, station",
+                conn,
+                params=(str(train_number),),
+                parse_dates=["date"]
+            )
+        return df
+
+    @span('history_refresh')
+    def refresh(self, train_name, train_number):
+        """Bring a train's stored history up to date and return it.
+
+        Returns the stored history (possibly stale if the download failed), or None if
+        nothing is stored and no delay data could be downloaded.
+        """
+        state = self.get_refresh_state(train_number)
+        current_span().set_attributes({'train.number': train_number,
+                                       'history.last_date': state['last_date'] if state else None})
+        if state and time.time() - state['refreshed_at'] < self.min_refresh_seconds:
+            logger.info(f"History for train {train_number} refreshed recently, using stored data")
+            current_span().set_attribute('history.downloaded', False)
+            return self.load(train_number)
+
+        window = self.choose_window(state['last_date'] if state else None)
+        logger.info(f"Refreshing history for train {train_number} "
+                    f"(last stored date: {state['last_date'] if state else 'none'}, window: {window})")
+
+        html = fetch_history_html(train_name, train_number, window=window)
+        records = parse_delay_records(html) if html else []
+        if records:
+            merged = self.merge(train_number, records, window)
+            logger.info(f"Merged {merged} delay records for train {train_number}")
+            current_span().set_attribute('history.merged_records', merged)
+        elif not state:
+            logger.warning(f"No delay history available for train {train_number}")
+            return None
+        else:
+            logger.warning(f"History refresh failed for train {train_number}, using stored data")
+
+        return self.load(train_number)
@@ -0,0 +1,212 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from config import METRICS_STAGE_BUCKETS
+from tracing import span, SPAN_KIND_INTERNAL
+
+# Content type of the Prometheus text exposition format rendered by render()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class MetricsRegistry:
+    """The metrics of a process, rendered together for /metrics."""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if any(existing.name == metric.name for existing in self.metrics):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics.append(metric)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# Shared by every module in the process
+default_registry = MetricsRegistry()
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f"{name}=\"{value}\"" for name, value in zip(labels, escaped)) + "}"
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+class _Metric:
+    """A named metric with one value per combination of label values.
+
+    Values are either updated as things happen or, after set_function(), read from a
+    callback each time the metrics are rendered.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=default_registry):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}  # label values -> value
+        self.lock = threading.Lock()
+        self.function = None
+        registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, function):
+        """Read the values from `function` at render time instead.
+
+        `function` returns a number for an unlabelled metric, or a dict mapping label
+        values (a tuple, or a single value for one label) to numbers.
+        """
+        self.function = function
+
+    def _current(self):
+        if self.function is None:
+            with self.lock:
+                return dict(self.values)
+        values = self.function()
+        if not isinstance(values, dict):
+            return {(): values}
+        return {key if isinstance(key, tuple) else (key,): value for key, value in values.items()}
+
+    def samples(self):
+        """(name suffix, labels, value) of every series."""
+        for key, value in sorted(self._current().items()):
+            yield "", dict(zip(self.labelnames, key)), value
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        """Count the enclosed block while it runs; also usable as a decorator."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_STAGE_BUCKETS, registry=default_registry):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        with self.lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield "_bucket", dict(labels, le=_format_value(bound)), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+# Pipeline metrics, updated by the modules that do the work
+stage_seconds = Histogram(
+    'train_delay_stage_duration_seconds',
+    'Time spent in each pipeline stage.',
+    ['stage']
+)
+request_seconds = Histogram(
+    'train_delay_http_request_duration_seconds',
+    'Time to handle an API request, by endpoint and status code.',
+    ['endpoint', 'status']
+)
+scrape_failures = Counter(
+    'train_delay_scrape_failures_total',
+    'etrain pages that could not be downloaded or had no data, by page kind and reason.',
+    ['page', 'reason']
+)
+no_data_fallbacks = Counter(
+    'train_delay_no_data_fallbacks_total',
+    'Trains or schedules answered with "no data found" delays, by reason.',
+    ['reason']
+)
+model_lookups = Counter(
+    'train_delay_model_lookups_total',
+    'Registry lookups for a fresh model when processing a train, by result (hit or miss).',
+    ['result']
+)
+in_flight = Gauge(
+    'train_delay_in_flight',
+    'Work in progress: API requests, trains being processed and models being trained.',
+    ['kind']
+)
+queue_depth = Gauge(
+    'train_delay_queue_depth',
+    'Tasks waiting in the pipeline worker pool, background model builds and queued training jobs.',
+    ['queue']
+)
+artifact_cache_events = Counter(
+    'train_delay_artifact_cache_events_total',
+    'Artifact cache lookups and removals, by event (hit, miss, invalidation or eviction).',
+    ['event']
+)
+artifact_cache_bytes = Gauge(
+    'train_delay_artifact_cache_bytes',
+    'Estimated size of the objects held in the artifact cache.'
+)
+
+@contextmanager
+def timed(stage, attributes=None, kind=SPAN_KIND_INTERNAL):
+    """Record the duration of the enclosed block as `stage`, traced as a span of that name.
+
+    Yields the span (see tracing.span); also usable as a decorator.
+    """
+    start = time.perf_counter()
+    try:
+        with span(stage, attributes, kind) as current:
+            yield current
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
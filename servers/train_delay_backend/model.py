@@ -1,27 +1,93 @@
 import pandas as pd
 import numpy as np
-import joblib
 import xgboost as xgb
 import os
+import time
 from pathlib import Path
-from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.model_selection import train_test_split
+from features import FEATURES, build_training_frame
+from model_io import StationEncoder, save_model, load_model, load_encoder, MODEL_SUFFIX, ENCODER_SUFFIX
+from model_selection import candidate_kinds, fit_simple, select_model
+from config import (INCREMENTAL_TREES, INCREMENTAL_LEARNING_RATE, INCREMENTAL_WINDOW_DAYS,
+                    TRAINING_TIME_BUDGET_SECONDS, TRAINING_N_JOBS, TRAINING_EARLY_STOPPING_ROUNDS,
+                    TRAINING_HOLDOUT_DAYS, MODEL_SELECTION)
 
-def train_model(train_number):
-    """Train a model for predicting delays for a given train."""
+class TimeBudget(xgb.callback.TrainingCallback):
+    """Stop boosting once a wall-clock budget (in seconds) is spent."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.start = None
+
+    def before_training(self, model):
+        self.start = time.monotonic()
+        return model
+
+    def after_iteration(self, model, epoch, evals_log):
+        return time.monotonic() - self.start >= self.seconds
+
+def split_recent(df, days):
+    """Split a feature frame into (earlier rows, rows of the last `days` days).
+
+    Histories too short to hold out whole days get a random 80/20 split instead.
+    """
+    recent = df["date"] > df["date"].max() - pd.Timedelta(days=days)
+    if recent.all() or not recent.any():
+        return train_test_split(df, test_size=0.2, random_state=42)
+    return df[~recent], df[recent]
+
+def train_model(train_number, history_file=None, model_file=None, encoder_file=None, history=None,
+                base_model_file=None, base_encoder_file=None, base_trained_through=None,
+                recent_days=INCREMENTAL_WINDOW_DAYS,
+                time_budget=TRAINING_TIME_BUDGET_SECONDS, n_jobs=TRAINING_N_JOBS,
+                early_stopping_rounds=TRAINING_EARLY_STOPPING_ROUNDS, holdout_days=TRAINING_HOLDOUT_DAYS,
+                model_selection=MODEL_SELECTION):
+    """Train a model for predicting delays for a given train.
+
+    By default reads `{train_number}.csv` and saves to `pipeline_output/`; the model
+    registry passes explicit paths inside its staging directory instead. A history
+    DataFrame passed as `history` is used directly instead of reading a CSV. The model
+    is saved in XGBoost's native format and the encoder as a JSON table (see model_io).
+
+    With `base_model_file` and `base_encoder_file`, training is incremental: the saved
+    model keeps boosting for INCREMENTAL_TREES more trees (at a lower learning rate) on
+    only the last `recent_days` days, reusing the saved station encoding. Features still see the
+    full history, so lags for those days are exact. The update is early-stopped and scored
+    only on days after `base_trained_through`, the last day of the base model's history,
+    since the base model has fit the days before it; without such days it is skipped.
+
+    The last `holdout_days` days are held out (see split_recent). A full training
+    backtests the model kinds its history size allows (median, smoothing, ridge,
+    XGBoost; see model_selection.py) on them and keeps the simplest one within
+    SELECTION_TOLERANCE of the best, so small trains skip XGBoost entirely. Incremental
+    training always continues the XGBoost base model, and with `model_selection=False`
+    XGBoost is always trained.
+
+    Boosting uses the `hist` tree method on `n_jobs` threads and stops early once the
+    `holdout_days` days before the held-out ones stop improving for
+    `early_stopping_rounds` trees, or once `time_budget` seconds are spent (0 for no
+    budget); either way the best iteration found so far is kept. No candidate trains
+    or tunes on the held-out days, so they score all candidates alike. The selection,
+    duration, tree count and metrics are attached to the returned model as
+    `training_stats_`.
+    """
     # Create output directory
     output_dir = Path("pipeline_output")
     output_dir.mkdir(exist_ok=True)
     
     # Initialize file paths
-    train_file = Path(f"{train_number}.csv")
-    model_file = output_dir / f"{train_number}_model.pkl"
-    encoder_file = output_dir / f"{train_number}_encoder.pkl"
+    train_file = Path(history_file) if history_file else Path(f"{train_number}.csv")
+    model_file = Path(model_file) if model_file else output_dir / f"{train_number}_model{MODEL_SUFFIX}"
+    encoder_file = Path(encoder_file) if encoder_file else output_dir / f"{train_number}_encoder{ENCODER_SUFFIX}"
     
     # Load and preprocess data
-    df = pd.read_csv(train_file, parse_dates=["date"])
-    print(f"\nLoaded {len(df)} rows from {train_file}")
+    if history is not None:
+        df = history.copy()
+        print(f"\nUsing {len(df)} rows of in-memory history")
+    else:
+        df = pd.read_csv(train_file, parse_dates=["date"])
+        print(f"\nLoaded {len(df)} rows from {train_file}")
     print("\nSample data:")
     print(df.head())
     
@@ -30,6 +96,9 @@ def train_model(train_number):
         print(f"Not enough delay data for train {train_number} (only {len(df)} samples)")
         return None, None
     
+    # Build features on the full history so lags still see days that get filtered below
+    df = build_training_frame(df)
+    
     # Filter out extreme delays
     df = df[(df["delay_minutes"] > -30) & (df["delay_minutes"] < 120)]
     print(f"\nAfter filtering extreme delays: {len(df)} rows")
@@ -41,42 +110,36 @@ def train_model(train_number):
         print(f"Not enough valid delay data for train {train_number} after filtering (only {len(df)} samples)")
         return None, None
     
-    # Add date features
-    df["month"] = df["date"].dt.month
-    df["day"] = df["date"].dt.day
-    df["year"] = df["date"].dt.year
-    df["day_of_week"] = df["date"].dt.dayofweek
-    df["is_weekend"] = df["day_of_week"].isin([5,6]).astype(int)
-    df["month_sin"] = np.sin(2 * np.pi * df["month"] / 12)
-    df["month_cos"] = np.cos(2 * np.pi * df["month"] / 12)
-    df["day_sin"] = np.sin(2 * np.pi * df["day"] / 31)
-    df["day_cos"] = np.cos(2 * np.pi * df["day"] / 31)
-    
-    # Encode stations
-    encoder = LabelEncoder()
-    df["station_encoded"] = encoder.fit_transform(df["station"])
-    print("\nStation encoding:")
-    for station, code in zip(encoder.classes_, range(len(encoder.classes_))):
-        print(f"{station}: {code}")
-    
-    # Sort by station and date
-    df = df.sort_values(["station", "date"])
-    
-    # Add lag features
-    for lag in range(1, 4):
-        df[f"prev_delay_{lag}"] = df.groupby("station")["delay_minutes"].shift(lag).fillna(0)
-    
-    # Add rolling features
-    df["rolling_mean_3"] = df.groupby("station")["delay_minutes"].transform(lambda x: x.shift(1).rolling(3).mean()).fillna(0)
-    df["rolling_median_7"] = df.groupby("station")["delay_minutes"].transform(lambda x: x.shift(1).rolling(7).median()).fillna(0)
-    
-    # Define features
-    features = [
-        "station_encoded", "day", "month", "year", "day_of_week", "is_weekend",
-        "month_sin", "month_cos", "day_sin", "day_cos",
-        "prev_delay_1", "prev_delay_2", "prev_delay_3",
-        "rolling_mean_3", "rolling_median_7"
-    ]
+    base_model = None
+    if base_model_file and base_encoder_file:
+        # Incremental: keep the base model's station codes and train on recent days only
+        base_model = load_model(base_model_file)
+        # Older versions saved a LabelEncoder; re-saving as a table keeps the same codes
+        encoder = StationEncoder(load_encoder(base_encoder_file).classes_)
+        known = df["station"].isin(encoder.classes_)
+        if not known.all():
+            print(f"Dropping {(~known).sum()} rows of stations unknown to the base model")
+        df = df[known & (df["date"] > df["date"].max() - pd.Timedelta(days=recent_days))]
+        print(f"\nIncremental training on the last {recent_days} days: {len(df)} rows")
+        if len(df) < 2:
+            print(f"Not enough recent delay data for train {train_number} (only {len(df)} samples)")
+            return None, None
+        trained_through = pd.Timestamp(base_trained_through) if base_trained_through else df["date"].max()
+        unseen = df["date"] > trained_through
+        if unseen.sum() < 2:
+            print(f"Not enough delay data after {base_trained_through} to evaluate an update "
+                  f"for train {train_number} (only {unseen.sum()} samples)")
+            return None, None
+        df["station_encoded"] = encoder.transform(df["station"])
+    else:
+        # Encode stations
+        encoder = StationEncoder.fit(df["station"])
+        df["station_encoded"] = encoder.transform(df["station"])
+        print("\nStation encoding:")
+        for station, code in zip(encoder.classes_, range(len(encoder.classes_))):
+            print(f"{station}: {code}")
+    
+    features = FEATURES
     
     X = df[features]
     y = df["delay_minutes"]
@@ -84,21 +147,72 @@ def train_model(train_number):
     print("\nFeature statistics:")
     print(X.describe())
     
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    # Train model with better parameters
-    model = xgb.XGBRegressor(
-        objective='reg:squarederror',
-        n_estimators=500,  # Increased from 200
-        max_depth=8,       # Increased from 6
-        learning_rate=0.05, # Decreased from 0.1
-        min_child_weight=3,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        random_state=42
+    # Hold out the most recent days, the way the model will be used: on days after its history
+    if base_model is not None:
+        # Only days the base model has not seen can tell whether the update helps
+        holdout_days = max(1, min(holdout_days, df.loc[unseen, "date"].nunique() // 2))
+        rest, test_df = split_recent(df[unseen], holdout_days)
+        train_df = pd.concat([df[~unseen], rest])
+    else:
+        train_df, test_df = split_recent(df, holdout_days)
+    X_train, y_train = train_df[features], train_df["delay_minutes"]
+    X_test, y_test = test_df[features], test_df["delay_minutes"]
+    
+    # Small histories only backtest the cheap models; incremental runs keep boosting the base model
+    if base_model is not None:
+        kinds, notes = ['xgboost'], ['incremental update']
+    else:
+        kinds, notes = candidate_kinds(len(df), df["station"].nunique(), enabled=model_selection)
+    print(f"\nCandidate models: {', '.join(kinds)}")
+    
+    start = time.perf_counter()
+    candidates = {kind: fit_simple(kind, X_train, y_train) for kind in kinds if kind != 'xgboost'}
+    X_fit, y_fit = X_train, y_train
+    if 'xgboost' in kinds:
+        # Early stopping gets its own validation days, so the held-out days stay unseen until scoring
+        if len(train_df) >= 2:
+            fit_df, val_df = split_recent(train_df, holdout_days)
+            X_fit, y_fit = fit_df[features], fit_df["delay_minutes"]
+            X_val, y_val = val_df[features], val_df["delay_minutes"]
+        else:
+            X_val, y_val = X_train, y_train
+        
+        # Train model with better parameters; the validation split drives early stopping
+        callbacks = [xgb.callback.EarlyStopping(rounds=early_stopping_rounds, save_best=True)]
+        if time_budget:
+            callbacks.append(TimeBudget(time_budget))
+        xgb_model = xgb.XGBRegressor(
+            objective='reg:squarederror',
+            n_estimators=INCREMENTAL_TREES if base_model is not None else 500,  # Increased from 200
+            max_depth=8,       # Increased from 6
+            learning_rate=INCREMENTAL_LEARNING_RATE if base_model is not None else 0.05, # Decreased from 0.1
+            min_child_weight=3,
+            subsample=0.8,
+            colsample_bytree=0.8,
+            tree_method='hist',
+            n_jobs=n_jobs,
+            callbacks=callbacks,
+            random_state=42
+        )
+        xgb_start = time.perf_counter()
+        xgb_model.fit(
+            X_fit, y_fit,
+            eval_set=[(X_val, y_val)],
+            xgb_model=base_model.get_booster() if base_model is not None else None,
+            verbose=False
+        )
+        xgb_duration = time.perf_counter() - xgb_start
+        # Callbacks are only needed while fitting; don't keep them on the saved model
+        xgb_model.set_params(callbacks=None)
+        candidates['xgboost'] = xgb_model
+    
+    # Backtest every candidate on the held-out days and keep the simplest good enough one
+    selection = select_model(
+        {kind: mean_absolute_error(y_test, candidate.predict(X_test)) for kind, candidate in candidates.items()},
+        notes
     )
-    model.fit(X_train, y_train)
+    model = candidates[selection['chosen']]
+    print(f"Selected {selection['chosen']} model: {selection['reason']}")
     
     # Evaluate model
     y_pred = model.predict(X_test)
@@ -111,17 +225,55 @@ def train_model(train_number):
     print(f"RMSE: {rmse:.2f} minutes")
     print(f"R²:   {r2:.4f}")
     
-    # Print feature importance
-    feature_importance = pd.DataFrame({
-        'feature': features,
-        'importance': model.feature_importances_
-    }).sort_values('importance', ascending=False)
-    print("\nFeature importance:")
-    print(feature_importance)
-    
-    # Save model and encoder
-    joblib.dump(model, model_file)
-    joblib.dump(encoder, encoder_file)
+    if selection['chosen'] != 'xgboost':
+        # Simple models have no early stopping to feed, so they learn from every row once chosen
+        model.fit(X, y)
+    duration = time.perf_counter() - start
+    
+    # Record what the run cost, so CPU time can be weighed against accuracy per train
+    model.training_stats_ = {
+        'mode': 'incremental' if base_model is not None else 'full',
+        'model_kind': selection['chosen'],
+        'selection': selection,
+        'duration_seconds': round(duration, 3),
+        'training_rows': len(X_fit),
+        'validation_rows': len(X_train) - len(X_fit),
+        'eval_rows': len(X_test),
+        'mae': round(float(mae), 3),
+        'rmse': round(float(rmse), 3),
+        'r2': round(float(r2), 4)
+    }
+    if selection['chosen'] == 'xgboost':
+        base_trees = base_model.get_booster().num_boosted_rounds() if base_model is not None else 0
+        trees = model.get_booster().num_boosted_rounds()
+        if time_budget and xgb_duration >= time_budget:
+            stopped_by = 'time_budget'
+        elif trees - base_trees < model.get_params()['n_estimators']:
+            stopped_by = 'early_stopping'
+        else:
+            stopped_by = 'max_trees'
+        model.training_stats_.update({
+            'trees': trees,
+            'trees_added': trees - base_trees,
+            'stopped_by': stopped_by,
+            'n_jobs': n_jobs,
+            'tree_method': 'hist'
+        })
+        print(f"Trained {trees - base_trees} trees ({trees} total) in {xgb_duration:.2f}s, stopped by {stopped_by}")
+        
+        # Print feature importance
+        feature_importance = pd.DataFrame({
+            'feature': features,
+            'importance': model.feature_importances_
+        }).sort_values('importance', ascending=False)
+        print("\nFeature importance:")
+        print(feature_importance)
+    else:
+        print(f"Trained {', '.join(candidates)} models in {duration:.2f}s")
+    
+    # Save model and encoder; simple models go to a .json file next to model_file
+    save_model(model, model_file)
+    encoder.save(encoder_file)
     print(f"\nModel and encoder saved for train {train_number}")
     
     return model, encoder
@@ -0,0 +1,137 @@
+import json
+import logging
+from pathlib import Path
+import numpy as np
+import xgboost as xgb
+from tree_engine import FlatEnsemble
+from simple_models import SIMPLE_MODELS
+from config import INFERENCE_BACKEND
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Models are stored in XGBoost's own binary format and encoders as JSON tables; .pkl
+# files written by older versions are still read
+MODEL_SUFFIX = '.ubj'
+ENCODER_SUFFIX = '.json'
+LEGACY_SUFFIX = '.pkl'
+# The median, smoothing and ridge models of simple_models.py are small JSON documents
+SIMPLE_MODEL_SUFFIX = '.json'
+
+class StationEncoder:
+    """Station name -> integer code table, a drop-in for a fitted sklearn LabelEncoder.
+
+    Codes are positions in the sorted station list, exactly as LabelEncoder assigns
+    them, so models trained with either encoder read the same codes.
+    """
+
+    def __init__(self, stations):
+        self.classes_ = np.asarray(sorted(set(stations)), dtype=object)
+        self._index = {station: code for code, station in enumerate(self.classes_)}
+
+    @classmethod
+    def fit(cls, stations):
+        """Build an encoder for the stations in `stations`."""
+        return cls(stations)
+
+    def transform(self, stations):
+        """Encode stations; raises ValueError on a station the encoder has not seen."""
+        try:
+            return np.fromiter((self._index[station] for station in stations), dtype=np.int64, count=len(stations))
+        except KeyError as e:
+            raise ValueError(f"y contains previously unseen labels: {e.args[0]!r}") from None
+
+    def save(self, path):
+        """Write the table as JSON: {"stations": {station: code}}."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'stations': self._index}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by save()."""
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)['stations']
+        encoder = cls(table)
+        if encoder._index != table:
+            raise ValueError(f"Encoder table in {path} is not a sorted station index")
+        return encoder
+
+def legacy_fallback(path):
+    """Return `path`, or its .pkl sibling if only a file from an older version exists."""
+    path = Path(path)
+    legacy = path.with_suffix(LEGACY_SUFFIX)
+    if path.suffix != LEGACY_SUFFIX and not path.exists() and legacy.exists():
+        return legacy
+    return path
+
+def model_fallback(path):
+    """Return the model file saved for `path`: itself, its simple-model .json sibling or a legacy .pkl."""
+    path = Path(path)
+    simple = path.with_suffix(SIMPLE_MODEL_SUFFIX)
+    if not path.exists() and simple.exists():
+        return simple
+    return legacy_fallback(path)
+
+def save_model(model, path):
+    """Save a model and return the path written.
+
+    XGBRegressors are saved in XGBoost's native format (UBJSON for .ubj, JSON for
+    .json); simple models as {"kind": ..., **model.to_dict()} next to `path` with the
+    .json suffix, replacing a tree model saved there before so model_fallback finds it.
+    """
+    path = Path(path)
+    if getattr(model, 'kind', None) in SIMPLE_MODELS:
+        simple = path.with_suffix(SIMPLE_MODEL_SUFFIX)
+        with open(simple, 'w', encoding='utf-8') as f:
+            json.dump({'kind': model.kind, **model.to_dict()}, f)
+        if path != simple:
+            path.unlink(missing_ok=True)
+        return simple
+    model.save_model(str(path))
+    return path
+
+def load_model(path):
+    """Load a model saved by save_model(), or a joblib pickle from an older version."""
+    path = Path(path)
+    if path.suffix == LEGACY_SUFFIX:
+        import joblib
+        return joblib.load(path)
+    if path.suffix == SIMPLE_MODEL_SUFFIX:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # XGBoost's own JSON models have no "kind"
+        if data.get('kind') in SIMPLE_MODELS:
+            return SIMPLE_MODELS[data['kind']].from_dict(data)
+    model = xgb.XGBRegressor()
+    model.load_model(str(path))
+    return model
+
+def inference_model(model, backend=INFERENCE_BACKEND):
+    """The object to predict with: the model itself, or its NumPy export with the 'numpy' backend.
+
+    Only XGBoost models are exported; models the NumPy engine can't represent keep
+    using XGBoost.
+    """
+    if backend != 'numpy' or not isinstance(model, xgb.XGBRegressor):
+        return model
+    try:
+        return FlatEnsemble.from_model(model)
+    except ValueError as e:
+        logger.warning(f"Using XGBoost for inference: {e}")
+        return model
+
+def load_inference_model(path):
+    """Load a model for prediction with the configured INFERENCE_BACKEND."""
+    return inference_model(load_model(path))
+
+def load_encoder(path):
+    """Load a StationEncoder table, or a pickled LabelEncoder from an older version."""
+    path = Path(path)
+    if path.suffix == LEGACY_SUFFIX:
+        import joblib
+        return joblib.load(path)
+    return StationEncoder.load(path)
@@ -0,0 +1,249 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from model_io import MODEL_SUFFIX, ENCODER_SUFFIX, legacy_fallback, model_fallback
+from config import REGISTRY_DIR, MODEL_TTL_HOURS, REGISTRY_MAX_BYTES, REGISTRY_VERSIONS_PER_TRAIN
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """Versioned on-disk store of trained models, keyed by train number and training date.
+
+    Layout: <root>/<train_number>/<YYYYMMDD>-<NNN>/{model.ubj, encoder.json, history.csv, features.npz, meta.json}
+    Versions published before the switch to native formats hold model.pkl and encoder.pkl
+    instead, and are still served. Trains whose model selection picked a simple model
+    (see model_selection.py) hold model.json in place of model.ubj.
+
+    Versions are built in a private staging directory and published with a single
+    directory rename, so readers only ever see complete versions. The sequence number
+    keeps versions trained on the same day apart; names sort oldest to newest, including
+    the bare <YYYYMMDD> directories of older releases.
+    """
+
+    MODEL_FILE = 'model' + MODEL_SUFFIX
+    ENCODER_FILE = 'encoder' + ENCODER_SUFFIX
+    HISTORY_FILE = 'history.csv'
+    SNAPSHOT_FILE = 'features.npz'
+    META_FILE = 'meta.json'
+    STAGING_DIR = '.staging'
+    STAGING_MAX_AGE = 3600  # seconds before an abandoned staging dir is removed
+    PUBLISH_ATTEMPTS = 100
+
+    def __init__(self, root_dir=REGISTRY_DIR, ttl_hours=MODEL_TTL_HOURS,
+                 max_bytes=REGISTRY_MAX_BYTES, versions_per_train=REGISTRY_VERSIONS_PER_TRAIN):
+        self.root_dir = Path(root_dir)
+        self.staging_root = self.root_dir / self.STAGING_DIR
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_bytes = max_bytes
+        self.versions_per_train = max(1, versions_per_train)
+        self.lock = threading.Lock()
+
+        self.staging_root.mkdir(parents=True, exist_ok=True)
+        logger.info(f"Initialized model registry at {self.root_dir} "
+                    f"(ttl: {ttl_hours}h, budget: {max_bytes / (1024 * 1024):.0f} MB)")
+
+    def _version_paths(self, version_dir):
+        """Get artifact paths for a version directory."""
+        version_dir = Path(version_dir)
+        return {
+            'dir': version_dir,
+            'model': model_fallback(version_dir / self.MODEL_FILE),
+            'encoder': legacy_fallback(version_dir / self.ENCODER_FILE),
+            'history': version_dir / self.HISTORY_FILE,
+            'snapshot': version_dir / self.SNAPSHOT_FILE,
+            'meta': version_dir / self.META_FILE
+        }
+
+    def _load_version(self, version_dir):
+        """Load a published version, or None if it is missing or incomplete."""
+        paths = self._version_paths(version_dir)
+        try:
+            with open(paths['meta'], 'r', encoding='utf-8') as f:
+                paths['metadata'] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if not (paths['model'].exists() and paths['encoder'].exists()):
+            return None
+        return paths
+
+    def _is_fresh(self, version):
+        """Check whether a version is still within the freshness TTL."""
+        trained_at = version['metadata'].get('trained_at', 0)
+        return time.time() - trained_at <= self.ttl_seconds
+
+    def _dir_size(self, path):
+        """Total size in bytes of the files in a directory."""
+        total = 0
+        for entry in Path(path).iterdir():
+            try:
+                if entry.is_file():
+                    total += entry.stat().st_size
+            except OSError:
+                continue
+        return total
+
+    def _next_sequence(self, train_dir, trained_on):
+        """Next free sequence number for versions trained on `trained_on`."""
+        sequence = 1
+        for version_dir in train_dir.glob(f"{trained_on}-*"):
+            suffix = version_dir.name[len(trained_on) + 1:]
+            if suffix.isdigit():
+                sequence = max(sequence, int(suffix) + 1)
+        return sequence
+
+    def list_versions(self, train_number):
+        """List published versions for a train, newest first."""
+        train_dir = self.root_dir / str(train_number)
+        if not train_dir.is_dir():
+            return []
+        versions = []
+        for version_dir in sorted(train_dir.iterdir(), reverse=True):
+            version = self._load_version(version_dir) if version_dir.is_dir() else None
+            if version:
+                versions.append(version)
+        return versions
+
+    def lookup(self, train_number, allow_stale=False):
+        """Get the newest fresh version for a train, or None if there is none."""
+        versions = self.list_versions(train_number)
+        if not versions:
+            return None
+
+        version = versions[0]
+        if not allow_stale and not self._is_fresh(version):
+            logger.info(f"Model for train {train_number} trained on "
+                        f"{version['metadata'].get('trained_on')} is stale")
+            return None
+
+        # Touch the version directory so eviction sees it as recently used
+        try:
+            os.utime(version['dir'])
+        except OSError:
+            pass
+        return version
+
+    def create_staging(self, train_number):
+        """Create a private directory to build a new version in."""
+        staging_dir = Path(tempfile.mkdtemp(prefix=f"{train_number}-", dir=self.staging_root))
+        return self._version_paths(staging_dir)
+
+    def discard(self, staging_dir):
+        """Remove a staging directory that will not be published."""
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def publish(self, train_number, staging_dir, metadata=None):
+        """Atomically publish a staged version and enforce the disk budget."""
+        staging = self._version_paths(staging_dir)
+        if not (staging['model'].exists() and staging['encoder'].exists()):
+            self.discard(staging_dir)
+            raise FileNotFoundError(f"Staged model files missing for train {train_number}")
+
+        now = datetime.now()
+        meta = {
+            'train_number': str(train_number),
+            'trained_on': now.strftime('%Y%m%d'),
+            'trained_at': now.timestamp(),
+            **(metadata or {})
+        }
+        meta['size_bytes'] = self._dir_size(staging_dir)
+        with open(staging['meta'], 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+        train_dir = self.root_dir / str(train_number)
+        train_dir.mkdir(parents=True, exist_ok=True)
+
+        # Each publish gets its own version; a same-day retrain never touches the live one
+        target = None
+        sequence = self._next_sequence(train_dir, meta['trained_on'])
+        for _ in range(self.PUBLISH_ATTEMPTS):
+            candidate = train_dir / f"{meta['trained_on']}-{sequence:03d}"
+            try:
+                os.rename(staging_dir, candidate)
+                target = candidate
+                break
+            except OSError:
+                # Another worker took this sequence number first
+                sequence += 1
+        if target is None:
+            self.discard(staging_dir)
+            raise OSError(f"Could not publish a new version for train {train_number}")
+
+        logger.info(f"Published model for train {train_number} at {target} "
+                    f"({meta['size_bytes'] / 1024:.1f} KB)")
+
+        self._prune_train(train_number, keep=target)
+        self.evict(keep=target)
+        return self._load_version(target)
+
+    def _prune_train(self, train_number, keep):
+        """Remove older versions beyond the per-train limit; lookups only ever serve the newest."""
+        versions = self.list_versions(train_number)
+        for version in versions[self.versions_per_train:]:
+            if version['dir'] != keep:
+                logger.info(f"Pruning old model version {version['dir']}")
+                shutil.rmtree(version['dir'], ignore_errors=True)
+
+    def evict(self, keep=None):
+        """Evict least recently used versions until the registry fits its disk budget."""
+        with self.lock:
+            self._cleanup_staging()
+
+            entries = []
+            total = 0
+            for train_dir in self.root_dir.iterdir():
+                if not train_dir.is_dir() or train_dir.name == self.STAGING_DIR:
+                    continue
+                for version_dir in train_dir.iterdir():
+                    if not version_dir.is_dir():
+                        continue
+                    try:
+                        last_used = version_dir.stat().st_mtime
+                    except OSError:
+                        continue
+                    size = self._dir_size(version_dir)
+                    total += size
+                    entries.append((last_used, size, version_dir))
+
+            if total <= self.max_bytes:
+                return 0
+
+            evicted = 0
+            for last_used, size, version_dir in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if keep is not None and version_dir == Path(keep):
+                    continue
+                logger.info(f"Evicting model version {version_dir} ({size / 1024:.1f} KB)")
+                shutil.rmtree(version_dir, ignore_errors=True)
+                total -= size
+                evicted += 1
+
+                # Drop empty train directories
+                try:
+                    version_dir.parent.rmdir()
+                except OSError:
+                    pass
+
+            logger.info(f"Evicted {evicted} model versions, registry size now {total / (1024 * 1024):.1f} MB")
+            return evicted
+
+    def _cleanup_staging(self):
+        """Remove staging directories abandoned by crashed workers."""
+        cutoff = time.time() - self.STAGING_MAX_AGE
+        for staging_dir in self.staging_root.iterdir():
+            try:
+                if staging_dir.stat().st_mtime < cutoff:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+            except OSError:
+                continue
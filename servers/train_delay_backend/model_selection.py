@@ -0,0 +1,60 @@
+from simple_models import SIMPLE_MODELS
+from config import (MODEL_SELECTION, SELECTION_MIN_ROWS_RIDGE, SELECTION_MIN_ROWS_XGBOOST,
+                    SELECTION_MIN_ROWS_PER_STATION, SELECTION_TOLERANCE)
+
+# Model kinds from simplest to most expensive; ties go to the simpler one
+MODEL_KINDS = ('median', 'ewma', 'ridge', 'xgboost')
+
+def candidate_kinds(rows, stations, enabled=MODEL_SELECTION):
+    """Model kinds worth backtesting for a history of `rows` rows over `stations` stations.
+
+    Returns (kinds, notes), where notes say why the larger models were left out:
+    - ridge needs SELECTION_MIN_ROWS_RIDGE rows to fit one coefficient per feature
+    - xgboost needs SELECTION_MIN_ROWS_XGBOOST rows and SELECTION_MIN_ROWS_PER_STATION
+      rows (days) per station to learn anything the lag features don't already say
+    With selection disabled, only xgboost is trained, as before.
+    """
+    if not enabled:
+        return ['xgboost'], ['model selection disabled']
+    kinds = ['median', 'ewma']
+    notes = []
+    if rows >= SELECTION_MIN_ROWS_RIDGE:
+        kinds.append('ridge')
+    else:
+        notes.append(f"{rows} rows < {SELECTION_MIN_ROWS_RIDGE} for ridge")
+    per_station = rows / max(1, stations)
+    if rows < SELECTION_MIN_ROWS_XGBOOST:
+        notes.append(f"{rows} rows < {SELECTION_MIN_ROWS_XGBOOST} for xgboost")
+    elif per_station < SELECTION_MIN_ROWS_PER_STATION:
+        notes.append(f"{per_station:.0f} rows per station < {SELECTION_MIN_ROWS_PER_STATION} for xgboost")
+    else:
+        kinds.append('xgboost')
+    return kinds, notes
+
+def fit_simple(kind, X, y):
+    """Fit a median, smoothing or ridge model on a feature frame."""
+    return SIMPLE_MODELS[kind]().fit(X, y)
+
+def select_model(errors, notes=(), tolerance=SELECTION_TOLERANCE):
+    """Pick the simplest kind whose backtest MAE is within `tolerance` of the best.
+
+    `errors` maps kind -> MAE on the held-out split. Returns the selection record kept
+    in the registry metadata: {"chosen", "reason", "backtest_mae"}.
+    """
+    best = min(errors, key=errors.get)
+    limit = errors[best] * (1 + tolerance)
+    chosen = next(kind for kind in MODEL_KINDS if kind in errors and errors[kind] <= limit)
+    if len(errors) == 1:
+        reason = "only candidate"
+    elif chosen == best:
+        reason = f"lowest backtest MAE ({errors[chosen]:.2f} min)"
+    else:
+        reason = (f"backtest MAE {errors[chosen]:.2f} min within {tolerance:.0%} of "
+                  f"{best} ({errors[best]:.2f} min)")
+    if notes:
+        reason += "; " + ", ".join(notes)
+    return {
+        'chosen': chosen,
+        'reason': reason,
+        'backtest_mae': {kind: round(float(error), 3) for kind, error in errors.items()}
+    }
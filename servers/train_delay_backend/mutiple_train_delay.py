@@ -4,6 +4,7 @@ import json
 from bs4 import BeautifulSoup
 import csv
 import time
+from config import ETRAIN_BASE_URL, SCRAPE_TIMEOUT_SECONDS
 
 # Predefined trains: (train_name, train_number)
 TRAINS = [
@@ -26,9 +27,9 @@ HEADERS = {
 }
 
 def download_html(train_name: str, train_number: str):
-    url = f"https://etrain.info/train/{train_name.replace(' ', '-')}-{train_number}/history?d=1y"
+    url = f"{ETRAIN_BASE_URL}/train/{train_name.replace(' ', '-')}-{train_number}/history?d=1y"
     print(f"Downloading HTML for {train_name} ({train_number})...")
-    response = requests.get(url, headers=HEADERS)
+    response = requests.get(url, headers=HEADERS, timeout=SCRAPE_TIMEOUT_SECONDS)
     if response.status_code == 200:
         return response.text
     else:
@@ -1,13 +1,16 @@
 import pandas as pd
 import numpy as np
-import joblib
 import os
 from pathlib import Path
 import logging
-from sklearn.preprocessing import LabelEncoder
 import signal
 from functools import wraps
 import time
+from artifact_cache import artifact_cache
+from features import FEATURES, StationHistory, build_inference_frame, build_batch_inference_frame, to_days
+from model_io import StationEncoder, load_inference_model, load_encoder, legacy_fallback, model_fallback, MODEL_SUFFIX, ENCODER_SUFFIX
+from metrics import timed, no_data_fallbacks
+from tracing import current_span
 
 # Set up logging
 logging.basicConfig(
@@ -35,34 +38,68 @@ def timeout(seconds):
         return wrapper
     return decorator
 
-def predict_delays(train_number, target_date):
-    """Predict delays for a train on a given date."""
-    logger.info(f"Starting prediction for train {train_number} on {target_date}")
-    
+def load_station_history(history_file):
+    """Load a delay history CSV into the compact arrays used to build features."""
+    return StationHistory.from_frame(pd.read_csv(history_file, parse_dates=["date"]))
+
+@timed('load_inputs')
+def load_prediction_inputs(train_number, target_date, model_file=None, encoder_file=None, history_file=None,
+                           model=None, encoder=None, history=None, snapshot_file=None):
+    """Load the model, encoder and packed history needed to predict from `target_date` on.
+
+    File paths default to the legacy `pipeline_output/` layout; pass the paths of a
+    model registry version to predict from it. Already-loaded `model`, `encoder` and
+    `history` objects are used as-is instead of reading the corresponding files.
+
+    Dates after the end of the history are predicted from the per-station feature
+    snapshot (`snapshot_file`) when one exists; the full history is read only for
+    dates inside it or when there is no snapshot.
+
+    Returns (model, encoder, station_history), or None if something is missing.
+    """
     # Initialize file paths
     output_dir = Path("pipeline_output")
-    model_file = output_dir / f"{train_number}_model.pkl"
-    encoder_file = output_dir / f"{train_number}_encoder.pkl"
-    history_file = Path(f"{train_number}.csv")
+    model_file = Path(model_file) if model_file else model_fallback(output_dir / f"{train_number}_model{MODEL_SUFFIX}")
+    encoder_file = Path(encoder_file) if encoder_file else legacy_fallback(output_dir / f"{train_number}_encoder{ENCODER_SUFFIX}")
+    history_file = Path(history_file) if history_file else Path(f"{train_number}.csv")
+    snapshot_file = Path(snapshot_file) if snapshot_file else Path(f"{train_number}_features.npz")
     
+    current_span().set_attributes({'train.number': train_number, 'model.file': str(model_file)})
     try:
-        # Load model and encoder
+        # Load model and encoder (cached across calls until the files change)
         logger.info(f"Loading model and encoder for train {train_number}")
-        model = joblib.load(model_file)
-        encoder = joblib.load(encoder_file)
+        if model is None:
+            model = artifact_cache.get(model_file, load_inference_model)
+        if encoder is None:
+            encoder = artifact_cache.get(encoder_file, load_encoder)
         
         # Load and validate history data
-        logger.info(f"Loading history data from {history_file}")
-        if not history_file.exists():
-            logger.error(f"History file not found: {history_file}")
-            return None
-            
-        history = pd.read_csv(history_file, parse_dates=["date"])
-        if history.empty:
+        if history is not None:
+            station_history = StationHistory.from_frame(history)
+        else:
+            station_history = None
+            # The snapshot covers any date after the history ends without reading the full history
+            if snapshot_file.exists():
+                snapshot = artifact_cache.get(snapshot_file, StationHistory.load, sizer=lambda h: h.nbytes)
+                if snapshot.last_day is None or to_days([target_date])[0] > snapshot.last_day:
+                    logger.info(f"Using feature snapshot {snapshot_file}")
+                    current_span().set_attribute('history.source', 'snapshot')
+                    station_history = snapshot
+
+        if station_history is None:
+            logger.info(f"Loading history data from {history_file}")
+            if not history_file.exists():
+                logger.error(f"History file not found: {history_file}")
+                return None
+                
+            # Cached arrays are shared between requests and must not be modified in place
+            station_history = artifact_cache.get(history_file, load_station_history, sizer=lambda h: h.nbytes)
+            current_span().set_attribute('history.source', 'history')
+        if len(station_history) == 0:
             logger.error("History data is empty")
             return None
             
-        logger.info(f"Loaded {len(history)} rows from history file")
+        logger.info(f"Loaded {len(station_history)} rows of history")
 
     except FileNotFoundError as e:
         logger.error(f"Required file not found: {e}")
@@ -71,129 +108,162 @@ def predict_delays(train_number, target_date):
         logger.error(f"Error loading files: {e}")
         return None
 
-    # Filter stations from history - these define the train's route
-    stations = history["station"].unique()
-    target_date = pd.to_datetime(target_date)
-    
-    logger.info(f"Processing {len(stations)} stations for prediction")
-
-    # Prepare base DataFrame for prediction, one row per station for the target date
-    predict_df = pd.DataFrame({"station": stations})
-    predict_df["date"] = target_date
+    return model, encoder, station_history
 
+def encode_stations(encoder, stations):
+    """Encode station names, with handling for stations unseen in training."""
     try:
-        # Add date features same as training
-        predict_df["month"] = predict_df["date"].dt.month
-        predict_df["day"] = predict_df["date"].dt.day
-        predict_df["year"] = predict_df["date"].dt.year
-        predict_df["day_of_week"] = predict_df["date"].dt.dayofweek
-        predict_df["is_weekend"] = predict_df["day_of_week"].isin([5,6]).astype(int)
-        predict_df["month_sin"] = np.sin(2 * np.pi * predict_df["month"] / 12)
-        predict_df["month_cos"] = np.cos(2 * np.pi * predict_df["month"] / 12)
-        predict_df["day_sin"] = np.sin(2 * np.pi * predict_df["day"] / 31)
-        predict_df["day_cos"] = np.cos(2 * np.pi * predict_df["day"] / 31)
-
-        # Encode stations with handling for unseen stations
-        logger.info("Encoding stations")
-        try:
-            predict_df["station_encoded"] = encoder.transform(predict_df["station"])
-        except ValueError as e:
-            if "unseen labels" in str(e):
-                logger.warning("Found stations not in training data, using fallback encoding")
-                # Create a new encoder for unseen stations
-                new_encoder = LabelEncoder()
-                new_encoder.fit(history["station"])
-                # Transform using the new encoder
-                predict_df["station_encoded"] = new_encoder.transform(predict_df["station"])
-            else:
-                raise
-    except Exception as e:
-        logger.error(f"Error preparing features: {e}")
-        return {station: "no data found" for station in stations}
+        return encoder.transform(stations)
+    except ValueError as e:
+        if "unseen labels" in str(e):
+            logger.warning("Found stations not in training data, using fallback encoding")
+            # Create a new encoder for unseen stations
+            return StationEncoder.fit(stations).transform(stations)
+        raise
+
+def round_delays(predicted):
+    """Model outputs as Python floats rounded to 2 decimals, so they serialize cleanly to JSON."""
+    return [round(float(delay), 2) for delay in predicted]
+
+def predict_delays(train_number, target_date, model_file=None, encoder_file=None, history_file=None,
+                   model=None, encoder=None, history=None, snapshot_file=None):
+    """Predict delays for a train on a given date.
 
-    # To get lag features, merge with history delays for past days for each station
-    history_sorted = history.sort_values(["station", "date"])
-    lags = [1, 2, 3]
+    Takes the same file and object arguments as load_prediction_inputs.
+    """
+    logger.info(f"Starting prediction for train {train_number} on {target_date}")
+    
+    inputs = load_prediction_inputs(
+        train_number, target_date, model_file=model_file, encoder_file=encoder_file,
+        history_file=history_file, model=model, encoder=encoder, history=history,
+        snapshot_file=snapshot_file
+    )
+    if inputs is None:
+        return None
+    model, encoder, station_history = inputs
+
+    # Stations from history - these define the train's route
+    stations = station_history.stations
+    target_date = pd.to_datetime(target_date)
+    
+    logger.info(f"Processing {len(stations)} stations for prediction")
 
     try:
-        # For each lag, get delay from target_date - lag days
-        for lag in lags:
-            lag_date = target_date - pd.Timedelta(days=lag)
-            lag_data = history_sorted[history_sorted["date"] == lag_date][["station", "delay_minutes"]]
-            lag_data = lag_data.rename(columns={"delay_minutes": f"prev_delay_{lag}"})
-            predict_df = predict_df.merge(lag_data, on="station", how="left")
-
-        # Fill missing lag delays with median of that station's delays
-        station_medians = history_sorted.groupby("station")["delay_minutes"].median()
-        for lag in lags:
-            col = f"prev_delay_{lag}"
-            predict_df[col] = predict_df.apply(
-                lambda row: station_medians.get(row["station"], 0) 
-                if pd.isna(row[col]) else row[col], 
-                axis=1
-            )
+        # Date, lag and rolling features for every station, same as training
+        logger.info("Calculating date, lag and rolling features")
+        with timed('feature_build'):
+            predict_df = build_inference_frame(station_history, target_date)
     except Exception as e:
-        logger.error(f"Error calculating lag features: {e}")
+        logger.error(f"Error calculating features: {e}")
+        no_data_fallbacks.inc(reason='predict_error')
         return {station: "no data found" for station in stations}
 
-    # Rolling features: rolling mean (3 days), rolling median (7 days) before target date
-    def get_rolling_feature(station, date, window, agg_func):
-        try:
-            # filter dates before target date
-            s = history_sorted[(history_sorted["station"] == station) & (history_sorted["date"] < date)]
-            if len(s) < window:
-                # Use median of all delays for this station if not enough history
-                return s["delay_minutes"].median() if not s.empty else 0
-            if agg_func == "mean":
-                return s.tail(window)["delay_minutes"].mean()
-            if agg_func == "median":
-                return s.tail(window)["delay_minutes"].median()
-            return 0
-        except Exception as e:
-            logger.error(f"Error calculating rolling feature for station {station}: {e}")
-            return 0
-
     try:
-        logger.info("Calculating rolling features")
-        # Calculate rolling features for all stations at once
-        rolling_features = []
-        for st in stations:
-            rm = get_rolling_feature(st, target_date, 3, "mean")
-            rmd = get_rolling_feature(st, target_date, 7, "median")
-            rolling_features.append((rm, rmd))
-        
-        predict_df["rolling_mean_3"] = [x[0] for x in rolling_features]
-        predict_df["rolling_median_7"] = [x[1] for x in rolling_features]
+        logger.info("Encoding stations")
+        predict_df["station_encoded"] = encode_stations(encoder, predict_df["station"])
     except Exception as e:
-        logger.error(f"Error calculating rolling features: {e}")
+        logger.error(f"Error preparing features: {e}")
+        no_data_fallbacks.inc(reason='predict_error')
         return {station: "no data found" for station in stations}
 
-    # Prepare feature list same as training
-    features = [
-        "station_encoded", "day", "month", "year", "day_of_week", "is_weekend",
-        "month_sin", "month_cos", "day_sin", "day_cos",
-        "prev_delay_1", "prev_delay_2", "prev_delay_3",
-        "rolling_mean_3", "rolling_median_7"
-    ]
-
-    X_pred = predict_df[features]
+    X_pred = predict_df[FEATURES]
 
     try:
         # Predict delays
         logger.info("Making predictions")
-        predicted = model.predict(X_pred)
-        predicted = np.round(predicted, 2)
-        predict_df["predicted_delay"] = predicted
+        with timed('predict', {'train.number': train_number, 'rows': len(X_pred)}):
+            predicted = model.predict(X_pred)
+        predict_df["predicted_delay"] = round_delays(predicted)
     except Exception as e:
         logger.error(f"Error predicting delays: {e}")
+        no_data_fallbacks.inc(reason='predict_error')
         return {station: "no data found" for station in stations}
 
     # Convert to dictionary of station -> delay
-    delays = dict(zip(predict_df["station"], predict_df["predicted_delay"]))
+    delays = dict(zip(predict_df["station"], predict_df["predicted_delay"].tolist()))
     
     # Log predictions
     logger.info("\nPredicted delays:")
     for station, delay in delays.items():
         logger.info(f"{station}: {delay:.2f} minutes")
     
-    return delays
\ No newline at end of file
+    return delays
+
+def predict_delay_calendar(train_number, start_date, days, model_file=None, encoder_file=None, history_file=None,
+                           model=None, encoder=None, history=None, snapshot_file=None):
+    """Predict delays for a train on `days` consecutive dates starting at `start_date`.
+
+    Inputs are loaded once for the whole range. Days after the end of the history
+    are predicted in date order and each day's predictions are fed back as history,
+    so later days' lag and rolling features see the earlier predicted days.
+
+    Takes the same file and object arguments as load_prediction_inputs. Returns a list
+    of (date, {station: delay}) in date order, or None if inputs could not be loaded.
+    """
+    logger.info(f"Starting {days}-day prediction for train {train_number} from {start_date}")
+    
+    inputs = load_prediction_inputs(
+        train_number, start_date, model_file=model_file, encoder_file=encoder_file,
+        history_file=history_file, model=model, encoder=encoder, history=history,
+        snapshot_file=snapshot_file
+    )
+    if inputs is None:
+        return None
+    model, encoder, station_history = inputs
+
+    stations = station_history.stations
+    station_encoded = encode_stations(encoder, stations)
+    dates = pd.date_range(pd.to_datetime(start_date), periods=days, freq="D")
+    history_end = station_history.last_day
+
+    calendar = []
+    for date in dates:
+        # Each day needs the previous days' predictions, so days are predicted one at a time
+        with timed('feature_build'):
+            predict_df = build_inference_frame(station_history, date)
+        predict_df["station_encoded"] = station_encoded
+        with timed('predict', {'train.number': train_number, 'rows': len(predict_df)}):
+            predicted = round_delays(model.predict(predict_df[FEATURES]))
+        calendar.append((date, dict(zip(stations, predicted))))
+
+        day = int(to_days([date])[0])
+        if history_end is None or day > history_end:
+            station_history = station_history.with_day(day, predicted)
+
+    return calendar
+
+def predict_delays_for_dates(train_number, target_dates, model_file=None, encoder_file=None, history_file=None,
+                             model=None, encoder=None, history=None, snapshot_file=None):
+    """Predict delays for a train on several independent dates with one model call.
+
+    Each date is predicted exactly as predict_delays would (no predicted days are fed
+    back, unlike predict_delay_calendar); inputs are loaded once and the feature
+    matrix for all dates is built and scored in bulk.
+
+    Takes the same file and object arguments as load_prediction_inputs. Returns a list
+    of (date, {station: delay}) aligned with `target_dates`, or None if inputs could
+    not be loaded.
+    """
+    logger.info(f"Starting batch prediction for train {train_number} on {len(target_dates)} dates")
+    
+    # The snapshot only serves the batch if every date is after the history ends
+    inputs = load_prediction_inputs(
+        train_number, min(pd.to_datetime(target_dates)), model_file=model_file, encoder_file=encoder_file,
+        history_file=history_file, model=model, encoder=encoder, history=history,
+        snapshot_file=snapshot_file
+    )
+    if inputs is None:
+        return None
+    model, encoder, station_history = inputs
+
+    stations = station_history.stations
+    with timed('feature_build'):
+        predict_df = build_batch_inference_frame(station_history, target_dates)
+    predict_df["station_encoded"] = np.tile(encode_stations(encoder, stations), len(target_dates))
+    with timed('predict', {'train.number': train_number, 'rows': len(predict_df)}):
+        predicted = model.predict(predict_df[FEATURES]).reshape(len(target_dates), len(stations))
+
+    return [
+        (pd.to_datetime(date), dict(zip(stations, round_delays(delays))))
+        for date, delays in zip(target_dates, predicted)
+    ]
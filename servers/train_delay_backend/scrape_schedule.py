@@ -2,6 +2,13 @@ import requests
 from bs4 import BeautifulSoup
 import json
 import re
+from config import ETRAIN_BASE_URL, SCRAPE_TIMEOUT_SECONDS
+from metrics import timed, scrape_failures
+from tracing import current_span, SPAN_KIND_CLIENT
+
+def schedule_url(train_name, train_number):
+    """URL of a train's schedule page on ETRAIN_BASE_URL."""
+    return f"{ETRAIN_BASE_URL}/train/{train_name.replace(' ', '-')}-{train_number}/schedule"
 
 def get_station_info(station_cell):
     """Extract station information from a table cell."""
@@ -78,6 +85,7 @@ def get_train_info(soup):
     
     return train_info
 
+@timed('schedule_scrape', kind=SPAN_KIND_CLIENT)
 def scrape_train_schedule(url):
     """Scrape train schedule from the given URL."""
     headers = {
@@ -87,10 +95,15 @@ def scrape_train_schedule(url):
     }
     
     try:
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=headers, timeout=SCRAPE_TIMEOUT_SECONDS)
+        current_span().set_attributes({'http.url': url, 'http.status_code': response.status_code,
+                                       'http.response.body.size': len(response.content)})
         response.raise_for_status()
     except requests.RequestException as e:
         print(f"Error fetching URL: {e}")
+        reason = ('timeout' if isinstance(e, requests.Timeout)
+                  else 'http_error' if isinstance(e, requests.HTTPError) else 'request_error')
+        scrape_failures.inc(page='schedule', reason=reason)
         return None
     
     soup = BeautifulSoup(response.text, 'html.parser')
@@ -102,6 +115,7 @@ def scrape_train_schedule(url):
     schedule_table = soup.find('table', class_='fullw nocps nolrborder bx3_brl')
     if not schedule_table:
         print("Schedule table not found")
+        scrape_failures.inc(page='schedule', reason='no_data')
         return None
     
     # Get all station rows (excluding header)
@@ -132,6 +146,7 @@ def scrape_train_schedule(url):
         
         schedule.append(station_data)
     
+    current_span().set_attribute('station.count', len(schedule))
     return {
         'train_info': train_info,
         'schedule': schedule
@@ -144,7 +159,7 @@ def save_schedule_to_json(data, output_file):
     print(f"Schedule saved to {output_file}")
 
 def main():
-    url = "https://etrain.info/train/Poorva-Express-12303/schedule"
+    url = schedule_url("Poorva Express", "12303")
     print(f"Fetching schedule from: {url}")
     
     data = scrape_train_schedule(url)
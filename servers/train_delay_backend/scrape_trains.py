@@ -2,6 +2,9 @@ import requests
 from bs4 import BeautifulSoup
 import json
 import re
+from config import ETRAIN_BASE_URL, SCRAPE_TIMEOUT_SECONDS
+from metrics import timed, scrape_failures
+from tracing import current_span, SPAN_KIND_CLIENT
 
 # --- HARDCODED INPUTS ---
 src_name = "Howrah Jn"
@@ -16,9 +19,10 @@ def slugify(name, code):
 
 def build_url(src_name, src_code, dst_name, dst_code, date=None):
     # Updated URL format: https://etrain.info/trains/Howrah-Jn-HWH-to-Chittaranjan-CRJ?date=20250521
+    # (on ETRAIN_BASE_URL, so a local stand-in can serve it)
     src_slug = slugify(src_name, src_code)
     dst_slug = slugify(dst_name, dst_code)
-    url = f"https://etrain.info/trains/{src_slug}-to-{dst_slug}"
+    url = f"{ETRAIN_BASE_URL}/trains/{src_slug}-to-{dst_slug}"
     if date:
         url += f"?date={date}"
     return url
@@ -96,6 +100,7 @@ def get_train_info(row):
         print(f"Error processing row: {e}")
         return None
 
+@timed('listing_scrape', kind=SPAN_KIND_CLIENT)
 def scrape_trains_between(src_name, src_code, dst_name, dst_code, date=None, output_json=None):
     url = build_url(src_name, src_code, dst_name, dst_code, date)
     print(f"Fetching: {url}")
@@ -108,9 +113,16 @@ def scrape_trains_between(src_name, src_code, dst_name, dst_code, date=None, out
         'Connection': 'keep-alive',
     }
     
-    response = requests.get(url, headers=headers)
+    try:
+        response = requests.get(url, headers=headers, timeout=SCRAPE_TIMEOUT_SECONDS)
+    except requests.RequestException as e:
+        scrape_failures.inc(page='listing', reason='timeout' if isinstance(e, requests.Timeout) else 'request_error')
+        raise
+    current_span().set_attributes({'http.url': url, 'http.status_code': response.status_code,
+                                   'http.response.body.size': len(response.content)})
     if response.status_code != 200:
         print(f"Failed to fetch page: {response.status_code}")
+        scrape_failures.inc(page='listing', reason='http_error')
         return None
 
     # Parse HTML using BeautifulSoup
@@ -120,6 +132,7 @@ def scrape_trains_between(src_name, src_code, dst_name, dst_code, date=None, out
     train_rows = soup.find_all('tr', attrs={'data-train': True})
     if not train_rows:
         print("No train data found in the page.")
+        scrape_failures.inc(page='listing', reason='no_data')
         return None
     
     # Process the train data
@@ -128,6 +141,7 @@ def scrape_trains_between(src_name, src_code, dst_name, dst_code, date=None, out
         train_info = get_train_info(row)
         if train_info:
             trains.append(train_info)
+    current_span().set_attribute('train.count', len(trains))
     
     # Print first 3 trains for debug
     print("\nFirst 3 trains found:")
@@ -0,0 +1,122 @@
+import numpy as np
+from features import LAGS, FEATURES
+
+# Lightweight alternatives to XGBoost for trains with little history. They predict
+# from the same feature frame (FEATURES) as the tree models, so predict.py, the
+# artifact cache and the model registry treat every kind alike.
+
+class MedianModel:
+    """Each station's median delay in the training rows (the overall median for unknown stations)."""
+
+    kind = 'median'
+
+    def __init__(self, medians=None, default=0.0):
+        self.medians = dict(medians or {})
+        self.default = float(default)
+
+    def fit(self, X, y):
+        y = np.asarray(y, dtype=float)
+        codes = np.asarray(X["station_encoded"], dtype=np.int64)
+        self.medians = {int(code): float(np.median(y[codes == code])) for code in np.unique(codes)}
+        self.default = float(np.median(y)) if len(y) else 0.0
+        return self
+
+    def station_medians(self, X):
+        """Median delay of each row's station."""
+        return np.fromiter((self.medians.get(int(code), self.default) for code in X["station_encoded"]),
+                           dtype=float, count=len(X))
+
+    def predict(self, X):
+        return self.station_medians(X).astype(np.float32)
+
+    def to_dict(self):
+        return {'medians': {str(code): value for code, value in self.medians.items()}, 'default': self.default}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({int(code): value for code, value in data['medians'].items()}, data['default'])
+
+class SmoothingModel(MedianModel):
+    """Exponential smoothing over the last few days, with the station's median as the long-run level.
+
+    The prediction is alpha * sum((1 - alpha) ** (k - 1) * prev_delay_k) over the lag
+    features, plus the remaining (1 - alpha) ** len(LAGS) weight on the median; the
+    smoothing factor alpha is picked from a small grid by training error.
+    """
+
+    kind = 'ewma'
+    ALPHAS = (0.1, 0.2, 0.3, 0.5, 0.7)
+
+    def __init__(self, medians=None, default=0.0, alpha=0.3):
+        super().__init__(medians, default)
+        self.alpha = float(alpha)
+
+    def fit(self, X, y):
+        super().fit(X, y)
+        y = np.asarray(y, dtype=float)
+        errors = {}
+        for alpha in self.ALPHAS:
+            self.alpha = alpha
+            errors[alpha] = np.abs(self.predict(X) - y).mean()
+        self.alpha = min(errors, key=errors.get)
+        return self
+
+    def predict(self, X):
+        weights = self.alpha * (1 - self.alpha) ** np.arange(len(LAGS))
+        lags = X[[f"prev_delay_{lag}" for lag in LAGS]].to_numpy(dtype=float)
+        level = (1 - self.alpha) ** len(LAGS) * self.station_medians(X)
+        return (lags @ weights + level).astype(np.float32)
+
+    def to_dict(self):
+        return {**super().to_dict(), 'alpha': self.alpha}
+
+    @classmethod
+    def from_dict(cls, data):
+        model = super().from_dict(data)
+        model.alpha = float(data['alpha'])
+        return model
+
+class RidgeModel:
+    """Closed-form ridge regression on the standardized numeric features.
+
+    The station code is left out: it is a label, not a quantity, and the lag and rolling
+    features already carry each station's level.
+    """
+
+    kind = 'ridge'
+    FEATURES = [name for name in FEATURES if name != "station_encoded"]
+
+    def __init__(self, coef=None, intercept=0.0, mean=None, scale=None, alpha=1.0):
+        self.coef = np.asarray(coef if coef is not None else np.zeros(len(self.FEATURES)), dtype=float)
+        self.intercept = float(intercept)
+        self.mean = np.asarray(mean if mean is not None else np.zeros(len(self.FEATURES)), dtype=float)
+        self.scale = np.asarray(scale if scale is not None else np.ones(len(self.FEATURES)), dtype=float)
+        self.alpha = float(alpha)
+
+    def fit(self, X, y):
+        X = X[self.FEATURES].to_numpy(dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.mean = X.mean(axis=0)
+        # Constant columns (e.g. year in a short history) get scale 1 and end up with a zero weight
+        std = X.std(axis=0)
+        self.scale = np.where(std > 0, std, 1.0)
+        Z = (X - self.mean) / self.scale
+        self.intercept = float(y.mean())
+        self.coef = np.linalg.solve(Z.T @ Z + self.alpha * np.eye(Z.shape[1]), Z.T @ (y - self.intercept))
+        return self
+
+    def predict(self, X):
+        Z = (X[self.FEATURES].to_numpy(dtype=float) - self.mean) / self.scale
+        return (Z @ self.coef + self.intercept).astype(np.float32)
+
+    def to_dict(self):
+        return {'coef': self.coef.tolist(), 'intercept': self.intercept, 'mean': self.mean.tolist(),
+                'scale': self.scale.tolist(), 'alpha': self.alpha, 'features': self.FEATURES}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data['features'] != cls.FEATURES:
+            raise ValueError("Ridge model was trained on a different feature set")
+        return cls(data['coef'], data['intercept'], data['mean'], data['scale'], data['alpha'])
+
+SIMPLE_MODELS = {model.kind: model for model in (MedianModel, SmoothingModel, RidgeModel)}
@@ -0,0 +1,171 @@
+import os
+import re
+import threading
+import time
+import logging
+from pathlib import Path
+from config import SINGLE_FLIGHT_LOCK_DIR, SINGLE_FLIGHT_LOCK_TIMEOUT
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; fall back to per-process coalescing
+    fcntl = None
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """An in-flight computation that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single computation.
+
+    Within a process, later callers for a key wait for the first caller's result.
+    Across worker processes, the leader also holds an exclusive lock on a per-key lock
+    file; a worker that had to wait for it first runs `check` to pick up a result the
+    other worker persisted (e.g. a published model) before computing its own.
+    """
+
+    LOCK_MAX_AGE = 24 * 3600  # seconds before an unused lock file is removed
+    CLEANUP_INTERVAL = 3600
+
+    def __init__(self, lock_dir=SINGLE_FLIGHT_LOCK_DIR, lock_timeout=SINGLE_FLIGHT_LOCK_TIMEOUT):
+        self.lock_dir = Path(lock_dir)
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self.lock_timeout = lock_timeout
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.last_cleanup = time.time()
+
+    def do(self, key, fn, check=None, cross_process=True):
+        """Run `fn` once for `key` across concurrent callers and return its result.
+
+        Exceptions raised by `fn` are re-raised in every waiting caller.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.followers += 1
+                is_leader = False
+            else:
+                call = _Call()
+                self.calls[key] = call
+                self.leaders += 1
+                is_leader = True
+
+        if not is_leader:
+            logger.info(f"Waiting for in-flight computation of {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if cross_process and fcntl is not None:
+                call.result = self._run_locked(key, fn, check)
+            else:
+                call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+            self._maybe_cleanup()
+
+    def _lock_path(self, key):
+        """Get the lock file path for a key."""
+        return self.lock_dir / (re.sub(r'[^A-Za-z0-9_.-]', '_', key) + '.lock')
+
+    def _run_locked(self, key, fn, check):
+        """Run `fn` while holding the key's file lock, shared with other worker processes."""
+        lock_path = self._lock_path(key)
+        waited = False
+        deadline = time.time() + self.lock_timeout
+        while True:
+            with open(lock_path, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if time.time() >= deadline:
+                        logger.warning(f"Timed out waiting for lock on {key}, computing without it")
+                        return fn()
+                    waited = True
+                    time.sleep(0.2)
+                    continue
+
+                try:
+                    # Cleanup may have removed the file after we opened it; lock the new one
+                    if not self._is_current(lock_file, lock_path):
+                        continue
+                    # flock does not touch mtime, so mark the file as in use for cleanup
+                    os.utime(lock_path)
+
+                    # Another worker may have finished the same work while we waited
+                    if waited and check is not None:
+                        result = check()
+                        if result is not None:
+                            logger.info(f"Reusing result of {key} computed by another worker")
+                            return result
+                    return fn()
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _is_current(lock_file, lock_path):
+        """Whether an open lock file is still the one at `lock_path`."""
+        try:
+            current = os.stat(lock_path)
+        except FileNotFoundError:
+            return False
+        opened = os.fstat(lock_file.fileno())
+        return (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino)
+
+    def _maybe_cleanup(self):
+        """Remove stale lock files, at most once per CLEANUP_INTERVAL.
+
+        A file is removed only while we hold its lock, so a lock another worker holds
+        is never unlinked from under it.
+        """
+        now = time.time()
+        if fcntl is None or now - self.last_cleanup < self.CLEANUP_INTERVAL:
+            return
+        self.last_cleanup = now
+        for lock_path in self.lock_dir.glob('*.lock'):
+            try:
+                if now - lock_path.stat().st_mtime <= self.LOCK_MAX_AGE:
+                    continue
+                with open(lock_path, 'a') as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                    try:
+                        if self._is_current(lock_file, lock_path):
+                            os.remove(lock_path)
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except OSError:
+                continue
+
+    def stats(self):
+        """Get coalescing counters."""
+        with self.lock:
+            return {
+                'in_flight': len(self.calls),
+                'leaders': self.leaders,
+                'followers': self.followers
+            }
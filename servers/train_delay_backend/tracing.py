@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import requests
+from config import (TRACE_EXPORT_FILE, TRACE_EXPORT_URL, TRACE_SAMPLE_RATE, TRACE_MIN_DURATION_MS,
+                    TRACE_EXPORT_INTERVAL_SECONDS, TRACE_MAX_QUEUED_SPANS, TRACE_SERVICE_NAME)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# OpenTelemetry span kinds and status codes, as numbered in OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# The span and request the running code belongs to. Context variables follow the code
+# into worker threads when tasks are submitted with contextvars.copy_context().run
+_current_span = ContextVar('current_span', default=None)
+_request_id = ContextVar('request_id', default=None)
+
+class _Trace:
+    """The spans of one trace, held until its root span ends and the trace is kept or dropped."""
+
+    def __init__(self, trace_id, request_id):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.spans = []
+        self.keep = None  # decided when the root span ends
+        self.lock = threading.Lock()
+
+    def finish(self, span):
+        with self.lock:
+            if self.keep is None:
+                self.spans.append(span)
+                if span.parent_id is not None:
+                    return
+                # Fast requests are dropped when only slow ones are wanted
+                self.keep = (span.end_ns - span.start_ns) / 1e6 >= TRACE_MIN_DURATION_MS
+                spans, self.spans = self.spans, []
+            elif self.keep:
+                # Work that outlived the request, e.g. a background model build
+                spans = [span]
+            else:
+                return
+        if self.keep:
+            exporter.submit(spans)
+
+class Span:
+    """A timed operation within a trace, with attributes such as the train number or bytes downloaded."""
+
+    def __init__(self, trace, name, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+    def record_error(self, error):
+        self.status = (STATUS_ERROR, f"{type(error).__name__}: {error}")
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self.trace.finish(self)
+
+    def to_otlp(self):
+        """The span in OTLP/JSON form."""
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': _otlp_attributes(self.attributes),
+            'status': {'code': self.status[0], 'message': self.status[1]} if self.status else {'code': STATUS_OK}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+class _NoopSpan:
+    """Stands in for a span outside a sampled trace, so callers never need to check."""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+class SpanExporter:
+    """Sends finished spans in batches, as OTLP/JSON, to a file and/or an OTLP/HTTP collector.
+
+    The file gets one export request per line, the format of the OpenTelemetry
+    Collector's file exporter. Spans are flushed every `interval` seconds from a
+    background thread and at exit; beyond `max_queued` waiting spans, new ones are
+    dropped rather than slowing down requests.
+    """
+
+    def __init__(self, path=TRACE_EXPORT_FILE, url=TRACE_EXPORT_URL, interval=TRACE_EXPORT_INTERVAL_SECONDS,
+                 max_queued=TRACE_MAX_QUEUED_SPANS):
+        self.path = path
+        self.url = url
+        self.interval = interval
+        self.max_queued = max_queued
+        self.queue = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.thread = None
+        self.resource = {'attributes': _otlp_attributes({
+            'service.name': TRACE_SERVICE_NAME,
+            'host.name': socket.gethostname(),
+            'process.pid': os.getpid()
+        })}
+        atexit.register(self.flush)
+
+    @property
+    def enabled(self):
+        return bool(self.path or self.url)
+
+    def submit(self, spans):
+        with self.lock:
+            if len(self.queue) + len(spans) > self.max_queued:
+                self.dropped += len(spans)
+                return
+            self.queue.extend(spans)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error exporting trace spans: {e}")
+
+    def flush(self):
+        """Export every waiting span now."""
+        with self.lock:
+            spans, self.queue = self.queue, []
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            logger.warning(f"Dropped {dropped} trace spans, export queue was full")
+        if not spans:
+            return
+        payload = {'resourceSpans': [{
+            'resource': self.resource,
+            'scopeSpans': [{'scope': {'name': 'train_delay_backend'}, 'spans': [span.to_otlp() for span in spans]}]
+        }]}
+        if self.path:
+            with self.file_lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(payload) + "\n")
+        if self.url:
+            try:
+                response = requests.post(self.url, json=payload, timeout=5)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                logger.warning(f"Could not send {len(spans)} trace spans to {self.url}: {e}")
+
+# Shared by every module in the process; tracing is off unless it has somewhere to export to
+exporter = SpanExporter()
+
+class TraceScope:
+    """A request's trace context, from start_trace() until close()."""
+
+    def __init__(self, span, tokens):
+        self.span = span or NOOP_SPAN
+        self.tokens = tokens
+
+    def close(self, error=None):
+        """End the trace; later calls do nothing (Flask tears a streamed request down twice)."""
+        tokens, self.tokens = self.tokens, None
+        if tokens is None:
+            return
+        for var, token in reversed(tokens):
+            try:
+                var.reset(token)
+            except ValueError:
+                # Closed from another context than it was started in
+                var.set(None)
+        if isinstance(self.span, Span):
+            if error is not None:
+                self.span.record_error(error)
+            self.span.end()
+
+def start_trace(name, request_id, attributes=None, kind=SPAN_KIND_SERVER):
+    """Make `request_id` the current request and, if sampled, start the root span of its trace.
+
+    The trace id is the request id's UUID, so a request id from the logs or an API
+    response finds its trace. Call close() on the returned scope when the request ends.
+    """
+    tokens = [(_request_id, _request_id.set(request_id))]
+    root = None
+    if exporter.enabled and random.random() < TRACE_SAMPLE_RATE:
+        try:
+            trace_id = uuid.UUID(request_id).hex
+        except (TypeError, ValueError):
+            trace_id = os.urandom(16).hex()
+        root = Span(_Trace(trace_id, request_id), name, kind=kind, attributes=attributes)
+        tokens.append((_current_span, _current_span.set(root)))
+    return TraceScope(root, tokens)
+
+@contextmanager
+def span(name, attributes=None, kind=SPAN_KIND_INTERNAL):
+    """Trace the enclosed block as a child of the current span; also usable as a decorator.
+
+    Yields the span, or a no-op stand-in when the block is not part of a sampled trace.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = Span(parent.trace, name, parent.span_id, kind, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+def current_span():
+    """The span the running code belongs to, or a no-op stand-in."""
+    return _current_span.get() or NOOP_SPAN
+
+def current_request_id():
+    """The id of the API request the running code works for, or None."""
+    return _request_id.get()
+
+class RequestIdFilter(logging.Filter):
+    """Adds `request_id` to log records, so lines from worker threads can be matched to their request."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or '-'
+        return True
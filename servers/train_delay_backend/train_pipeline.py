@@ -6,11 +6,30 @@ import time
 import logging
 from pathlib import Path
 import shutil
+import threading
+import contextvars
+import multiprocessing
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from scrape_trains import scrape_trains_between
-from scrape_schedule import scrape_train_schedule
-from delay_scrapper import download_html, extract_delay_data_from_html
+from scrape_schedule import scrape_train_schedule, schedule_url
 from model import train_model
-from predict import predict_delays
+from history_store import HistoryStore
+from predict import predict_delays, predict_delay_calendar, predict_delays_for_dates
+from model_registry import ModelRegistry
+from model_io import load_encoder, inference_model
+from artifact_cache import artifact_cache
+from features import StationHistory, write_snapshot
+from global_model import GlobalModel
+from baseline import baseline_delays
+from single_flight import SingleFlight
+from training_jobs import TrainingJobQueue, PRIORITY_USER, PRIORITY_BACKGROUND
+from metrics import timed, in_flight, no_data_fallbacks, model_lookups
+from tracing import span, current_span
+from config import (PIPELINE_MAX_WORKERS, REQUEST_MAX_WORKERS, TRAINING_PROCESSES, USE_GLOBAL_MODEL,
+                    INCREMENTAL_TRAINING, FULL_RETRAIN_DAYS, TRAINING_BACKEND, TRAINING_JOB_WAIT_SECONDS,
+                    COLD_START_BASELINE, BASELINE_METHOD, BACKGROUND_BUILD_MAX_PENDING)
 import pandas as pd
 
 # Set up logging
@@ -31,7 +50,7 @@ class NumpyEncoder(json.JSONEncoder):
         return super(NumpyEncoder, self).default(obj)
 
 class TrainPipeline:
-    def __init__(self):
+    def __init__(self, training_backend=TRAINING_BACKEND):
         # Use absolute paths for production deployment
         self.base_dir = Path(os.path.dirname(os.path.abspath(__file__)))
         self.output_dir = self.base_dir / "pipeline_output"
@@ -41,6 +60,35 @@ class TrainPipeline:
         self.output_dir.mkdir(exist_ok=True)
         self.temp_dir.mkdir(exist_ok=True)
         
+        # Versioned store of trained models shared by all workers
+        self.registry = ModelRegistry()
+        
+        # Incrementally refreshed local copy of each train's delay history
+        self.history_store = HistoryStore()
+        
+        # Coalesces duplicate download/train/predict work across requests and workers
+        self.single_flight = SingleFlight()
+        
+        # Shared thread pool for per-train I/O; training runs in a separate process pool
+        self.executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix='train-worker')
+        self._training_pool = None
+        self._training_pool_lock = threading.Lock()
+        
+        # 'process' trains here, 'queue' leaves training to training_worker.py and
+        # 'inline' (used by that worker) trains on the calling thread
+        self.training_backend = training_backend
+        self.training_jobs = TrainingJobQueue() if training_backend == 'queue' else None
+        
+        # Models built in the background after a baseline answer. The builds get their own
+        # small pool, so they never hold up request work in self.executor; one build per
+        # training process runs at a time and the rest wait in a deduplicated FIFO
+        self._background_builds = set()  # running
+        self._background_pending = OrderedDict()  # train number -> (train name, request context)
+        self._background_lock = threading.Lock()
+        self._background_limit = max(1, TRAINING_PROCESSES)
+        self.background_executor = ThreadPoolExecutor(max_workers=self._background_limit,
+                                                      thread_name_prefix='background-build')
+        
         # Load station codes
         self.station_codes = {}
         self._load_station_codes()
@@ -91,114 +139,118 @@ class TrainPipeline:
             logger.error(f"Failed to load station codes: {e}")
             # Don't raise the exception, just log it and continue with empty station codes
         
-    def _get_model_paths(self, train_number):
-        """Get model file paths for a specific train."""
-        return {
-            'model': self.output_dir / f"{train_number}_model.pkl",
-            'encoder': self.output_dir / f"{train_number}_encoder.pkl"
-        }
-        
-    def _cleanup_files(self, files):
-        """Clean up temporary files."""
-        for file in files:
-            if file and os.path.exists(file):
-                try:
-                    os.remove(file)
-                    logger.debug(f"Cleaned up file: {file}")
-                except Exception as e:
-                    logger.warning(f"Failed to clean up {file}: {e}")
-    
-    def _wait_for_file(self, file_path, timeout=10, check_interval=0.5):
-        """Wait for a file to exist with timeout."""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if os.path.exists(file_path):
-                return True
-            time.sleep(check_interval)
-        return False
+    def _get_training_pool(self):
+        """Get the process pool used for CPU-bound model training, creating it on first use."""
+        with self._training_pool_lock:
+            if self._training_pool is None:
+                # Spawn rather than fork: forking a multi-threaded server can deadlock
+                self._training_pool = ProcessPoolExecutor(
+                    max_workers=TRAINING_PROCESSES,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._training_pool
+
+    @timed('training')
+    @in_flight.track_in_progress(kind='training')
+    def _train(self, train_number, **paths):
+        """Train a model, in the training process pool when one is configured."""
+        current_span().set_attributes({'train.number': train_number, 'training.backend': self.training_backend,
+                                       'training.incremental': bool(paths.get('base_model_file'))})
+        if self.training_backend == 'inline' or TRAINING_PROCESSES <= 0:
+            return train_model(train_number, **paths)
         
+        try:
+            return self._get_training_pool().submit(train_model, train_number, **paths).result()
+        except BrokenProcessPool:
+            logger.error(f"Training pool crashed while training train {train_number}, restarting it")
+            with self._training_pool_lock:
+                self._training_pool = None
+            return train_model(train_number, **paths)
+
+    def _predict_from_version(self, train_number, date, version):
+        """Predict delays using a published model registry version."""
+        logger.info(f"Predicting delays for train {train_number} on {date}...")
+        return predict_delays(
+            train_number,
+            date,
+            model_file=version['model'],
+            encoder_file=version['encoder'],
+            history_file=version['history'],
+            snapshot_file=version['snapshot']
+        )
+
+    @in_flight.track_in_progress(kind='train')
     def process_train(self, train_info, date):
-        """Process a single train: get history, train model, predict delays."""
+        """Process a single train: get history, train model, predict delays.
+
+        Concurrent calls for the same train share one download/training run and one
+        prediction per date (see SingleFlight). A train with no model at all gets
+        baseline delays from its history at once while its model trains in the
+        background (COLD_START_BASELINE). `prediction_source` on the result tells which
+        path answered: 'global_model', 'model' or 'baseline'.
+        """
+        with span('process_train', {'train.number': train_info['train_number'], 'date': date}) as current:
+            result = self._process_train(train_info, date)
+            if result:
+                current.set_attribute('prediction_source', result.get('prediction_source'))
+            return result
+    
+    def _process_train(self, train_info, date):
+        """Body of process_train, run inside its span."""
         train_number = train_info['train_number']
         train_name = train_info['train_name']
         
         logger.info(f"Processing {train_name} ({train_number})...")
         
-        # Initialize file paths
-        html_file = None
-        csv_file = Path(f"{train_number}.csv")
-        model_paths = self._get_model_paths(train_number)
-        
-        # Check if we already have a model and history
-        if all(path.exists() for path in model_paths.values()) and csv_file.exists():
-            logger.info(f"Using existing model and history for train {train_number}")
+        # The global model, when enabled, serves every train without per-train training
+        if USE_GLOBAL_MODEL:
             try:
-                # Step 4: Predict delays using existing model
-                logger.info(f"Predicting delays for train {train_number} on {date}...")
-                delays = predict_delays(train_number, date)
+                delays = self._predict_global(train_info, date)
                 if delays:
                     train_info['predicted_delays'] = delays
+                    train_info['prediction_source'] = 'global_model'
                     return train_info
             except Exception as e:
-                logger.error(f"Error using existing model for train {train_number}: {e}")
+                logger.error(f"Error using global model for train {train_number}: {e}")
         
-        try:
-            # Step 1: Get delay history with timeout
-            logger.info(f"Downloading HTML for {train_name} ({train_number})...")
+        # Check if the registry already has a fresh model for this train
+        version = self.registry.lookup(train_number)
+        model_lookups.inc(result='hit' if version else 'miss')
+        if version:
+            logger.info(f"Using registry model for train {train_number} trained on {version['metadata'].get('trained_on')}")
             try:
-                html_file = download_html(train_name, train_number)
-                if not html_file:
-                    logger.error(f"Failed to download HTML for train {train_number}")
-                    return self._create_empty_response(train_info)
-            except TimeoutError:
-                logger.error(f"Timeout while downloading HTML for train {train_number}")
-                return self._create_empty_response(train_info)
+                delays = self._predict(train_number, date, version)
+                if delays:
+                    train_info['predicted_delays'] = delays
+                    train_info['prediction_source'] = 'model'
+                    return train_info
             except Exception as e:
-                logger.error(f"Error downloading HTML for train {train_number}: {e}")
-                return self._create_empty_response(train_info)
-                
-            # Step 2: Extract delay data with timeout
-            logger.info(f"Extracting delay data from HTML...")
+                logger.error(f"Error using registry model for train {train_number}: {e}")
+        
+        # A cold train is answered from its history alone; the model is built for next time
+        if COLD_START_BASELINE and not self.registry.lookup(train_number, allow_stale=True):
             try:
-                if not extract_delay_data_from_html(html_file, train_number):
-                    logger.warning(f"No delay data found in HTML for train {train_number}")
-                    return self._create_empty_response(train_info)
-            except TimeoutError:
-                logger.error(f"Timeout while extracting delay data for train {train_number}")
-                return self._create_empty_response(train_info)
+                delays = self._predict_baseline(train_number, train_name, date)
             except Exception as e:
-                logger.error(f"Error extracting delay data for train {train_number}: {e}")
-                return self._create_empty_response(train_info)
-            
-            # Wait for CSV file to exist
-            if not self._wait_for_file(csv_file, timeout=5):  # Reduced timeout
-                logger.error(f"No delay history found for train {train_number}")
-                return self._create_empty_response(train_info)
-            
-            # Check if we have enough data
-            df = pd.read_csv(csv_file)
-            if len(df) < 2:  # Need at least 2 samples for train/test split
-                logger.warning(f"Not enough delay data for train {train_number} (only {len(df)} samples)")
-                return self._create_empty_response(train_info)
-            
-            # Step 3: Train model
-            logger.info(f"Training model for train {train_number}...")
-            model_result = train_model(train_number)
-            if not model_result:
-                logger.warning(f"Could not train model for train {train_number} - skipping")
-                return self._create_empty_response(train_info)
-            
-            # Wait for model files to be saved
-            if not all(self._wait_for_file(path, timeout=5) for path in model_paths.values()):  # Reduced timeout
-                logger.error(f"Model files not found for train {train_number}")
-                return self._create_empty_response(train_info)
+                logger.error(f"Error computing baseline for train {train_number}: {e}")
+                delays = None
+            if not delays:
+                return self._create_empty_response(train_info, 'no_history')
+            train_info['predicted_delays'] = delays
+            train_info['prediction_source'] = 'baseline'
+            return train_info
+        
+        try:
+            # Steps 1-3: Download history and train, once across concurrent requests and workers
+            version = self._build_model_once(train_number, train_name)
+            if not version:
+                return self._create_empty_response(train_info, 'no_model')
             
             # Step 4: Predict delays
-            logger.info(f"Predicting delays for train {train_number} on {date}...")
-            delays = predict_delays(train_number, date)
+            delays = self._predict(train_number, date, version)
             if not delays:
                 logger.error(f"Failed to predict delays for train {train_number}")
-                return self._create_empty_response(train_info)
+                return self._create_empty_response(train_info, 'predict_error')
             
             # Debug logging for delays
             logger.info("\nRaw delays from model:")
@@ -207,19 +259,402 @@ class TrainPipeline:
             
             # Add predicted delays to train info
             train_info['predicted_delays'] = delays
+            train_info['prediction_source'] = 'model'
             return train_info
             
         except Exception as e:
             logger.error(f"Error processing train {train_number}: {e}")
-            return self._create_empty_response(train_info)
+            return self._create_empty_response(train_info, 'error')
+    
+    def _predict_global(self, train_info, date):
+        """Predict delays with the global model, or None if it is not available.
+
+        Trains it was trained on get lag and rolling features from their stored
+        history; other trains get a cold-start prediction from their station list.
+        """
+        global_model = GlobalModel.load()
+        if global_model is None:
+            return None
+        
+        train_number = train_info['train_number']
+        if global_model.knows(train_number):
+            history = self.history_store.refresh(train_info['train_name'], train_number)
+            if history is not None and not history.empty:
+                logger.info(f"Predicting train {train_number} with the global model")
+                return global_model.predict(train_number, [date], station_history=StationHistory.from_frame(history))[0]
+        
+        stations = [station['code'] for station in train_info.get('stations', []) if station.get('code')]
+        if not stations:
+            return None
+        logger.info(f"Cold-start prediction for train {train_number} with the global model")
+        return global_model.predict(train_number, [date], stations=stations)[0]
+    
+    def _predict_baseline(self, train_number, train_name, date):
+        """Baseline delays from the train's history, scheduling a model build in the background.
+
+        Costs one history download. Returns {station: delay}, or None if the train has
+        no delay history.
+        """
+        history = self.history_store.refresh(train_name, train_number)
+        if history is None or history.empty:
+            logger.warning(f"No delay data found for train {train_number}")
+            return None
+        
+        station_history = StationHistory.from_frame(history)
+        with timed('baseline', {'train.number': train_number}):
+            delays = baseline_delays(station_history, [date])[0]
+        logger.info(f"Answered train {train_number} with {BASELINE_METHOD} baseline delays")
+        self._schedule_background_build(train_number, train_name)
+        return {station: round(float(delay), 2) for station, delay in zip(station_history.stations, delays)}
+    
+    def _schedule_background_build(self, train_number, train_name):
+        """Build a train's model without blocking the caller, once per train at a time.
+
+        Builds beyond one per training process wait in a FIFO and start as running ones
+        finish. Only when BACKGROUND_BUILD_MAX_PENDING builds are already waiting is the
+        train turned away; it keeps getting baseline answers until a later request queues it.
+        """
+        if self.training_jobs is not None:
+            self.training_jobs.enqueue(train_number, train_name, PRIORITY_USER)
+            return
+        
+        with self._background_lock:
+            if train_number in self._background_builds or train_number in self._background_pending:
+                return
+            if len(self._background_pending) >= BACKGROUND_BUILD_MAX_PENDING:
+                logger.warning(f"{len(self._background_pending)} background model builds are waiting, "
+                               f"not queueing train {train_number}")
+                return
+            # The build stays part of the requesting trace
+            self._background_pending[train_number] = (train_name, contextvars.copy_context())
+        
+        logger.info(f"Queued background model build for train {train_number}")
+        self._start_background_builds()
+    
+    def _start_background_builds(self):
+        """Hand waiting builds to the background pool while it has free workers."""
+        with self._background_lock:
+            while self._background_pending and len(self._background_builds) < self._background_limit:
+                train_number, (train_name, context) = self._background_pending.popitem(last=False)
+                self._background_builds.add(train_number)
+                self.background_executor.submit(context.run, self._run_background_build, train_number, train_name)
+    
+    def _run_background_build(self, train_number, train_name):
+        logger.info(f"Building model for train {train_number} in the background")
+        try:
+            self._build_model_once(train_number, train_name)
+        except Exception as e:
+            logger.error(f"Background model build for train {train_number} failed: {e}")
+        finally:
+            with self._background_lock:
+                self._background_builds.discard(train_number)
+            self._start_background_builds()
+    
+    def queue_depths(self):
+        """Work waiting in this pipeline, by queue, for monitoring.
+
+        'pipeline' is tasks waiting for a thread of the shared worker pool,
+        'background_builds' trains waiting for a background pool worker to build their
+        model after a baseline answer and, with the queue backend, 'training_jobs' jobs not yet claimed by a worker.
+        """
+        with self._background_lock:
+            background = len(self._background_pending)
+        depths = {'pipeline': self.executor._work_queue.qsize(), 'background_builds': background}
+        if self.training_jobs is not None:
+            depths['training_jobs'] = self.training_jobs.stats()['queued']
+        return depths
+    
+    def _predict(self, train_number, date, version):
+        """Predict delays from a registry version, sharing the result with concurrent identical calls."""
+        delays = self.single_flight.do(
+            f"{train_number}:predict:{date}:{version['dir'].name}",
+            lambda: self._predict_from_version(train_number, date, version),
+            cross_process=False
+        )
+        # Callers attach the result to their own train info
+        return dict(delays) if delays else delays
+    
+    def _build_model_once(self, train_number, train_name):
+        """Build a model, sharing one build between concurrent requests and workers."""
+        if self.training_jobs is not None:
+            return self._build_model_queued(train_number, train_name)
+        return self.single_flight.do(
+            f"{train_number}:model:{datetime.now().strftime('%Y%m%d')}",
+            lambda: self._build_model(train_number, train_name),
+            check=lambda: self.registry.lookup(train_number)
+        )
+    
+    def _build_model_queued(self, train_number, train_name):
+        """Get a model from the training workers instead of training in this process.
+
+        A stale model is returned at once while a background job refreshes it. Without
+        any model, a user-priority job is queued and waited on for up to
+        TRAINING_JOB_WAIT_SECONDS. Returns the registry version, or None.
+        """
+        stale = self.registry.lookup(train_number, allow_stale=True)
+        if stale:
+            self.training_jobs.enqueue(train_number, train_name, PRIORITY_BACKGROUND)
+            logger.info(f"Serving stale model for train {train_number} while it is retrained")
+            return stale
+        
+        job = self.training_jobs.enqueue(train_number, train_name, PRIORITY_USER)
+        job = self.training_jobs.wait(job, TRAINING_JOB_WAIT_SECONDS)
+        if job is None or job['status'] != 'done':
+            status = job['status'] if job else 'missing'
+            logger.warning(f"No model for train {train_number} yet (training job {status})")
+            return None
+        return self.registry.lookup(train_number, allow_stale=True)
+    
+    def get_delay_calendar(self, train_name, train_number, start_date, days):
+        """Predict delays for a train over `days` consecutive dates from `start_date`.
+
+        Uses the registry model (building one if needed) and predicts the whole range
+        from a single load of the model and history.
+        Returns a list of {'date', 'predicted_delays'} dicts, or None on failure.
+        """
+        logger.info(f"Predicting {days}-day delay calendar for {train_name} ({train_number}) from {start_date}")
+        
+        version = self.registry.lookup(train_number)
+        if not version:
+            version = self._build_model_once(train_number, train_name)
+        if not version:
+            return None
+        
+        try:
+            calendar = predict_delay_calendar(
+                train_number,
+                start_date,
+                days,
+                model_file=version['model'],
+                encoder_file=version['encoder'],
+                history_file=version['history'],
+                snapshot_file=version['snapshot']
+            )
+        except Exception as e:
+            logger.error(f"Error predicting delay calendar for train {train_number}: {e}")
+            return None
+        if calendar is None:
+            return None
+        
+        return [
+            {
+                'date': date.strftime('%Y%m%d'),
+                'predicted_delays': delays
+            }
+            for date, delays in calendar
+        ]
+    
+    def predict_batch(self, items):
+        """Predict delays for many (train_number, date) items in one call.
+
+        Items are grouped by train so each train's model and history are loaded once
+        and all of its dates are scored in one model call; trains run concurrently on
+        the shared worker pool. A train without a fresh registry model is built only
+        if one of its items carries a train_name. Failures are reported per item.
+        Returns one result dict per item, in order.
+        """
+        groups = {}
+        for index, item in enumerate(items):
+            groups.setdefault(str(item['train_number']), []).append(index)
+        
+        futures = {
+            self.executor.submit(contextvars.copy_context().run, self._predict_batch_group, train_number,
+                                 [items[i] for i in indices]): indices
+            for train_number, indices in groups.items()
+        }
+        
+        results = [None] * len(items)
+        for future, indices in futures.items():
+            try:
+                group_results = future.result()
+            except Exception as e:
+                logger.error(f"Error in batch prediction: {e}")
+                group_results = [self._batch_error(items[i], str(e)) for i in indices]
+            for index, result in zip(indices, group_results):
+                results[index] = result
+        return results
+    
+    @span('predict_batch_group')
+    def _predict_batch_group(self, train_number, items):
+        """Predict every item of one train from a single load of its model."""
+        current_span().set_attributes({'train.number': train_number, 'batch.items': len(items)})
+        version = self.registry.lookup(train_number)
+        if not version:
+            train_name = next((item['train_name'] for item in items if item.get('train_name')), None)
+            if not train_name:
+                message = f"No trained model for train {train_number}; include train_name to build one"
+                return [self._batch_error(item, message) for item in items]
+            version = self._build_model_once(train_number, train_name)
+        if not version:
+            no_data_fallbacks.inc(reason='no_model')
+            return [self._batch_error(item, f"No delay data found for train {train_number}") for item in items]
+        
+        dates = sorted(set(item['date'] for item in items))
+        predictions = predict_delays_for_dates(
+            train_number,
+            dates,
+            model_file=version['model'],
+            encoder_file=version['encoder'],
+            history_file=version['history'],
+            snapshot_file=version['snapshot']
+        )
+        if predictions is None:
+            return [self._batch_error(item, f"Failed to predict delays for train {train_number}") for item in items]
+        
+        by_date = {date: delays for date, (_, delays) in zip(dates, predictions)}
+        return [
+            {
+                'train_number': train_number,
+                'date': item['date'],
+                'status': 'success',
+                'predicted_delays': by_date[item['date']]
+            }
+            for item in items
+        ]
+    
+    def _batch_error(self, item, message):
+        """Build the result of a failed batch item."""
+        return {
+            'train_number': item.get('train_number'),
+            'date': item.get('date'),
+            'status': 'error',
+            'message': message
+        }
+    
+    @span('build_model')
+    def _build_model(self, train_number, train_name):
+        """Download delay history, train a model and publish it to the registry.
+
+        History comes from the local history store, which only downloads the days it is
+        missing; stages hand data to each other in memory (DataFrame -> model) and files
+        are only written to the registry staging directory for persistence.
+        Returns the published registry version, or None if no model could be built.
+        """
+        staging = None
+        current_span().set_attribute('train.number', train_number)
+        
+        try:
+            # Steps 1-2: Refresh delay history; only days missing from the local store are downloaded
+            logger.info(f"Refreshing delay history for {train_name} ({train_number})...")
+            try:
+                history = self.history_store.refresh(train_name, train_number)
+            except Exception as e:
+                logger.error(f"Error refreshing delay history for train {train_number}: {e}")
+                return None
+            if history is None or history.empty:
+                logger.warning(f"No delay data found for train {train_number}")
+                return None
+            
+            # Check if we have enough data
+            if len(history) < 2:  # Need at least 2 samples for train/test split
+                logger.warning(f"Not enough delay data for train {train_number} (only {len(history)} samples)")
+                return None
+            
+            # Step 3: Train model into a private staging directory
+            logger.info(f"Training model for train {train_number}...")
+            staging = self.registry.create_staging(train_number)
+            history.to_csv(staging['history'], index=False)
+            snapshot = write_snapshot(history, staging['snapshot'])
+            base = self._incremental_base(train_number, history)
+            model, encoder = self._train(
+                train_number,
+                history=history,
+                model_file=staging['model'],
+                encoder_file=staging['encoder'],
+                base_model_file=base['model'] if base else None,
+                base_encoder_file=base['encoder'] if base else None,
+                base_trained_through=base['metadata'].get('trained_through') if base else None
+            )
+            if model is None:
+                logger.warning(f"Could not train model for train {train_number} - skipping")
+                return None
+            
+            current_span().set_attributes({'history.rows': len(history), 'model.kind': getattr(model, 'kind', 'xgboost'),
+                                           'training.incremental': bool(base)})
+            
+            # Publish atomically so concurrent workers never see a partial model
+            metadata = {
+                'train_name': train_name,
+                'history_rows': len(history),
+                'trained_through': history['date'].max().strftime('%Y-%m-%d'),
+                'model_kind': getattr(model, 'kind', 'xgboost'),
+                'training': getattr(model, 'training_stats_', None)
+            }
+            if base:
+                metadata.update({
+                    'training_mode': 'incremental',
+                    'base_version': base['dir'].name,
+                    'full_trained_at': base['metadata'].get('full_trained_at', base['metadata'].get('trained_at')),
+                    'incremental_updates': base['metadata'].get('incremental_updates', 0) + 1
+                })
+            else:
+                metadata.update({
+                    'training_mode': 'full',
+                    'full_trained_at': time.time(),
+                    'incremental_updates': 0
+                })
+            version = self.registry.publish(train_number, staging['dir'], metadata)
+            staging = None
+            if not version:
+                logger.error(f"Model files not found for train {train_number}")
+                return None
+            
+            # Hand the in-memory objects to the cache so prediction doesn't reload them
+            artifact_cache.put(version['model'], inference_model(model))
+            artifact_cache.put(version['encoder'], encoder)
+            artifact_cache.put(version['snapshot'], snapshot, sizer=lambda h: h.nbytes)
+            return version
+            
         finally:
-            # Clean up temporary files
-            self._cleanup_files([html_file, csv_file])
-            # Don't delete model files until after prediction is done
-            self._cleanup_files(model_paths.values())
+            if staging:
+                self.registry.discard(staging['dir'])
     
-    def _create_empty_response(self, train_info):
-        """Create a response with 'no data found' for all stations."""
+    def _incremental_base(self, train_number, history):
+        """Get the registry version to continue training from, or None for a full retrain.
+
+        A full retrain happens when incremental training is disabled, there is no
+        previous version, it is not an XGBoost model (model selection picked a simple
+        one, which is cheap to refit and is reconsidered on every retrain), its last full
+        retrain is older than FULL_RETRAIN_DAYS, the history has stations its encoder
+        doesn't know, or it has no days after the version's history to evaluate an
+        update on.
+        """
+        if not INCREMENTAL_TRAINING:
+            return None
+        base = self.registry.lookup(train_number, allow_stale=True)
+        if not base:
+            return None
+        
+        # Versions from before model selection are all XGBoost
+        if base['metadata'].get('model_kind', 'xgboost') != 'xgboost':
+            return None
+        
+        full_trained_at = base['metadata'].get('full_trained_at', base['metadata'].get('trained_at', 0))
+        if time.time() - full_trained_at > FULL_RETRAIN_DAYS * 86400:
+            logger.info(f"Last full retrain of train {train_number} is older than {FULL_RETRAIN_DAYS} days")
+            return None
+        
+        trained_through = base['metadata'].get('trained_through')
+        if not trained_through or (history['date'] > pd.Timestamp(trained_through)).sum() < 2:
+            logger.info(f"Train {train_number} has no new delay data since {trained_through}, retraining fully")
+            return None
+        
+        try:
+            encoder = artifact_cache.get(base['encoder'], load_encoder)
+        except Exception as e:
+            logger.warning(f"Cannot load encoder of {base['dir']} for incremental training: {e}")
+            return None
+        new_stations = set(history['station'].unique()) - set(encoder.classes_)
+        if new_stations:
+            logger.info(f"Train {train_number} has new stations {sorted(new_stations)}, retraining fully")
+            return None
+        
+        logger.info(f"Continuing training of train {train_number} from version {base['dir'].name}")
+        return base
+    
+    def _create_empty_response(self, train_info, reason):
+        """Create a response with 'no data found' for all stations, counted by `reason`."""
+        no_data_fallbacks.inc(reason=reason)
         train_info['predicted_delays'] = {station['code']: "no data found" 
                                         for station in train_info.get('stations', [])}
         return train_info
@@ -236,82 +671,158 @@ class TrainPipeline:
         logger.warning(f"Unknown station code: {station_code}")
         return None
 
-    def get_trains_between_stations(self, src_name, src_code, dst_name, dst_code, date):
-        """Get all trains between stations with their predicted delays."""
+    def _process_listed_train(self, train, src_code, dst_code, date):
+        """Process one train from a between-stations listing and attach source/destination delays."""
+        try:
+            result = self.process_train(train, date)
+            if not result:
+                return None
+            # Add source and destination delays to train info
+            delays = result.get('predicted_delays', {})
+            train['source_delay'] = delays.get(src_code, "no data found")
+            train['destination_delay'] = delays.get(dst_code, "no data found")
+            if src_code not in delays or dst_code not in delays:
+                no_data_fallbacks.inc(reason='missing_station')
+        except Exception as e:
+            logger.error(f"Error processing train {train.get('train_number', 'unknown')}: {e}")
+            no_data_fallbacks.inc(reason='error')
+            # Add train with "no data found" for delays
+            train['source_delay'] = "no data found"
+            train['destination_delay'] = "no data found"
+        return train
+
+    def list_trains_between_stations(self, src_name, src_code, dst_name, dst_code, date):
+        """Scrape the trains running between two stations, without delays."""
         logger.info(f"Fetching trains between {src_name} and {dst_name}...")
         
-        # Step 1: Get all trains between stations
         trains = scrape_trains_between(src_name, src_code, dst_name, dst_code, date)
         if not trains:
             logger.warning("No trains found between stations")
             return None
-            
-        # Step 2: Process each train
-        processed_trains = []
+        
+        # Add source and destination info
         for train in trains:
-            try:
-                # Add source and destination info
-                train['stations'] = [
-                    {'code': src_code, 'name': src_name, 'is_source': True},
-                    {'code': dst_code, 'name': dst_name, 'is_destination': True}
-                ]
-                
-                result = self.process_train(train, date)
-                if result:
-                    # Add source and destination delays to train info
-                    delays = result.get('predicted_delays', {})
-                    train['source_delay'] = delays.get(src_code, "no data found")
-                    train['destination_delay'] = delays.get(dst_code, "no data found")
-                    processed_trains.append(train)
-            except Exception as e:
-                logger.error(f"Error processing train {train.get('train_number', 'unknown')}: {e}")
-                # Add train with "no data found" for delays
-                train['source_delay'] = "no data found"
-                train['destination_delay'] = "no data found"
-                processed_trains.append(train)
+            train['stations'] = [
+                {'code': src_code, 'name': src_name, 'is_source': True},
+                {'code': dst_code, 'name': dst_name, 'is_destination': True}
+            ]
+        return trains
+    
+    def iter_train_delays(self, trains, src_code, dst_code, date, max_workers=None):
+        """Process listed trains concurrently, yielding (index, train) as each one finishes.
+
+        Trains with a fresh registry model are scheduled first so their delays arrive
+        first. At most `max_workers` trains (default REQUEST_MAX_WORKERS) run at once
+        for this call; the shared pool caps the total across requests.
+        """
+        limit = max_workers or REQUEST_MAX_WORKERS
+        cached = [i for i, train in enumerate(trains) if self.registry.lookup(train['train_number'])]
+        cached_set = set(cached)
+        pending = deque(cached + [i for i in range(len(trains)) if i not in cached_set])
+        logger.info(f"{len(cached)} of {len(trains)} trains have cached models")
         
-        # Step 3: Save results to two different files
-        if processed_trains:
-            # File 1: All train details with delays
-            output_file = self.output_dir / 'trains_between_stations.json'
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(processed_trains, f, indent=2, ensure_ascii=False, cls=NumpyEncoder)
-            logger.info(f"Saved {len(processed_trains)} trains to {output_file}")
-            
-            # File 2: Simplified version with just essential info and delays
-            simplified_trains = []
-            for train in processed_trains:
-                simplified = {
-                    'train_number': train['train_number'],
-                    'train_name': train['train_name'],
-                    'source': train['source'],
-                    'departure_time': train['departure_time'],
-                    'destination': train['destination'],
-                    'arrival_time': train['arrival_time'],
-                    'duration': train['duration'],
-                    'source_delay': train['source_delay'],
-                    'destination_delay': train['destination_delay'],
-                    'running_days': train['running_days'],
-                    'booking_classes': train['booking_classes'],
-                    'has_pantry': train['has_pantry']
-                }
-                simplified_trains.append(simplified)
+        running = {}
+        while pending or running:
+            while pending and len(running) < limit:
+                index = pending.popleft()
+                # Each train runs in a copy of this request's context, so its spans and logs stay with it
+                future = self.executor.submit(contextvars.copy_context().run, self._process_listed_train,
+                                              trains[index], src_code, dst_code, date)
+                running[future] = index
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                yield index, future.result()
+    
+    def get_trains_between_stations(self, src_name, src_code, dst_name, dst_code, date, max_workers=None):
+        """Get all trains between stations with their predicted delays.
+
+        Trains are processed in parallel (see iter_train_delays); results keep the listing order.
+        """
+        # Step 1: Get all trains between stations
+        trains = self.list_trains_between_stations(src_name, src_code, dst_name, dst_code, date)
+        if not trains:
+            return None
             
-            simplified_file = self.output_dir / 'trains_with_delays.json'
-            with open(simplified_file, 'w', encoding='utf-8') as f:
-                json.dump(simplified_trains, f, indent=2, ensure_ascii=False, cls=NumpyEncoder)
-            logger.info(f"Saved simplified train data with delays to {simplified_file}")
+        # Step 2: Process trains concurrently and restore listing order
+        results = dict(self.iter_train_delays(trains, src_code, dst_code, date, max_workers))
+        processed_trains = [results[i] for i in range(len(trains)) if results.get(i)]
         
+        # Step 3: Save results to two different files
+        self._save_trains_between(processed_trains)
         return processed_trains
     
+    def stream_trains_between_stations(self, trains, src_code, dst_code, date, max_workers=None):
+        """Yield streaming events for listed trains: the listing first, then each train's delays.
+
+        Events are dicts with an `event` type ('listing', 'delay' or 'done') and `data`.
+        """
+        listing = []
+        for index, train in enumerate(trains):
+            placeholder = dict(train, source_delay="pending", destination_delay="pending")
+            listing.append(dict(self._simplify_train(placeholder), index=index))
+        yield {'event': 'listing', 'data': listing}
+        
+        processed_trains = []
+        for index, train in self.iter_train_delays(trains, src_code, dst_code, date, max_workers):
+            if not train:
+                continue
+            processed_trains.append((index, train))
+            yield {'event': 'delay', 'data': {
+                'index': index,
+                'train_number': train['train_number'],
+                'source_delay': train['source_delay'],
+                'destination_delay': train['destination_delay'],
+                'prediction_source': train.get('prediction_source')
+            }}
+        
+        yield {'event': 'done', 'data': {'count': len(processed_trains)}}
+        self._save_trains_between([train for _, train in sorted(processed_trains, key=lambda x: x[0])])
+    
+    def _simplify_train(self, train):
+        """Essential train info and delays, as returned by the API."""
+        return {
+            'train_number': train['train_number'],
+            'train_name': train['train_name'],
+            'source': train['source'],
+            'departure_time': train['departure_time'],
+            'destination': train['destination'],
+            'arrival_time': train['arrival_time'],
+            'duration': train['duration'],
+            'source_delay': train['source_delay'],
+            'destination_delay': train['destination_delay'],
+            'prediction_source': train.get('prediction_source'),
+            'running_days': train['running_days'],
+            'booking_classes': train['booking_classes'],
+            'has_pantry': train['has_pantry']
+        }
+    
+    @timed('save_results')
+    def _save_trains_between(self, processed_trains):
+        """Save processed trains to the full and simplified output files."""
+        if not processed_trains:
+            return
+        
+        # File 1: All train details with delays
+        output_file = self.output_dir / 'trains_between_stations.json'
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(processed_trains, f, indent=2, ensure_ascii=False, cls=NumpyEncoder)
+        logger.info(f"Saved {len(processed_trains)} trains to {output_file}")
+        
+        # File 2: Simplified version with just essential info and delays
+        simplified_trains = [self._simplify_train(train) for train in processed_trains]
+        simplified_file = self.output_dir / 'trains_with_delays.json'
+        with open(simplified_file, 'w', encoding='utf-8') as f:
+            json.dump(simplified_trains, f, indent=2, ensure_ascii=False, cls=NumpyEncoder)
+        logger.info(f"Saved simplified train data with delays to {simplified_file}")
+    
     def get_train_schedule(self, train_name, train_number, date):
         """Get complete train schedule with predicted delays."""
         logger.info(f"Fetching schedule for {train_name} ({train_number})...")
         
         try:
             # Step 1: Get train schedule
-            url = f"https://etrain.info/train/{train_name.replace(' ', '-')}-{train_number}/schedule"
-            schedule_data = scrape_train_schedule(url)
+            schedule_data = scrape_train_schedule(schedule_url(train_name, train_number))
             
             if not schedule_data:
                 logger.error(f"Failed to get schedule for train {train_number}")
@@ -343,12 +854,14 @@ class TrainPipeline:
             result = self.process_train(train_info, date)
             if not result:
                 # If processing fails, set all delays to "no data found"
+                no_data_fallbacks.inc(reason='error')
                 for station in schedule_data['schedule']:
                     station['predicted_delay'] = "no data found"
                 return schedule_data
                 
             # Step 3: Add predicted delays to schedule
             delays = result.get('predicted_delays', {})
+            schedule_data['prediction_source'] = result.get('prediction_source')
             logger.info("\nPredicted delays from model:")
             for station, delay in delays.items():
                 logger.info(f"{station}: {delay}")
@@ -362,10 +875,13 @@ class TrainPipeline:
                 else:
                     logger.warning(f"No station code found for {station['name']}")
                     station['predicted_delay'] = "no data found"
+            # Stations the train's history has no delays for (counted once per schedule)
+            if any(station.get('station_code') not in delays for station in schedule_data['schedule']):
+                no_data_fallbacks.inc(reason='missing_station')
             
             # Step 4: Save results
             output_file = self.output_dir / 'train_schedule_with_delays.json'
-            with open(output_file, 'w', encoding='utf-8') as f:
+            with timed('save_results'), open(output_file, 'w', encoding='utf-8') as f:
                 json.dump(schedule_data, f, indent=2, ensure_ascii=False, cls=NumpyEncoder)
             logger.info(f"Saved schedule with delays to {output_file}")
             
@@ -373,6 +889,7 @@ class TrainPipeline:
             
         except Exception as e:
             logger.error(f"Error getting train schedule: {e}")
+            no_data_fallbacks.inc(reason='error')
             # Return schedule with "no data found" for all stations
             if schedule_data and 'schedule' in schedule_data:
                 for station in schedule_data['schedule']:
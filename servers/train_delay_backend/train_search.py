@@ -2,6 +2,7 @@ import requests
 from bs4 import BeautifulSoup
 import json
 import re
+from config import ETRAIN_BASE_URL, SCRAPE_TIMEOUT_SECONDS
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -15,10 +16,10 @@ def search_trains(source_station: str, dest_station: str, date: str):
     Returns a list of train details including train number, name, and schedule.
     """
     # Format the URL for train search
-    url = f"https://etrain.info/trains/{source_station}-to-{dest_station}?date={date}"
+    url = f"{ETRAIN_BASE_URL}/trains/{source_station}-to-{dest_station}?date={date}"
     
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = requests.get(url, headers=HEADERS, timeout=SCRAPE_TIMEOUT_SECONDS)
         response.raise_for_status()
         
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -60,10 +61,10 @@ def get_train_schedule(train_name: str, train_number: str):
     Get the complete schedule for a specific train.
     Returns a list of stations with arrival and departure times.
     """
-    url = f"https://etrain.info/train/{train_name.replace(' ', '-')}-{train_number}/schedule"
+    url = f"{ETRAIN_BASE_URL}/train/{train_name.replace(' ', '-')}-{train_number}/schedule"
     
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = requests.get(url, headers=HEADERS, timeout=SCRAPE_TIMEOUT_SECONDS)
         response.raise_for_status()
         
         soup = BeautifulSoup(response.text, 'html.parser')
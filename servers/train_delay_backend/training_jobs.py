@@ -0,0 +1,260 @@
+import sqlite3
+import time
+import logging
+from pathlib import Path
+from config import (TRAINING_JOBS_DB, TRAINING_JOB_MAX_ATTEMPTS, TRAINING_JOB_RETRY_SECONDS,
+                    TRAINING_JOB_LEASE_SECONDS)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Higher priorities are claimed first
+PRIORITY_USER = 10        # a request is waiting for the model
+PRIORITY_BACKGROUND = 0   # refresh of a stale model that is still being served
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Maximum delay between retries, whatever the attempt count
+MAX_RETRY_SECONDS = 3600
+
+# Finished jobs are kept this long for inspection
+FINISHED_JOB_MAX_AGE = 7 * 24 * 3600
+
+class TrainingJobQueue:
+    """Durable queue of model training jobs in a local SQLite database.
+
+    API workers enqueue jobs and read their outcome; training_worker.py processes
+    claim and run them. A train has at most one queued or running job: enqueueing it
+    again returns that job, raising its priority if needed. A failed attempt is retried
+    with exponential backoff up to `max_attempts` times, and a running job whose lease
+    expires (its worker died) is handed to another worker while it has attempts left.
+    """
+
+    def __init__(self, db_path=TRAINING_JOBS_DB, max_attempts=TRAINING_JOB_MAX_ATTEMPTS,
+                 retry_seconds=TRAINING_JOB_RETRY_SECONDS, lease_seconds=TRAINING_JOB_LEASE_SECONDS):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.lease_seconds = lease_seconds
+        self._init_db()
+
+    def _connect(self):
+        """Open a connection; one per operation keeps the queue safe to share between threads."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """Create tables if they don't exist."""
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    train_number TEXT NOT NULL,
+                    train_name TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    run_after REAL NOT NULL,
+                    started_at REAL,
+                    lease_until REAL,
+                    finished_at REAL,
+                    worker TEXT,
+                    version TEXT,
+                    error TEXT
+                )
+            """)
+            # Enforces one active job per train
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_train
+                ON jobs (train_number) WHERE status IN ('queued', 'running')
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, run_after)")
+        finally:
+            conn.close()
+
+    def enqueue(self, train_number, train_name, priority=PRIORITY_BACKGROUND):
+        """Queue a training job for a train and return it.
+
+        If the train already has a queued or running job, that job is returned instead;
+        a queued job's priority is raised to `priority` if lower, and its backoff is
+        skipped whenever a user is waiting (PRIORITY_USER).
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE train_number = ? AND status IN ('queued', 'running')",
+                (str(train_number),)
+            ).fetchone()
+            if job is None:
+                cursor = conn.execute(
+                    "INSERT INTO jobs (train_number, train_name, priority, status, enqueued_at, run_after) "
+                    "VALUES (?, ?, ?, 'queued', ?, ?)",
+                    (str(train_number), train_name, priority, now, now)
+                )
+                job_id = cursor.lastrowid
+                logger.info(f"Queued training job {job_id} for train {train_number} (priority {priority})")
+            else:
+                job_id = job['id']
+                if job['status'] == 'queued' and priority > job['priority']:
+                    conn.execute("UPDATE jobs SET priority = ? WHERE id = ?", (priority, job_id))
+                if job['status'] == 'queued' and priority >= PRIORITY_USER:
+                    conn.execute("UPDATE jobs SET run_after = MIN(run_after, ?) WHERE id = ?", (now, job_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def claim(self, worker):
+        """Take the next runnable job for `worker`, or None if there is none.
+
+        Jobs are taken by priority, then age. Running jobs whose lease has expired are
+        taken over, unless they have used up their attempts: those are marked failed, so
+        a job that keeps killing its worker is not retried forever.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute(
+                "SELECT id, train_number, attempts, worker FROM jobs "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts)
+            ).fetchall()
+            for failed in expired:
+                error = f"Lease of worker {failed['worker']} expired on attempt {failed['attempts']}"
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, lease_until = NULL, error = ? WHERE id = ?",
+                    (now, error, failed['id'])
+                )
+                logger.error(f"Training job {failed['id']} for train {failed['train_number']} failed: {error}")
+            job = conn.execute(
+                "SELECT id FROM jobs "
+                "WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY priority DESC, enqueued_at LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if job is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                    "lease_until = ?, worker = ? WHERE id = ?",
+                    (now, now + self.lease_seconds, worker, job['id'])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(job['id']) if job is not None else None
+
+    def complete(self, job_id, version=None):
+        """Mark a job as done, recording the registry version it published."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ?, version = ?, error = NULL, lease_until = NULL "
+                "WHERE id = ?",
+                (time.time(), version, job_id)
+            )
+        finally:
+            conn.close()
+
+    def fail(self, job_id, error, retry=True):
+        """Record a failed attempt; the job is requeued with backoff until it runs out of attempts."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            job = conn.execute("SELECT attempts, train_number FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                conn.execute("ROLLBACK")
+                return
+            if retry and job['attempts'] < self.max_attempts:
+                delay = min(self.retry_seconds * 2 ** (job['attempts'] - 1), MAX_RETRY_SECONDS)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', run_after = ?, lease_until = NULL, error = ? WHERE id = ?",
+                    (now + delay, str(error), job_id)
+                )
+                logger.warning(f"Training job {job_id} for train {job['train_number']} failed "
+                               f"(attempt {job['attempts']}), retrying in {delay:.0f}s: {error}")
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, lease_until = NULL, error = ? WHERE id = ?",
+                    (now, str(error), job_id)
+                )
+                logger.error(f"Training job {job_id} for train {job['train_number']} failed: {error}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        """Get a job as a dict, or None."""
+        conn = self._connect()
+        try:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return dict(job) if job is not None else None
+
+    def wait(self, job, timeout, poll_interval=0.5):
+        """Wait up to `timeout` seconds for a job to finish; returns the job as last seen.
+
+        `job` is the job as enqueue returned it. An attempt that fails after that (the
+        job is queued again with more failed attempts than it had then) counts as
+        finished for the waiter, so a request doesn't sit through the backoff; a job
+        that was already backing off when it was enqueued is waited for as usual.
+        """
+        # Attempts count claims, so a running job's current attempt has not failed yet
+        failed_attempts = job['attempts'] - (job['status'] == 'running')
+        job_id = job['id']
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in ('done', 'failed'):
+                return job
+            if job['status'] == 'queued' and job['attempts'] > failed_attempts:
+                return job
+            if time.time() >= deadline:
+                return job
+            time.sleep(min(poll_interval, max(0, deadline - time.time())))
+
+    def prune(self, max_age=FINISHED_JOB_MAX_AGE):
+        """Delete finished jobs older than `max_age` seconds."""
+        conn = self._connect()
+        try:
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - max_age,)
+            ).rowcount
+        finally:
+            conn.close()
+        return deleted
+
+    def stats(self):
+        """Job counts by status, for monitoring."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        finally:
+            conn.close()
+        counts = {status: 0 for status in ('queued', 'running', 'done', 'failed')}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
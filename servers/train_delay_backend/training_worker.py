@@ -0,0 +1,81 @@
+import os
+import signal
+import socket
+import argparse
+import logging
+import threading
+import multiprocessing
+import time
+from train_pipeline import TrainPipeline
+from training_jobs import TrainingJobQueue
+from config import TRAINING_WORKER_POLL_SECONDS
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PRUNE_INTERVAL = 3600  # seconds between deletions of old finished jobs
+
+def run_job(pipeline, jobs, job):
+    """Build the model for one claimed job and record the outcome."""
+    train_number = job['train_number']
+    logger.info(f"Running training job {job['id']} for train {train_number} (attempt {job['attempts']})")
+    try:
+        # Another worker or an API process may have refreshed it since the job was queued
+        version = pipeline.registry.lookup(train_number) or pipeline._build_model_once(train_number, job['train_name'])
+    except Exception as e:
+        jobs.fail(job['id'], e)
+        return
+    if version:
+        jobs.complete(job['id'], version['dir'].name)
+        logger.info(f"Training job {job['id']} for train {train_number} published version {version['dir'].name}")
+    else:
+        # No usable delay history; retrying soon would not change that
+        jobs.fail(job['id'], f"No delay data found for train {train_number}", retry=False)
+
+def run_worker(poll_interval=TRAINING_WORKER_POLL_SECONDS, max_jobs=None, stop=None):
+    """Claim and run training jobs until stopped (or after `max_jobs` jobs)."""
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    pipeline = TrainPipeline(training_backend='inline')
+    jobs = TrainingJobQueue()
+    logger.info(f"Training worker {worker} started")
+
+    processed = 0
+    last_prune = 0
+    while not stop.is_set() and (max_jobs is None or processed < max_jobs):
+        if time.time() - last_prune > PRUNE_INTERVAL:
+            jobs.prune()
+            last_prune = time.time()
+        job = jobs.claim(worker)
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+        run_job(pipeline, jobs, job)
+        processed += 1
+    logger.info(f"Training worker {worker} stopped after {processed} jobs")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run model training jobs queued by the API (TRAINING_BACKEND=queue)")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to run")
+    parser.add_argument("--poll-interval", type=float, default=TRAINING_WORKER_POLL_SECONDS)
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(args.poll_interval)
+    else:
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=run_worker, args=(args.poll_interval,)) for _ in range(args.processes)]
+        for process in workers:
+            process.start()
+        # Children get the terminal's SIGINT themselves; forward SIGTERM
+        signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in workers])
+        for process in workers:
+            process.join()
@@ -0,0 +1,159 @@
+import json
+import numpy as np
+import pandas as pd
+
+# Objectives whose prediction is the raw margin (base score + sum of leaves)
+IDENTITY_OBJECTIVES = {'reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror', 'reg:quantileerror'}
+
+class FlatEnsemble:
+    """A boosted tree ensemble flattened into NumPy arrays for small-batch scoring.
+
+    All trees' nodes live in one set of arrays (split feature, threshold, default
+    direction for missing values, left child, leaf value); as in XGBoost, a node's
+    right child directly follows its left child. Leaves point to themselves with an
+    infinite threshold, so every (row, tree) pair can walk down one level per step with
+    a few vectorized gathers and no per-row Python. For the 20-60 rows of a single
+    prediction this avoids XGBoost's DMatrix construction and thread start-up.
+
+    Follows XGBoost's rules: inputs are compared as float32, a row goes left when its
+    value is below the threshold, and missing values (NaN) take the default direction.
+    Work grows with rows x trees, so batches above MAX_BATCH_CELLS are handed to the
+    XGBoost model the ensemble was exported from, when it has one.
+    """
+
+    # rows x trees above which XGBoost's compiled predictor is faster (see benchmarks/bench_tree_engine.py)
+    MAX_BATCH_CELLS = 32768
+
+    def __init__(self, feature, threshold, default_left, left, value, roots, depth, base_score,
+                 feature_names=None, model=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.default_left = default_left
+        self.left = left
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.base_score = base_score
+        self.feature_names = list(feature_names) if feature_names else None
+        self.model = model
+
+    @classmethod
+    def from_booster(cls, booster, model=None):
+        """Export an XGBoost Booster (gbtree, numerical splits, identity link)."""
+        learner = json.loads(bytes(booster.save_raw('json')))['learner']
+        objective = learner['objective']['name']
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f"Unsupported objective for the NumPy engine: {objective}")
+        if learner['gradient_booster']['name'] != 'gbtree':
+            raise ValueError(f"Unsupported booster for the NumPy engine: {learner['gradient_booster']['name']}")
+        if int(learner['learner_model_param'].get('num_target', 1)) > 1:
+            raise ValueError("Multi-target models are not supported by the NumPy engine")
+
+        trees = learner['gradient_booster']['model']['trees']
+        # Models kept at their best iteration only use the trees up to it
+        best_iteration = learner.get('attributes', {}).get('best_iteration')
+        if best_iteration is not None:
+            trees = trees[:learner['gradient_booster']['model']['iteration_indptr'][int(best_iteration) + 1]]
+        if not trees:
+            raise ValueError("The model has no trees")
+
+        features, thresholds, defaults, lefts, values, roots = [], [], [], [], [], []
+        depth = 0
+        offset = 0
+        for tree in trees:
+            if any(split_type != 0 for split_type in tree['split_type']):
+                raise ValueError("Categorical splits are not supported by the NumPy engine")
+            left = np.asarray(tree['left_children'], dtype=np.int64)
+            right = np.asarray(tree['right_children'], dtype=np.int64)
+            leaf = left < 0
+            if not (right[~leaf] == left[~leaf] + 1).all():
+                raise ValueError("Tree children are not stored in pairs")
+            node_ids = np.arange(len(left))
+            conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+
+            features.append(np.where(leaf, 0, tree['split_indices']))
+            # Leaves always "go left" onto themselves: nothing is below +inf, and NaN defaults left
+            thresholds.append(np.where(leaf, np.float32(np.inf), conditions))
+            defaults.append(np.asarray(tree['default_left'], dtype=bool) | leaf)
+            lefts.append(np.where(leaf, node_ids, left) + offset)
+            # A leaf's value is stored in its split condition
+            values.append(np.where(leaf, conditions, np.float32(0)))
+            roots.append(offset)
+            depth = max(depth, cls._tree_depth(left, right))
+            offset += len(left)
+
+        return cls(
+            np.concatenate(features).astype(np.int64),
+            np.concatenate(thresholds).astype(np.float32),
+            np.concatenate(defaults),
+            np.concatenate(lefts).astype(np.int64),
+            np.concatenate(values).astype(np.float32),
+            np.asarray(roots, dtype=np.int64),
+            depth,
+            float(learner['learner_model_param']['base_score'].strip('[]')),
+            learner.get('feature_names') or booster.feature_names,
+            model
+        )
+
+    @classmethod
+    def from_model(cls, model):
+        """Export a fitted XGBRegressor, keeping it for batches too large for the engine."""
+        return cls.from_booster(model.get_booster(), model)
+
+    @staticmethod
+    def _tree_depth(left, right):
+        """Number of splits on the longest root-to-leaf path."""
+        internal = np.flatnonzero(left >= 0)
+        depth = np.zeros(len(left), dtype=np.int64)
+        # Push depths down one level per pass until nothing changes
+        while True:
+            pushed = depth.copy()
+            pushed[left[internal]] = pushed[right[internal]] = depth[internal] + 1
+            if (pushed == depth).all():
+                return int(depth.max())
+            depth = pushed
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        """Memory footprint of the arrays in bytes."""
+        return int(sum(a.nbytes for a in (self.feature, self.threshold, self.default_left, self.left,
+                                          self.value, self.roots)))
+
+    def _matrix(self, X):
+        """Rows as a float32 matrix with columns in the model's feature order."""
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names:
+                X = X[self.feature_names]
+            return X.to_numpy(dtype=np.float32)
+        return np.asarray(X, dtype=np.float32)
+
+    def predict(self, X):
+        """Predict a batch of rows (DataFrame or 2-D array). Returns float32 predictions."""
+        if self.model is not None and len(X) * self.n_trees > self.MAX_BATCH_CELLS:
+            return self.model.predict(X)
+        return self.predict_arrays(self._matrix(X))
+
+    def predict_arrays(self, X):
+        """Score a float32 matrix with the NumPy engine, whatever its size."""
+        n_rows = len(X)
+        if n_rows == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # One cursor per (row, tree); leaves loop onto themselves so every cursor can take `depth` steps
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        flat_X = np.ascontiguousarray(X).ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * X.shape[1])[:, None]
+        # Per-train features are never missing, which skips the default-direction lookups
+        has_missing = bool(np.isnan(flat_X).any())
+        for _ in range(self.depth):
+            x = flat_X[row_offsets + self.feature[nodes]]
+            go_right = ~(x < self.threshold[nodes])
+            if has_missing:
+                go_right &= ~(np.isnan(x) & self.default_left[nodes])
+            nodes = self.left[nodes] + go_right
+
+        return self.value[nodes].sum(axis=1, dtype=np.float32) + np.float32(self.base_score)